@@ -0,0 +1 @@
+# Offline benchmarks. Run a module directly, e.g. `python -m benchmarks.bench_row_models`.
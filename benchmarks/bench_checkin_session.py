@@ -0,0 +1,65 @@
+import argparse
+import json
+import logging
+
+from benchmarks.fakes import FakeMember, members
+from benchmarks.harness import measure
+from cogs.checkin import CheckinCog, CheckinSession
+
+# Check-in state transitions and embed rendering at growing session sizes. With
+# set-backed state every step should grow linearly with the member count, and
+# counting a creator's sessions should not depend on how many sessions exist.
+
+
+def bench_session(size, iterations=200):
+    people = members(size)
+    creator = people[0]
+    cog = CheckinCog(None)
+
+    def transitions():
+        session = CheckinSession('bench', creator, 1, people, 60)
+        session.move_to_absent()
+        for member in people[::2]:
+            session.mark_present(member)
+        session.update_absences()
+        for member in people[1::4]:
+            session.leave_session(member)
+        for member in people[1::4]:
+            session.join_session(member)
+
+    session = CheckinSession('bench', creator, 1, people, 60)
+    session.move_to_absent()
+    for member in people[::2]:
+        session.mark_present(member)
+
+    return {
+        'transitions': measure(transitions, iterations),
+        'create_embed': measure(lambda: cog.create_embed(session), iterations),
+    }
+
+
+def bench_session_count(sessions, iterations=10000):
+    cog = CheckinCog(None)
+    creator = FakeMember(1)
+    for i in range(sessions):
+        cog.add_session(CheckinSession(f"s{i}", FakeMember(i + 2) if i % 10 else creator, i % 7, [creator], 60))
+    return measure(lambda: cog.count_creator_sessions(1, 0), iterations)
+
+
+def run(sizes=(10, 100, 1000), session_counts=(100, 10000)):
+    return {
+        'session': {size: bench_session(size) for size in sizes},
+        'count_creator_sessions': {count: bench_session_count(count) for count in session_counts},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    print(json.dumps(run(args.sizes), indent=2))
+
+
+if __name__ == '__main__':
+    main()
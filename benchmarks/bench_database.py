@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.harness import measure_async
+from database import Database
+from models import CheckinRecord, CheckinMember
+from storage import SERIAL, STORAGE_MODES
+
+# Every public Database coroutine against a seeded temp SQLite file. Writes that
+# consume rows (deletes, removals, completions) use the rows their producing case
+# created, so cases run in the order listed and with the same iteration count.
+
+GUILDS = 20
+GROUPS_PER_GUILD = 10
+MEMBERS_PER_GROUP = 8
+TASKS_PER_USER = 5
+
+# Lifecycle and startup-only methods, not per-request work
+SKIPPED = {'connect', 'close', 'run_migrations', 'get_command_hash', 'set_command_hash', 'expire_leases'}
+
+
+async def seed(db):
+    groups = []
+    for guild_id in range(1, GUILDS + 1):
+        await db.update_vc_cleanup_time(guild_id, 600)
+        await db.add_manager(guild_id * 100, guild_id, 2)
+        for i in range(GROUPS_PER_GUILD):
+            group_id = await db.create_study_group(f"group {guild_id}-{i}", guild_id * 100, MEMBERS_PER_GROUP + 2, 0.0, guild_id)
+            await db.update_group_roles(group_id, group_id + 10000, group_id + 20000)
+            await db.update_voice_channel(group_id, group_id + 30000)
+            await db.log_vc_creation(group_id, group_id + 30000, guild_id * 100)
+            for member in range(MEMBERS_PER_GROUP):
+                await db.add_group_member(group_id, group_id * 1000 + member)
+            groups.append((guild_id, group_id))
+    for user_id in range(1, 101):
+        for i in range(TASKS_PER_USER):
+            await db.add_task(user_id, f"task {i}")
+    return groups
+
+
+class DatabaseBench:
+    def __init__(self, db, groups):
+        self.db = db
+        self.groups = groups
+        self.cycle = itertools.cycle(groups)
+        self.counter = itertools.count(10_000_000)
+        self.created = []
+        self.added_members = []
+        self.added_managers = []
+        self.added_tasks = []
+        self.pomodoro_groups = []
+        self.leases = []
+        self.checkins = []
+        self.since = (datetime.now() - timedelta(days=7))
+
+    def cases(self):
+        db = self.db
+        cycle = self.cycle
+        counter = self.counter
+
+        async def create_study_group():
+            guild_id, _ = next(cycle)
+            self.created.append(await db.create_study_group(f"bench {next(counter)}", 1, 10, 0.0, guild_id))
+
+        async def delete_study_group():
+            await db.delete_study_group(self.created.pop())
+
+        async def add_group_member():
+            _, group_id = next(cycle)
+            user_id = next(counter)
+            await db.add_group_member(group_id, user_id)
+            self.added_members.append((group_id, user_id))
+
+        async def remove_group_member():
+            await db.remove_group_member(*self.added_members.pop())
+
+        async def add_manager():
+            guild_id, _ = next(cycle)
+            user_id = next(counter)
+            await db.add_manager(user_id, guild_id, 1)
+            self.added_managers.append((user_id, guild_id))
+
+        async def remove_manager():
+            await db.remove_manager(*self.added_managers.pop())
+
+        async def add_task():
+            user_id = next(counter) % 100 + 1
+            self.added_tasks.append((user_id, await db.add_task(user_id, "bench task")))
+
+        async def complete_task():
+            await db.complete_task(*self.added_tasks.pop())
+
+        async def start_pomodoro_session():
+            group_id = next(counter)
+            await db.start_pomodoro_session(1, group_id, 25, 5, 15, 0.0)
+            self.pomodoro_groups.append(group_id)
+
+        async def update_pomodoro_session():
+            group_id = self.pomodoro_groups[next(counter) % len(self.pomodoro_groups)]
+            await db.update_pomodoro_session(group_id, 'short_break', 1, 0.0, None)
+
+        async def end_pomodoro_session():
+            await db.end_pomodoro_session(self.pomodoro_groups.pop())
+
+        def by_group(method, *extra):
+            async def case():
+                _, group_id = next(cycle)
+                await method(group_id, *extra)
+            return case
+
+        def by_guild(method, *extra):
+            async def case():
+                guild_id, _ = next(cycle)
+                await method(guild_id, *extra)
+            return case
+
+        async def get_study_group_by_name():
+            guild_id, group_id = next(cycle)
+            await db.get_study_group_by_name(f"group {guild_id}-{(group_id - 1) % GROUPS_PER_GUILD}", guild_id)
+
+        async def get_user_group():
+            _, group_id = next(cycle)
+            await db.get_user_group(group_id * 1000)
+
+        async def get_manager():
+            guild_id, _ = next(cycle)
+            await db.get_manager(guild_id * 100, guild_id)
+
+        async def get_user_tasks():
+            await db.get_user_tasks(next(counter) % 100 + 1)
+
+        async def update_group_roles():
+            _, group_id = next(cycle)
+            await db.update_group_roles(group_id, group_id + 10000, group_id + 20000)
+
+        async def update_voice_channel():
+            _, group_id = next(cycle)
+            await db.update_voice_channel(group_id, group_id + 30000)
+
+        async def log_vc_creation():
+            _, group_id = next(cycle)
+            await db.log_vc_creation(group_id, group_id + 30000, 1)
+
+        async def get_active_pomodoro_session():
+            await db.get_active_pomodoro_session(self.pomodoro_groups[next(counter) % len(self.pomodoro_groups)])
+
+        async def acquire_lease():
+            resource = f"pomodoro:{next(counter)}"
+            await db.acquire_lease(resource, 1, 'bench', 30.0)
+            self.leases.append(resource)
+
+        async def confirm_lease():
+            await db.confirm_lease(self.leases[next(counter) % len(self.leases)], 'bench', 30.0)
+
+        async def release_lease():
+            await db.release_lease(self.leases.pop(), 'bench')
+
+        async def save_checkin_session():
+            # A full session: ten members, one of them exited
+            session_id = f"bench-{next(counter)}"
+            record = CheckinRecord(session_id, 1, 1, 1, 1800, 0.0, False, 3, 0.0, 1)
+            members = [CheckinMember(session_id, user_id, 1, user_id % 2 == 0, user_id == 10) for user_id in range(1, 11)]
+            await db.save_checkin_session(record, members)
+            self.checkins.append(session_id)
+
+        async def get_checkin_session():
+            await db.get_checkin_session(self.checkins[next(counter) % len(self.checkins)])
+
+        async def delete_checkin_session():
+            await db.delete_checkin_session(self.checkins.pop())
+
+        async def warm_cache():
+            await db.warm_cache(range(1, GUILDS + 1))
+
+        # Producers come before the cases that consume their rows
+        return {
+            'create_study_group': create_study_group,
+            'get_study_group_by_name': get_study_group_by_name,
+            'get_study_group_by_id': by_group(db.get_study_group_by_id),
+            'get_study_group': by_guild(db.get_study_group),
+            'get_all_study_groups': by_guild(db.get_all_study_groups),
+            'get_user_group': get_user_group,
+            'add_group_member': add_group_member,
+            'get_group_members': by_group(db.get_group_members),
+            'remove_group_member': remove_group_member,
+            'update_group_roles': update_group_roles,
+            'get_group_roles': by_group(db.get_group_roles),
+            'update_voice_channel': update_voice_channel,
+            'log_vc_creation': log_vc_creation,
+            'get_vc_logs': by_guild(db.get_vc_logs, self.since),
+            'update_vc_cleanup_time': by_guild(db.update_vc_cleanup_time, 600),
+            'get_guild_settings': by_guild(db.get_guild_settings),
+            'get_vc_cleanup_time': by_guild(db.get_vc_cleanup_time),
+            'update_vc_category': by_guild(db.update_vc_category, 1),
+            'get_vc_category': by_guild(db.get_vc_category),
+            'add_manager': add_manager,
+            'get_manager': get_manager,
+            'get_all_managers': by_guild(db.get_all_managers),
+            'get_all_manager_rows': db.get_all_manager_rows,
+            'remove_manager': remove_manager,
+            'add_task': add_task,
+            'get_user_tasks': get_user_tasks,
+            'complete_task': complete_task,
+            'start_pomodoro_session': start_pomodoro_session,
+            'update_pomodoro_session': update_pomodoro_session,
+            'get_active_pomodoro_sessions': db.get_active_pomodoro_sessions,
+            'get_active_pomodoro_session': get_active_pomodoro_session,
+            'end_pomodoro_session': end_pomodoro_session,
+            'acquire_lease': acquire_lease,
+            'confirm_lease': confirm_lease,
+            'renew_leases': lambda: db.renew_leases('bench', 30.0),
+            'get_claimable_leases': lambda: db.get_claimable_leases('bench'),
+            'release_lease': release_lease,
+            'save_checkin_session': save_checkin_session,
+            'get_checkin_session': get_checkin_session,
+            'delete_checkin_session': delete_checkin_session,
+            'delete_study_group': delete_study_group,
+            'load_voice_channel_index': db.load_voice_channel_index,
+            'warm_cache': warm_cache,
+        }
+
+
+def public_methods():
+    return sorted(name for name, member in inspect.getmembers(Database, inspect.iscoroutinefunction)
+                  if not name.startswith('_') and name not in SKIPPED)
+
+
+async def bench(path, iterations, storage_mode, cache_size):
+    db = Database(path, storage_mode=storage_mode, cache_size=cache_size)
+    await db.connect()
+    try:
+        groups = await seed(db)
+        cases = DatabaseBench(db, groups).cases()
+        results = {}
+        for name, case in cases.items():
+            results[name] = await measure_async(case, iterations, warmup=0)
+        return {
+            'methods': results,
+            # New Database methods show up here until they get a case
+            'uncovered': [name for name in public_methods() if name not in cases],
+            'lock_wait': db.lock_wait_stats(),
+        }
+    finally:
+        await db.close()
+
+
+def run(iterations=500, storage_mode=SERIAL, cache_size=4096):
+    with tempfile.TemporaryDirectory() as tmp:
+        return asyncio.run(bench(os.path.join(tmp, 'bench.sqlite'), iterations, storage_mode, cache_size))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--storage-mode', choices=STORAGE_MODES, default=SERIAL)
+    parser.add_argument('--cache-size', type=int, default=4096, help="0 measures every read against SQLite")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    print(json.dumps(run(args.iterations, args.storage_mode, args.cache_size), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import gc
+import json
+import logging
+import time
+import tracemalloc
+
+import discord
+from discord.state import ConnectionState
+
+from gateway import PROFILES, client_options
+from roleindex import RoleIndex
+
+# Client-side cost of each gateway profile on a bot in guilds of the given sizes: the
+# time to build the member cache and the memory it holds after startup. 'full' chunks
+# every guild at startup; 'lean' chunks none, then loads one guild when /checkin first
+# expands a role there, which is timed separately. Network time is not included, only
+# what discord.py does with the GUILD_MEMBERS_CHUNK payloads.
+
+ROLE_ID = 5
+ROLE_EVERY = 10  # One member in ten has the mentioned role
+
+
+def state_for(profile):
+    options = client_options(profile)
+    state = ConnectionState(dispatch=lambda *args, **kwargs: None, handlers={}, hooks={}, http=None, **options)
+    state.user = None
+    return state
+
+
+def guild_payload(guild_id, member_count):
+    def role(role_id, name):
+        return {'id': str(role_id), 'name': name, 'permissions': '0', 'position': 0, 'color': 0, 'hoist': False,
+                'managed': False, 'mentionable': True, 'flags': 0}
+    return {'id': str(guild_id), 'name': f"guild{guild_id}", 'owner_id': '1', 'member_count': member_count,
+            'roles': [role(guild_id, '@everyone'), role(ROLE_ID, 'study')], 'features': [], 'emojis': [],
+            'stickers': [], 'channels': [], 'threads': [], 'members': [], 'voice_states': [], 'presences': []}
+
+
+def member_payloads(guild_id, member_count):
+    return [{'user': {'id': str(guild_id * 10**7 + i), 'username': f"user{i}", 'discriminator': '0',
+                      'global_name': None, 'avatar': None},
+             'roles': [str(ROLE_ID)] if i % ROLE_EVERY == 0 else [], 'joined_at': '2024-01-01T00:00:00+00:00',
+             'deaf': False, 'mute': False, 'flags': 0} for i in range(member_count)]
+
+
+def chunk(state, guild, payloads):
+    # What a completed chunk request does with its members
+    for data in payloads:
+        guild._add_member(discord.Member(data=data, guild=guild, state=state))
+
+
+def start(profile, sizes, payloads):
+    state = state_for(profile)
+    guilds = [discord.Guild(data=guild_payload(guild_id, size), state=state) for guild_id, size in enumerate(sizes, 1)]
+    if state._chunk_guilds:
+        for guild in guilds:
+            chunk(state, guild, payloads[guild.id])
+    return state, guilds
+
+
+def expand_role(state, guild, payloads, index):
+    if not guild.chunked:
+        chunk(state, guild, payloads[guild.id])
+    return index.members(guild, guild.get_role(ROLE_ID))
+
+
+def bench_profile(profile, sizes, payloads):
+    gc.collect()
+    started = time.perf_counter()
+    state, guilds = start(profile, sizes, payloads)
+    startup = time.perf_counter() - started
+    result = {
+        'startup_seconds': startup,
+        'cached_members': sum(len(guild._members) for guild in guilds),
+        'chunk_guilds_at_startup': state._chunk_guilds,
+        'intents': sorted(name for name, enabled in state._intents if enabled),
+    }
+    largest = guilds[0]
+    started = time.perf_counter()
+    members = expand_role(state, largest, payloads, RoleIndex())
+    result['first_role_expansion_seconds'] = time.perf_counter() - started
+    result['role_members'] = len(members)
+    result['cached_members_after_expansion'] = sum(len(guild._members) for guild in guilds)
+
+    # Memory in a separate pass; tracemalloc slows allocation down too much to time with it on
+    del state, guilds, members
+    gc.collect()
+    tracemalloc.start()
+    state, guilds = start(profile, sizes, payloads)
+    result['startup_memory_mb'] = tracemalloc.get_traced_memory()[0] / 1e6
+    index = RoleIndex()
+    expand_role(state, guilds[0], payloads, index)
+    result['memory_after_expansion_mb'] = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    return result
+
+
+def run(sizes=(100000, 20000, 5000, 1000, 100)):
+    payloads = {guild_id: member_payloads(guild_id, size) for guild_id, size in enumerate(sizes, 1)}
+    return {profile: bench_profile(profile, sizes, payloads) for profile in PROFILES}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 20000, 5000, 1000, 100],
+                        help="Member count of each guild; the first is the one /checkin expands a role in")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    print(json.dumps(run(args.sizes), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from benchmarks.harness import measure, summarize
+from cogs.pomodoro import Pomodoro, PomodoroSession
+
+# Pomodoro timers with N concurrent groups: the cost of scheduling a stage end, of
+# stepping a session to its next stage, and how long the scheduler takes to fire a
+# stage end for every group once they all come due together.
+
+
+class FakeDatabase:
+    async def update_pomodoro_session(self, *args):
+        pass
+
+
+class FakeLeases:
+    async def confirm(self, kind, key):
+        return True
+
+    def holds(self, kind, key):
+        return True
+
+
+class FakeBot:
+    def __init__(self, shard_count=None):
+        self.db = FakeDatabase()
+        self.leases = FakeLeases()
+        self.shard_count = shard_count
+
+
+class BenchPomodoro(Pomodoro):
+    def __init__(self, bot, fired):
+        super().__init__(bot)
+        self.fired = fired
+
+    async def send_notification(self, guild_id, group_id, message):
+        self.fired[group_id] = time.perf_counter()
+
+
+async def bench_groups(count):
+    fired = {}
+    cog = BenchPomodoro(FakeBot(), fired)
+    cog.scheduler.start()
+    try:
+        now = cog.scheduler.now()
+        sessions = []
+        for group_id in range(1, count + 1):
+            session = PomodoroSession(1, group_id, 25, 5, 15)
+            session.start(now)
+            cog.sessions[group_id] = session
+            sessions.append(session)
+
+        groups = iter(sessions * 2)
+        schedule = measure(lambda: cog.schedule_stage_end(next(groups)), iterations=count, warmup=0)
+        advance = measure(lambda: sessions[0].advance(now), iterations=1000)
+
+        # Make every stage due now and time how long each group waits for its notification
+        due = cog.scheduler.now()
+        for session in sessions:
+            session.deadline = due
+            cog.schedule_stage_end(session)
+        started = time.perf_counter()
+        while len(fired) < count:
+            await asyncio.sleep(0.001)
+        elapsed = time.perf_counter() - started
+        fire = summarize([fired[group_id] - started for group_id in fired], elapsed)
+        return {'schedule': schedule, 'advance': advance, 'fire_all': fire}
+    finally:
+        await cog.scheduler.stop()
+
+
+def run(group_counts=(10, 100, 1000, 10000)):
+    return {count: asyncio.run(bench_groups(count)) for count in group_counts}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--groups', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    print(json.dumps(run(args.groups), indent=2))
+
+
+if __name__ == '__main__':
+    main()
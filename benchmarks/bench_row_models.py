@@ -0,0 +1,106 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from models import StudyGroup, column_list, row_factory
+
+# Compares the old sqlite3.Row path (string-keyed access) with the slotted models
+# returned by Database: fetch cost, field access cost and memory held per row.
+
+COLUMNS = column_list(StudyGroup)
+
+
+def build_database(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE study_groups (
+        id INTEGER PRIMARY KEY, name TEXT NOT NULL, creator_id INTEGER NOT NULL,
+        max_size INTEGER NOT NULL, end_time REAL NOT NULL, guild_id INTEGER NOT NULL,
+        admin_role_id INTEGER, session_role_id INTEGER, voice_channel_id INTEGER
+    )
+    ''')
+    conn.executemany(
+        f'INSERT INTO study_groups ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(i, f"group {i}", 1000 + i, 10, 0.0, i % 50, 2000 + i, 3000 + i, 4000 + i) for i in range(1, rows + 1)]
+    )
+    conn.commit()
+    return conn
+
+
+def fetch_rows(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return cursor.execute('SELECT * FROM study_groups').fetchall()
+
+
+def fetch_models(conn, factory=row_factory(StudyGroup)):
+    cursor = conn.cursor()
+    cursor.row_factory = factory
+    return cursor.execute(f'SELECT {COLUMNS} FROM study_groups').fetchall()
+
+
+def access_rows(rows):
+    total = 0
+    for row in rows:
+        total += row['id'] + row['creator_id'] + (row['voice_channel_id'] or 0)
+    return total
+
+
+def access_models(groups):
+    total = 0
+    for group in groups:
+        total += group.id + group.creator_id + (group.voice_channel_id or 0)
+    return total
+
+
+def timed(fn, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def held_bytes(fetch, conn):
+    tracemalloc.start()
+    rows = fetch(conn)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return size
+
+
+def run(rows=20000):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_database(os.path.join(tmp, 'bench.sqlite'), rows)
+        try:
+            results = {}
+            for label, fetch, access in (('sqlite3.Row', fetch_rows, access_rows),
+                                         ('StudyGroup', fetch_models, access_models)):
+                fetched = fetch(conn)
+                results[label] = {
+                    'fetch_us_per_row': timed(fetch, conn) / rows * 1e6,
+                    'access_us_per_row': timed(access, fetched) / rows * 1e6,
+                    'bytes_per_row': held_bytes(fetch, conn) / rows,
+                }
+            return results
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+    for label, result in run(args.rows).items():
+        print(f"{label:12} fetch {result['fetch_us_per_row']:.3f} us/row  "
+              f"access {result['access_us_per_row']:.3f} us/row  "
+              f"{result['bytes_per_row']:.0f} bytes/row")
+
+
+if __name__ == '__main__':
+    main()
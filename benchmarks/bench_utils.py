@@ -0,0 +1,47 @@
+import argparse
+import json
+import logging
+
+from benchmarks.fakes import FakeContext, FakeGuild, FakeRole, members
+from benchmarks.harness import measure
+from roleindex import RoleIndex
+from utils import parse_duration, parse_mentions
+
+# Parsing of user input on the /checkin and /start_pomodoro paths.
+
+DURATIONS = ["30s", "45 minutes", "2h", "1 day", "90 mins", "2d 14h 25m 30s", "not a duration"]
+
+
+def mention_context(member_count, role_size, guild_size=0):
+    people = members(max(guild_size, member_count + role_size))
+    role = FakeRole(9000, people[member_count:member_count + role_size])
+    guild = FakeGuild(1, people, [role])
+    text = " ".join(member.mention for member in people[:member_count]) + f" {role.mention}"
+    return FakeContext(guild), text
+
+
+def run(iterations=10000):
+    durations = iter(DURATIONS * (iterations // len(DURATIONS) + 20))
+    results = {'parse_duration': measure(lambda: parse_duration(next(durations)), iterations)}
+    for member_count, role_size in ((1, 0), (10, 0), (10, 100), (10, 1000)):
+        ctx, text = mention_context(member_count, role_size)
+        results[f'parse_mentions_{member_count}u_{role_size}r'] = measure(lambda: parse_mentions(ctx, text), max(100, iterations // 10))
+    # A small role in a large guild: role.members scans the guild, the index does not
+    ctx, text = mention_context(1, 100, guild_size=100000)
+    index = RoleIndex()
+    index.members(ctx.guild, ctx.guild.get_role(9000))  # Build outside the timing
+    results['parse_mentions_100r_in_100k_scan'] = measure(lambda: parse_mentions(ctx, text), 20, warmup=1)
+    results['parse_mentions_100r_in_100k_indexed'] = measure(lambda: parse_mentions(ctx, text, index), max(100, iterations // 10))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=10000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    print(json.dumps(run(args.iterations), indent=2))
+
+
+if __name__ == '__main__':
+    main()
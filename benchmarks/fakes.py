@@ -0,0 +1,62 @@
+# Minimal stand-ins for the discord objects the bot touches, so benchmarks run offline.
+
+
+class FakeMember:
+    __slots__ = ('id', 'name', 'display_name', 'mention', 'roles')
+
+    def __init__(self, member_id, roles=()):
+        self.id = member_id
+        self.name = f"user{member_id}"
+        self.display_name = self.name
+        self.mention = f"<@{member_id}>"
+        self.roles = list(roles)
+
+
+class FakeRole:
+    def __init__(self, role_id, members=()):
+        self.id = role_id
+        self.name = f"role{role_id}"
+        self.mention = f"<@&{role_id}>"
+        self.guild = None
+        self._members = list(members)
+        for member in self._members:
+            member.roles.append(self)
+
+    def is_default(self):
+        return False
+
+    @property
+    def members(self):
+        # Like discord.py, a scan of the guild's whole member cache once the role is in a guild
+        if self.guild is None:
+            return self._members
+        return [member for member in self.guild.members if self in member.roles]
+
+
+class FakeGuild:
+    def __init__(self, guild_id, members=(), roles=()):
+        self.id = guild_id
+        self.chunked = True
+        self._members = {member.id: member for member in members}
+        self._roles = {role.id: role for role in roles}
+        for role in roles:
+            role.guild = self
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+
+class FakeContext:
+    def __init__(self, guild):
+        self.guild = guild
+
+
+def members(count, start=1):
+    return [FakeMember(start + i) for i in range(count)]
@@ -0,0 +1,49 @@
+import time
+
+# Shared timing helpers. Every measurement is reported the same way so runs can be
+# compared key by key: ops/sec over the whole run plus per-call latency percentiles.
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(samples, elapsed):
+    samples = sorted(samples)
+    return {
+        'iterations': len(samples),
+        'ops_per_sec': len(samples) / elapsed if elapsed else 0.0,
+        'p50_us': percentile(samples, 0.50) * 1e6,
+        'p99_us': percentile(samples, 0.99) * 1e6,
+    }
+
+
+def measure(fn, iterations=1000, warmup=10):
+    # fn takes no arguments; benchmarks that need fresh arguments per call keep their own counter
+    for _ in range(warmup):
+        fn()
+    samples = []
+    clock = time.perf_counter
+    start = clock()
+    for _ in range(iterations):
+        before = clock()
+        fn()
+        samples.append(clock() - before)
+    return summarize(samples, clock() - start)
+
+
+async def measure_async(fn, iterations=1000, warmup=10):
+    # Same as measure, for coroutine functions
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    clock = time.perf_counter
+    start = clock()
+    for _ in range(iterations):
+        before = clock()
+        await fn()
+        samples.append(clock() - before)
+    return summarize(samples, clock() - start)
@@ -0,0 +1,95 @@
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks import bench_checkin_session, bench_database, bench_gateway, bench_pomodoro, bench_row_models, bench_utils
+
+# Runs the benchmark suites and prints one JSON document, e.g.
+#   python -m benchmarks.run --output before.json
+#   python -m benchmarks.run --compare before.json
+# --compare lists every ops/sec figure that dropped by more than --threshold and
+# exits non-zero if there is one.
+
+SUITES = {
+    'database': lambda quick: bench_database.run(iterations=100 if quick else 500),
+    'checkin_session': lambda quick: bench_checkin_session.run(sizes=(10, 100) if quick else (10, 100, 1000)),
+    'pomodoro': lambda quick: bench_pomodoro.run(group_counts=(10, 100) if quick else (10, 100, 1000, 10000)),
+    'utils': lambda quick: bench_utils.run(iterations=1000 if quick else 10000),
+    'row_models': lambda quick: bench_row_models.run(rows=2000 if quick else 20000),
+    'gateway': lambda quick: bench_gateway.run(sizes=(20000, 1000, 100) if quick else (100000, 20000, 5000, 1000, 100)),
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def throughputs(results, path=()):
+    # Flatten to {'database/get_study_group_by_id': ops_per_sec, ...}
+    if isinstance(results, dict):
+        if 'ops_per_sec' in results:
+            yield "/".join(path), results['ops_per_sec']
+            return
+        for key, value in results.items():
+            yield from throughputs(value, path + (str(key),))
+
+
+def compare(current, baseline, threshold):
+    previous = dict(throughputs(baseline['results']))
+    regressions = []
+    for name, ops in throughputs(current['results']):
+        before = previous.get(name)
+        if before and ops < before * (1 - threshold):
+            regressions.append({'name': name, 'before': before, 'after': ops, 'change': ops / before - 1})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--only', nargs='+', choices=sorted(SUITES), help="Suites to run (default: all)")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes, for a fast sanity check")
+    parser.add_argument('--output', help="Also write the results to this file")
+    parser.add_argument('--compare', help="Baseline results file to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Slowdown that counts as a regression (default: 0.2)")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    document = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'quick': args.quick,
+        },
+        'results': {},
+    }
+    for name in args.only or SUITES:
+        started = time.perf_counter()
+        document['results'][name] = SUITES[name](args.quick)
+        print(f"{name}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    # Round-trip so keys match a baseline loaded from disk
+    document = json.loads(json.dumps(document))
+
+    if args.compare:
+        with open(args.compare) as f:
+            document['regressions'] = compare(document, json.load(f), args.threshold)
+
+    text = json.dumps(document, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    if document.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,59 +1,218 @@
+import asyncio
+import contextlib
+import hashlib
+import json
 import os
 import discord
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
 from database import Database
+from outbound import OutboundDispatcher
+from components import ComponentRouter
+from roleindex import RoleIndex
+from gateway import MemberLoader, client_options
+from leases import LeaseManager, default_owner
+from permissions import PermissionService
+from logsetup import configure_logging, parse_levels
+from metrics import InstrumentedCommandTree, LoopLagMonitor, MetricsServer, observe_command, timed_event, track_bot
+from utils import ArgumentError
 import logging
-
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+import time
 
 # Load environment variables
 load_dotenv()
 TOKEN = os.getenv('DISCORD_BOT_TOKEN')
 
+# Set up logging. LOG_LEVELS overrides single modules, e.g. "cogs.checkin=DEBUG,discord=WARNING".
+# LOG_DEBUG_SAMPLE=N keeps one in N DEBUG records per log call site.
+configure_logging(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    module_levels=parse_levels(os.getenv('LOG_LEVELS')),
+    debug_sample=int(os.getenv('LOG_DEBUG_SAMPLE', '1')),
+    log_file=os.getenv('LOG_FILE') or None,
+)
+logger = logging.getLogger(__name__)
+
 BOT_DEVELOPER_ID = os.getenv('BOT_DEVELOPER_ID')
 
-# Set up intents
-intents = discord.Intents.default()
-intents.guilds = True
-intents.members = True
-intents.messages = True
-intents.message_content = True
-intents.voice_states = True
-intents.reactions = True
+# Storage: 'serial' runs every query on one connection, 'wal' adds a pool of read connections
+DB_STORAGE_MODE = os.getenv('DB_STORAGE_MODE', 'serial')
+DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', '4'))
+# Group commit: writes within this many ms share one transaction. Leave empty to commit every write.
+DB_GROUP_COMMIT_MS = float(os.getenv('DB_GROUP_COMMIT_MS')) if os.getenv('DB_GROUP_COMMIT_MS') else None
+DB_GROUP_COMMIT_MAX_BATCH = int(os.getenv('DB_GROUP_COMMIT_MAX_BATCH', '100'))
+# Read-through cache for study groups and guild settings
+DB_CACHE_SIZE = int(os.getenv('DB_CACHE_SIZE', '4096'))
+DB_CACHE_TTL = float(os.getenv('DB_CACHE_TTL', '300'))
+# Outbound rate limits (requests per second, and how many may go at once after a quiet spell)
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '40'))
+OUTBOUND_CHANNEL_RATE = float(os.getenv('OUTBOUND_CHANNEL_RATE', '1'))
+OUTBOUND_CHANNEL_BURST = int(os.getenv('OUTBOUND_CHANNEL_BURST', '5'))
+# Prometheus metrics endpoint, off unless a port is set. Keep the host on localhost unless scraped remotely.
+METRICS_PORT = int(os.getenv('METRICS_PORT')) if os.getenv('METRICS_PORT') else None
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+# Role -> members index used to expand role mentions; caps (role, member) pairs held across all guilds
+ROLE_INDEX_MAX_ENTRIES = int(os.getenv('ROLE_INDEX_MAX_ENTRIES', '1000000'))
+# Slash command sync: 'auto' syncs only when the command tree changed since the last sync, 'always' on
+# every start, 'off' never. With DEV_GUILD_ID set, commands sync to that guild only, where changes show up
+# immediately (global commands stay registered as they were).
+COMMAND_SYNC = os.getenv('COMMAND_SYNC', 'auto').lower()
+DEV_GUILD_ID = int(os.getenv('DEV_GUILD_ID')) if os.getenv('DEV_GUILD_ID') else None
 
-class CPO(commands.Bot):
+# Gateway profile: intents and caches, see gateway.py. 'lean' chunks member lists only when a feature needs them.
+GATEWAY_PROFILE = os.getenv('GATEWAY_PROFILE', 'lean').lower()
+# Shards run in this process. Leave SHARD_COUNT empty to use the count Discord recommends;
+# SHARD_IDS (e.g. "0,1") runs a subset when the shards are split across processes. A subset only
+# means something against a fixed total, so SHARD_IDS requires SHARD_COUNT.
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS').split(',')] if os.getenv('SHARD_IDS') else None
+if SHARD_IDS is not None and SHARD_COUNT is None:
+    raise SystemExit("SHARD_IDS is set without SHARD_COUNT. Set both: SHARD_COUNT to the total number of shards "
+                     "across all processes, SHARD_IDS to the shards this process runs.")
+if SHARD_IDS is not None and not all(0 <= shard_id < SHARD_COUNT for shard_id in SHARD_IDS):
+    raise SystemExit(f"SHARD_IDS must be between 0 and SHARD_COUNT - 1 ({SHARD_COUNT - 1}), got {SHARD_IDS}.")
+# Pomodoro and check-in timers are leased to one process at a time; a lease not renewed for LEASE_TTL
+# seconds is taken over by a process running the session's shard. WORKER_ID names this process in the
+# lease table (default '<hostname>:<shard ids>') and must stay the same across its restarts.
+LEASE_TTL = float(os.getenv('LEASE_TTL', '30'))
+WORKER_ID = os.getenv('WORKER_ID') or default_owner(SHARD_IDS)
+
+class CPO(commands.AutoShardedBot):
     def __init__(self):
-        super().__init__(command_prefix='!', intents=intents)
-        self.db = Database()
+        options = client_options(GATEWAY_PROFILE)
+        super().__init__(command_prefix='!', tree_cls=InstrumentedCommandTree, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **options)
+        self.db = Database(storage_mode=DB_STORAGE_MODE, read_pool_size=DB_READ_POOL_SIZE,
+                           group_commit_ms=DB_GROUP_COMMIT_MS, group_commit_max_batch=DB_GROUP_COMMIT_MAX_BATCH,
+                           cache_size=DB_CACHE_SIZE, cache_ttl=DB_CACHE_TTL)
+        self.outbound = OutboundDispatcher(global_rate=OUTBOUND_GLOBAL_RATE, global_burst=int(OUTBOUND_GLOBAL_RATE),
+                                           channel_rate=OUTBOUND_CHANNEL_RATE, channel_burst=OUTBOUND_CHANNEL_BURST)
+        # Button clicks are routed to cogs by custom_id prefix
+        self.components = ComponentRouter()
+        self.add_listener(timed_event(self.components.dispatch, 'on_interaction'), 'on_interaction')
+        # Member lists of unchunked guilds are fetched the first time a feature needs them
+        self.member_loader = MemberLoader(enabled=options['intents'].members)
+        # Role mentions expand through an index kept current by member events
+        self.role_index = RoleIndex(max_entries=ROLE_INDEX_MAX_ENTRIES)
+        for event, listener in self.role_index.listeners():
+            self.add_listener(timed_event(listener, event), event)
+        self.leases = LeaseManager(self, owner=WORKER_ID, ttl=LEASE_TTL)
         self.bot_developer_id = int(BOT_DEVELOPER_ID) if BOT_DEVELOPER_ID else None
+        # Manager permissions are held in memory; reloaded as often as the database cache expires
+        # to pick up changes made by other processes
+        self.permissions = PermissionService(self.db, developer_id=self.bot_developer_id, refresh_interval=DB_CACHE_TTL)
+        self.loop_lag = LoopLagMonitor()
+        self.metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+        track_bot(self)
+        self.cache_warmed = False
+        self.created_at = time.perf_counter()
+        self.startup_timings = {}  # phase -> seconds, logged at the first READY
+
+    @contextlib.contextmanager
+    def startup_phase(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - started
 
     async def setup_hook(self):
-        await self.db.connect()
-        for filename in os.listdir("./cogs"):
-            if filename.endswith(".py") and not filename.startswith("_"):
-                try:
-                    await self.load_extension(f"cogs.{filename[:-3]}")
-                    logger.info(f"Loaded extension: {filename[:-3]}")
-                except Exception as e:
-                    logger.error(f"Failed to load extension {filename[:-3]}: {e}")
-        await self.tree.sync()
+        with self.startup_phase('db_connect'):
+            await self.db.connect()
+        with self.startup_phase('permissions_load'):
+            await self.permissions.load()
+        self.permissions.start()
+        self.outbound.start()
+        self.loop_lag.start()
+        self.leases.start()
+        if self.metrics_server:
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error("Failed to start metrics endpoint on %s:%s: %s", METRICS_HOST, METRICS_PORT, e)
+                self.metrics_server = None
+        with self.startup_phase('cog_load'):
+            await self.load_cogs()
+        with self.startup_phase('command_sync'):
+            await self.sync_commands()
         logger.info("CPO setup completed.")
 
+    async def load_cogs(self):
+        # Extensions are independent, so their cog_load hooks (e.g. restoring sessions) can overlap
+        names = sorted(filename[:-3] for filename in os.listdir("./cogs")
+                       if filename.endswith(".py") and not filename.startswith("_"))
+        results = await asyncio.gather(*(self.load_extension(f"cogs.{name}") for name in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.error("Failed to load extension %s: %s", name, result)
+            else:
+                logger.info("Loaded extension: %s", name)
+
+    def command_tree_hash(self, guild=None):
+        # Hash of what tree.sync would upload, independent of the order cogs registered commands in
+        payload = sorted((command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)),
+                         key=lambda command: (command.get('type', 1), command['name']))
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    async def sync_commands(self):
+        if COMMAND_SYNC == 'off':
+            logger.info("Command sync is off")
+            return
+        guild = discord.Object(DEV_GUILD_ID) if DEV_GUILD_ID else None
+        if guild:
+            self.tree.copy_global_to(guild=guild)
+        scope = f"{self.application_id}:guild:{DEV_GUILD_ID}" if guild else f"{self.application_id}:global"
+        command_hash = self.command_tree_hash(guild)
+        if COMMAND_SYNC != 'always' and await self.db.get_command_hash(scope) == command_hash:
+            logger.info("Command tree unchanged since the last sync (%s), skipping sync", scope)
+            return
+        try:
+            synced = await self.tree.sync(guild=guild)
+        except discord.HTTPException as e:
+            logger.error("Failed to sync commands (%s): %s", scope, e)
+            return
+        await self.db.set_command_hash(scope, command_hash)
+        logger.info("Synced %s command(s) (%s): %s", len(synced), scope, ", ".join(command.name for command in synced))
+
+    @timed_event
     async def on_ready(self):
-        logger.info(f'{self.user} has connected to Discord!')
-        logger.info(f"Guilds: {len(self.guilds)}")
-        logger.info(f"Users: {len(set(self.get_all_members()))}")
+        logger.info('%s has connected to Discord!', self.user)
+        logger.info("Guilds: %s", len(self.guilds))
+        logger.info("Members: %s", sum(guild.member_count or 0 for guild in self.guilds))
+
+        if not self.cache_warmed:
+            with self.startup_phase('cache_warm'):
+                await self.db.warm_cache(guild.id for guild in self.guilds)
+            self.cache_warmed = True
+
+        # on_ready fires again after every reconnect; commands were synced once in setup_hook
+        if 'first_ready' not in self.startup_timings:
+            self.startup_timings['first_ready'] = time.perf_counter() - self.created_at
+            logger.info("Startup timings: %s", ", ".join("%s %.2fs" % item for item in self.startup_timings.items()))
+
+    @timed_event
+    async def on_shard_ready(self, shard_id):
+        guilds = sum(1 for guild in self.guilds if guild.shard_id == shard_id)
+        logger.info("Shard %s/%s ready with %s guild(s)", shard_id, self.shard_count, guilds)
+
+    @timed_event
+    async def on_shard_disconnect(self, shard_id):
+        logger.warning("Shard %s disconnected", shard_id)
+
+    @timed_event
+    async def on_shard_resumed(self, shard_id):
+        logger.info("Shard %s resumed", shard_id)
 
-        synced = await self.tree.sync()
-        logger.info(f"Synced {len(synced)} command(s)")
-        for command in synced:
-            logger.info(f"  - {command.name}")
+    async def on_app_command_completion(self, interaction, command):
+        observe_command(interaction, 'ok')
 
     async def close(self):
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        await self.leases.stop()
+        await self.permissions.stop()
+        await self.loop_lag.stop()
+        await self.outbound.stop()
         await self.db.close()
         await super().close()
         logger.info("Bot has been closed.")
@@ -61,6 +220,7 @@ class CPO(commands.Bot):
 cpo = CPO()
 
 @cpo.event
+@timed_event
 async def on_command_error(ctx, error):
     if isinstance(error, commands.CommandNotFound):
         await ctx.send("Invalid command. Use `!help` for a list of commands.")
@@ -69,17 +229,21 @@ async def on_command_error(ctx, error):
     elif isinstance(error, commands.BadArgument):
         await ctx.send(f"Bad argument: {str(error)}")
     else:
-        logger.error(f"An error occurred: {error}")
+        logger.error("An error occurred: %s", error)
         await ctx.send("An error occurred while processing the command.")
 
 @cpo.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
+    observe_command(interaction, 'error')
     if isinstance(error, discord.app_commands.CommandOnCooldown):
         await interaction.response.send_message(f"This command is on cooldown. Try again in {error.retry_after:.2f} seconds.", ephemeral=True)
     elif isinstance(error, discord.app_commands.MissingPermissions):
         await interaction.response.send_message("You don't have the required permissions to use this command.", ephemeral=True)
+    elif isinstance(error, ArgumentError):
+        # The transformer may have deferred the interaction already
+        await cpo.components.respond(interaction, str(error), ephemeral=True)
     else:
-        logger.error(f"An error occurred in app command: {error}")
+        logger.error("An error occurred in app command: %s", error)
         await interaction.response.send_message("An error occurred while processing the command.", ephemeral=True)
 
 if __name__ == "__main__":
@@ -87,7 +251,7 @@ if __name__ == "__main__":
         logger.error("DISCORD_BOT_TOKEN not found in .env file")
     elif not BOT_DEVELOPER_ID:
         logger.warning("BOT_DEVELOPER_ID not found in .env file. Some features may be limited.")
-        cpo.run(TOKEN)
+        cpo.run(TOKEN, log_handler=None)  # Logging is already set up above
     else:
         logger.info("Starting the bot...")
-        cpo.run(TOKEN)
\ No newline at end of file
+        cpo.run(TOKEN, log_handler=None)  # Logging is already set up above
\ No newline at end of file
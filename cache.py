@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after `ttl` seconds.
+
+    Cached values are shared between callers, so treat them as read-only.
+
+    Reads that miss go to the database and are stored with `put`. To avoid storing
+    a value read before a concurrent write was invalidated, callers take `epoch`
+    before querying and pass it to `put`; any invalidation in between makes the put
+    a no-op.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value, epoch=None):
+        if epoch is not None and epoch != self.epoch:
+            return
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self.epoch += 1
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.epoch += 1
+        self.entries.clear()
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
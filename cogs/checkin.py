@@ -2,47 +2,66 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from datetime import datetime
-from utils import parse_duration, parse_mentions, parse_seconds_to_hms
-import asyncio
+from utils import Duration, MemberSet, parse_seconds_to_hms
+from scheduler import ShardedScheduler
+from outbound import INTERACTION, REMINDER
+from components import custom_id
+from models import CheckinRecord, CheckinMember
 import logging
 import random
+import time
 import uuid
 
-# Setting up basic configuration for logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class CheckinSession:
     min_duration = 20  # 20 seconds as the minimum duration
     max_members = 10  # 10 members are allowed max
     max_absences = 3  # max absences are 3
-
-    def __init__(self, session_id, creator, channel_id, members, duration):
+    max_sessions_per_user = 5
+    render_quiet_window = 0.75  # Seconds without clicks before a pending embed edit is sent
+    render_max_delay = 2.5  # Longest a click waits to show up in the embed
+    prompt_messages = [
+        "How's your progress?",
+        "Any updates on your task?",
+        "What have you achieved so far?",
+        "Let's hear about your current status!",
+        "How are things going?",
+        "How is your work progressing?",
+        "What have you done since the last check-in?",
+        "What's your status?",
+        "Any progress to report?"
+    ]
+
+    def __init__(self, session_id, creator, channel_id, members, duration, edit_in_place=False, guild_id=None):
         self.session_id = session_id  # Unique session ID
         self.creator = creator
         self.channel_id = channel_id  # Store the channel ID where the session was created
-        self.members = members
+        self.guild_id = guild_id  # Picks the scheduler partition (shard) that owns the session's timers
+        # members, present and exited are dicts used as insertion-ordered sets (values are unused),
+        # so membership checks and removals are O(1) while embeds keep the join order
+        self.members = dict.fromkeys(members)
         self.start_time = datetime.now()
         self.duration = duration
         self.absences = {member: 0 for member in members}
-        self.present = members[:]  # All members are present by default at start
-        self.exited = []
+        self.present = dict.fromkeys(members)  # All members are present by default at start
+        self.exited = {}
         self.last_reminder_message: discord.Message = None  # Track the last reminder message
+        self.view: discord.ui.View = None  # Buttons currently on last_reminder_message, kept so they can be disabled without a fetch
+        self.edit_in_place = edit_in_place  # Reuse one message for every reminder instead of sending a new one (less channel clutter; still an edit plus a ping per reminder)
         self.reminder_count = 0
-        self.max_sessions_per_user = 5
-        self.prompt_messages = [
-            "How's your progress?",
-            "Any updates on your task?",
-            "What have you achieved so far?",
-            "Let's hear about your current status!",
-            "How are things going?",
-            "How is your work progressing?",
-            "What have you done since the last check-in?",
-            "What's your status?",
-            "Any progress to report?"
-        ]
+        self.next_reminder = None  # Wall-clock time of the next reminder, stored so another worker can resume it
         logger.debug("Check-in session created with duration: %s seconds", duration)
 
+    def to_record(self):
+        record = CheckinRecord(self.session_id, self.guild_id, self.channel_id, self.creator.id, self.duration,
+                               self.start_time.timestamp(), self.edit_in_place, self.reminder_count, self.next_reminder,
+                               self.last_reminder_message.id if self.last_reminder_message else None)
+        members = [CheckinMember(self.session_id, member.id, self.absences[member], member in self.present, False)
+                   for member in self.members]
+        members.extend(CheckinMember(self.session_id, member.id, 0, False, True) for member in self.exited)
+        return record, members
+
     """Helper and Update Functions"""
 
     ## Helper Function - Increment Reminder Count
@@ -53,7 +72,7 @@ class CheckinSession:
     ## Helper Function - Move People to Absent
     def move_to_absent(self):
         # Move all present members to absent at the start of each reminder. 
-        self.present = []
+        self.present = {}
         logger.debug("Moving members to absent.")
         return self.members  # Everyone is absent until marked present again
 
@@ -69,9 +88,9 @@ class CheckinSession:
             if self.absences[member] >= 3:
                 removed_members.append(member)
         for member in removed_members:
-            self.members.remove(member)
+            del self.members[member]
             del self.absences[member]
-            self.exited.append(member)
+            self.exited[member] = None
             logger.info("Member removed due to absences: %s", member.display_name)
         return removed_members
     
@@ -87,7 +106,7 @@ class CheckinSession:
         if user in self.present:
             return "You are already marked as present."
 
-        self.present.append(user)
+        self.present[user] = None
         self.absences[user] = 0
         return "You are marked as present."
 
@@ -98,11 +117,10 @@ class CheckinSession:
         if user in self.members:
             return "You are already in the session."
         
-        if user in self.exited:
-            self.exited.remove(user)
+        self.exited.pop(user, None)
 
-        self.members.append(user)
-        self.present.append(user)
+        self.members[user] = None
+        self.present[user] = None
         self.absences[user] = 0
 
         return "You have joined the session."
@@ -112,11 +130,10 @@ class CheckinSession:
     def leave_session(self, user):
         # Remove user from the session and update absent and members lists
 
-        if user in self.present:
-            self.present.remove(user)
+        self.present.pop(user, None)
         if user in self.members:
-            self.members.remove(user)
-            self.exited.append(user)
+            del self.members[user]
+            self.exited[user] = None
             del self.absences[user]
             return "You have left the session."
         return "You are not in the session. based on members check"
@@ -124,7 +141,7 @@ class CheckinSession:
     ## Button Function - End Session
     async def end_session(self, interaction: discord.Interaction, bot: commands.Bot, button_session_id: str, session):
         # End the session and send the final message
-        logger.info(f"End session initiated by {interaction.user.display_name} for session {button_session_id}.")
+        logger.info("End session initiated by %s for session %s.", interaction.user.display_name, button_session_id)
 
         # Verify that the user is the creator
         if not session.can_end(interaction.user):
@@ -140,37 +157,33 @@ class CheckinSession:
 
         try:
             # Send the final message to the channel
-            logger.debug(f"Sending final end session message in session {button_session_id}.")
-            await interaction.channel.send(embed=embed)
+            logger.debug("Sending final end session message in session %s.", button_session_id)
+            await bot.outbound.send(interaction.channel, priority=INTERACTION, embed=embed)
 
         except discord.HTTPException as e:
-            logger.error(f"Failed to send end session message for session {button_session_id}: {str(e)}")
+            logger.error("Failed to send end session message for session %s: %s", button_session_id, str(e))
 
         cog = bot.get_cog("CheckinCog")
-        # Disable the buttons of the last reminder message
         if cog:
+            # Disable the buttons of the last reminder message (before clear_session_data forgets it)
+            try:
+                await cog.disable_previous_buttons(session, interaction.channel)
+                logger.info("End Session Function: Successfully disabled previous buttons in session %s.", button_session_id)
+            except Exception as e:
+                logger.error("End Session Function: An error occurred while disabling previous buttons in session %s: %s", button_session_id, str(e))
+
             if button_session_id in cog.active_sessions:
-                logger.info(f"Deleting session for session ID {button_session_id} from active_sessions.")
-                del cog.active_sessions[button_session_id]
+                logger.info("Deleting session for session ID %s from active_sessions.", button_session_id)
+                await cog.remove_session(button_session_id)
                 # Explicitly clear the session's data
                 await self.clear_session_data()
             else:
-                logger.warning(f"Tried to delete session for session ID {button_session_id} but it was already deleted.")
-
-            # Disable buttons in the last reminder message using the method from the CheckinCog class
-            try:
-                # Disable buttons in the last reminder message using the method from the CheckinCog class
-                await cog.disable_previous_buttons(session, interaction.channel)
-                logger.info(f"End Session Function: Successfully disabled previous buttons in session {button_session_id}.")
-            except discord.HTTPException as e:
-                logger.error(f"End Session Function: Failed to disable previous buttons in session {button_session_id}: {str(e)}")
-            except Exception as e:
-                logger.error(f"End Session Function: An error occurred while disabling previous buttons in session {button_session_id}: {str(e)}")
+                logger.warning("Tried to delete session for session ID %s but it was already deleted.", button_session_id)
 
         
         
         # Send a confirmation message to the creator (optional)
-        logger.info(f"Check-in session {button_session_id} successfully ended by {interaction.user.display_name}.")
+        logger.info("Check-in session %s successfully ended by %s.", button_session_id, interaction.user.display_name)
 
         # Return the response message for the user
         return f"Check-in session has been manually ended by {session.creator.mention}."
@@ -191,8 +204,9 @@ class CheckinSession:
         self.exited.clear()
         self.absences.clear()
         self.last_reminder_message = None
+        self.view = None
         self.reminder_count = 0
-        logger.debug(f"Session data for session {self.session_id} cleared successfully.")
+        logger.debug("Session data for session %s cleared successfully.", self.session_id)
 
 
 
@@ -204,8 +218,24 @@ class CheckinCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.active_sessions = {}
+        self.creator_sessions = {}  # (creator_id, channel_id) -> set of session IDs
+        self.pending_renders = {}  # message ID -> loop time of the first click not yet rendered
+        # One timer heap per shard for its guilds' reminders instead of a sleeping task per session
+        self.scheduler = ShardedScheduler("checkin", lambda: bot.shard_count or 1)
         logger.debug("Check-in Cog initialized.")
 
+    async def cog_load(self):
+        self.scheduler.start()
+        # Buttons carry custom_ids like 'checkin:present:<session_id>'
+        self.bot.components.register('checkin', self.on_button)
+        # Sessions are run by whichever worker holds their lease ('checkin:<session_id>')
+        self.bot.leases.register('checkin', self.take_over_session, self.drop_session)
+
+    async def cog_unload(self):
+        self.bot.leases.unregister('checkin')
+        self.bot.components.unregister('checkin')
+        await self.scheduler.stop()
+
     
 
     """Helper Functions"""
@@ -213,14 +243,51 @@ class CheckinCog(commands.Cog):
     ## Helper Function - Generate Session ID
     def generate_session_id(self):
         return str(uuid.uuid4())  # Generates a random unique session ID
+
+    ## Helper Function - Register Session
+    def add_session(self, session: CheckinSession):
+        self.active_sessions[session.session_id] = session
+        self.creator_sessions.setdefault((session.creator.id, session.channel_id), set()).add(session.session_id)
+
+    ## Helper Function - Remove Session (also drops its pending reminder, stored state and lease)
+    async def remove_session(self, session_id: str):
+        session = self.forget_session(session_id)
+        if session is not None:
+            await self.bot.db.delete_checkin_session(session_id)
+            await self.bot.leases.release('checkin', session_id)
+        return session
+
+    ## Helper Function - Forget Session (this worker only, the stored session stays)
+    def forget_session(self, session_id: str):
+        session = self.active_sessions.pop(session_id, None)
+        if session is None:
+            return None
+        key = (session.creator.id, session.channel_id)
+        session_ids = self.creator_sessions.get(key)
+        if session_ids is not None:
+            session_ids.discard(session_id)
+            if not session_ids:
+                del self.creator_sessions[key]
+        self.scheduler.cancel(session_id, session.guild_id)
+        return session
+
+    ## Helper Function - Save Session
+    async def save_session(self, session: CheckinSession):
+        # Only the lease holder writes, a worker that lost the session must not overwrite the new holder's state
+        if self.bot.leases.holds('checkin', session.session_id):
+            await self.bot.db.save_checkin_session(*session.to_record())
+
+    ## Helper Function - Count a creator's sessions in a channel
+    def count_creator_sessions(self, creator_id: int, channel_id: int) -> int:
+        return len(self.creator_sessions.get((creator_id, channel_id), ()))
     
     ## Helpper Function - Check if the user is in ANY session
     async def check_session_exists(self, session_id: str, interaction: discord.Interaction) -> CheckinSession:
         # Check if a session exists by session ID
         session: CheckinSession = self.active_sessions.get(session_id)
         if not session:
-            logger.warning(f"Session with ID {session_id} does not exist.")
-            await interaction.response.send_message("The session you're interacting with no longer exists.", ephemeral=True)
+            logger.warning("Session with ID %s does not exist.", session_id)
+            await self.bot.components.respond(interaction, "The session you're interacting with no longer exists.", ephemeral=True)
             return None
         return session
 
@@ -228,8 +295,8 @@ class CheckinCog(commands.Cog):
     async def check_user_in_session(self, session: CheckinSession, user: discord.User, interaction: discord.Interaction) -> bool:
         # Check if the user is part of the session
         if user not in session.members:
-            logger.info(f"User {user.display_name} tried to interact with a session they're not part of.")
-            await interaction.response.send_message("You are not part of this session.", ephemeral=True)
+            logger.info("User %s tried to interact with a session they're not part of.", user.display_name)
+            await self.bot.components.respond(interaction, "You are not part of this session.", ephemeral=True)
             return False
         return True
 
@@ -277,7 +344,36 @@ class CheckinCog(commands.Cog):
     async def update_embed(self, message, session : CheckinSession):
         # Update the message embed after any interaction. 
         embed = self.create_embed(session)
-        await message.edit(embed=embed)
+        await self.bot.outbound.edit(message, priority=INTERACTION, embed=embed)
+
+
+    ## Embed Function - Request Embed Update
+    def request_embed_update(self, message, session : CheckinSession):
+        # Debounce edits per message: a burst of clicks becomes one edit with the latest state,
+        # sent once clicks pause for render_quiet_window or after render_max_delay at most
+        now = self.scheduler.now()
+        first_request = self.pending_renders.setdefault(message.id, now)
+        deadline = min(now + CheckinSession.render_quiet_window, first_request + CheckinSession.render_max_delay)
+        self.scheduler.schedule(('render', message.id), deadline, lambda: self.flush_embed(message, session), session.guild_id)
+
+
+    ## Embed Function - Flush Embed
+    async def flush_embed(self, message, session : CheckinSession):
+        self.pending_renders.pop(message.id, None)
+        if session.session_id not in self.active_sessions:
+            return
+        try:
+            await self.update_embed(message, session)
+        except discord.HTTPException as e:
+            logger.error("Failed to update embed for session %s: %s", session.session_id, str(e))
+        # Clicks are stored with the edit they triggered rather than one write per click
+        await self.save_session(session)
+
+
+    ## Embed Function - Cancel Embed Update
+    def cancel_embed_update(self, message_id, guild_id=None):
+        if self.pending_renders.pop(message_id, None) is not None:
+            self.scheduler.cancel(('render', message_id), guild_id)
     
 
     ## Button Function - Create Buttons
@@ -286,11 +382,11 @@ class CheckinCog(commands.Cog):
         view = discord.ui.View()
 
         if not initial:
-            view.add_item(discord.ui.Button(label='Present', style=discord.ButtonStyle.success, custom_id=f'present_{session.session_id}'))
+            view.add_item(discord.ui.Button(label='Present', style=discord.ButtonStyle.success, custom_id=custom_id('checkin', 'present', session.session_id)))
 
-        view.add_item(discord.ui.Button(label='Join', style=discord.ButtonStyle.primary, custom_id=f'join_{session.session_id}'))
-        view.add_item(discord.ui.Button(label='Leave', style=discord.ButtonStyle.danger, custom_id=f'leave_{session.session_id}'))
-        view.add_item(discord.ui.Button(label='End', style=discord.ButtonStyle.secondary, custom_id=f'end_{session.session_id}'))
+        view.add_item(discord.ui.Button(label='Join', style=discord.ButtonStyle.primary, custom_id=custom_id('checkin', 'join', session.session_id)))
+        view.add_item(discord.ui.Button(label='Leave', style=discord.ButtonStyle.danger, custom_id=custom_id('checkin', 'leave', session.session_id)))
+        view.add_item(discord.ui.Button(label='End', style=discord.ButtonStyle.secondary, custom_id=custom_id('checkin', 'end', session.session_id)))
 
         return view
     
@@ -303,88 +399,177 @@ class CheckinCog(commands.Cog):
         # Create and send the initial message
         embed = self.create_embed(session, initial=True)
         view = self.create_buttons(session, initial=True)
-        initial_message = await channel.send(embed=embed, view=view)
+        initial_message = await self.bot.outbound.send(channel, priority=INTERACTION, embed=embed, view=view)
 
         session.last_reminder_message = initial_message
+        session.view = view
         
-        # Start the reminder loop
-        self.bot.loop.create_task(self.run_checkin_reminders(channel, session))
+        # Schedule the first reminder
+        self.schedule_reminder(channel, session)
+        await self.save_session(session)
+
+
+    ## Helper Function - Schedule the next reminder for a session
+    def schedule_reminder(self, channel, session : CheckinSession, delay=None):
+        delay = session.duration if delay is None else delay
+        session.next_reminder = time.time() + delay
+        self.scheduler.schedule(session.session_id, self.scheduler.now() + delay,
+                                lambda: self.send_reminder(channel, session), session.guild_id)
 
 
     ## Message Function - Send Reminder Message
-    async def run_checkin_reminders(self, channel, session : CheckinSession):    
-
-        while session.session_id in self.active_sessions:
-            await asyncio.sleep(session.duration)
-            
-            # Check if session still exists in active_sessions
-            if session.session_id not in self.active_sessions:
-                logger.info(f"Session {session.session_id} has ended and was removed. Stopping reminder loop.")
-                return  # Break out of the reminder loop since the session has ended.
-            
-            logger.info(f"Session {session.session_id} exists and it continues.")
-            
-            # Increment reminder_count
-            session.increment_reminder()
-            
-            # First, disable the buttons of the previous reminder message
+    async def send_reminder(self, channel, session : CheckinSession):    
+
+        # Check if session still exists in active_sessions
+        if session.session_id not in self.active_sessions:
+            logger.info("Session %s has ended and was removed. Skipping reminder.", session.session_id)
+            return
+
+        # Make sure no other worker has taken the session over before pinging anyone
+        if not await self.bot.leases.confirm('checkin', session.session_id):
+            await self.drop_session(session.session_id)
+            return
+        
+        logger.info("Session %s exists and it continues.", session.session_id)
+        
+        # Increment reminder_count
+        session.increment_reminder()
+
+        # A pending edit of the previous message would show the next round's state, drop it
+        if session.last_reminder_message:
+            self.cancel_embed_update(session.last_reminder_message.id, session.guild_id)
+        
+        # First, disable the buttons of the previous reminder message (edit-in-place mode replaces them instead)
+        if not session.edit_in_place:
             await self.disable_previous_buttons(session, channel)
-            
-            # Move present members to absent, update absences, and handle removals
-            session.move_to_absent()
-            removed_members = session.update_absences()
-
-            # If no members left, end the session
-            if not session.members:
-                embed = discord.Embed(
-                    title="Check-in Session Ended",
-                    description="No more members are left in the session.",
-                    color=discord.Color.red()
-                )
-                logger.info("Session ended due to no remaining members.")
-                await channel.send(embed=embed)
+        
+        # Move present members to absent, update absences, and handle removals
+        session.move_to_absent()
+        removed_members = session.update_absences()
+
+        # If no members left, end the session
+        if not session.members:
+            embed = discord.Embed(
+                title="Check-in Session Ended",
+                description="No more members are left in the session.",
+                color=discord.Color.red()
+            )
+            logger.info("Session ended due to no remaining members.")
+            await self.remove_session(session.session_id)
+            if session.edit_in_place:
+                await self.disable_previous_buttons(session, channel)
+            await self.bot.outbound.send(channel, embed=embed)
+            return
+
+        # Schedule the next reminder before any API call, so a failed send doesn't end the session
+        self.schedule_reminder(channel, session)
+
+        members_mention_msg = ", ".join([member.mention for member in session.members])
+        # Send the reminder message
+        embed = self.create_embed(session)
+        view = self.create_buttons(session)
+
+        if session.edit_in_place and session.last_reminder_message:
+            # Refresh the session's one message, then ping with a short reply pointing at it
+            # (an edit alone doesn't notify anyone). That is two requests, the same as the default
+            # path's button disable plus new message; this mode only keeps the channel tidier.
+            message = channel.get_partial_message(session.last_reminder_message.id)
+            try:
+                await self.bot.outbound.edit(message, priority=REMINDER, embed=embed, view=view)
+                session.view = view
+            except discord.NotFound:
+                logger.warning("Check-in message for session %s is gone, sending a new one.", session.session_id)
+            else:
+                await self.save_session(session)
+                await self.bot.outbound.send(channel, priority=REMINDER, content=members_mention_msg,
+                                             reference=message.to_reference(fail_if_not_exists=False))
+                logger.info("Reminder %s edited in place with updated members.", session.reminder_count)
                 return
 
-            members_mention_msg = ", ".join([member.mention for member in session.members])
-            # Send the reminder message
-            embed = self.create_embed(session)
-            view = self.create_buttons(session)
-            reminder_message = await channel.send(content = members_mention_msg, embed=embed, view=view)
+        reminder_message = await self.bot.outbound.send(channel, priority=REMINDER, content=members_mention_msg, embed=embed, view=view)
+
+        session.last_reminder_message = reminder_message
+        session.view = view
+        await self.save_session(session)
+
+        logger.info("Reminder %s sent with updated members.", session.reminder_count)
+
+
+    """Takeover Functions"""
+
+    ## Takeover Function - Resume a session claimed from a worker that stopped renewing its lease
+    async def take_over_session(self, session_id: str):
+        stored = await self.bot.db.get_checkin_session(session_id)
+        if stored is None:
+            return False
+        record, stored_members = stored
+        guild = self.bot.get_guild(record.guild_id)
+        channel = self.bot.get_channel(record.channel_id)
+        if guild is None or channel is None:
+            logger.info("Channel of check-in session %s is gone, dropping the session.", session_id)
+            await self.bot.db.delete_checkin_session(session_id)
+            return False
 
-            session.last_reminder_message = reminder_message
+        # Members aren't necessarily cached in a lean gateway profile
+        await self.bot.member_loader.fetch_missing(guild, [record.creator_id] + [member.user_id for member in stored_members])
+        creator = guild.get_member(record.creator_id)
+        if creator is None:
+            logger.info("Creator of check-in session %s left the server, dropping the session.", session_id)
+            await self.bot.db.delete_checkin_session(session_id)
+            return False
+        active = [(guild.get_member(member.user_id), member) for member in stored_members if not member.exited]
+        active = [(member, stored) for member, stored in active if member is not None]
+
+        session = CheckinSession(session_id=session_id, creator=creator, channel_id=record.channel_id,
+                                 members=[member for member, _ in active], duration=record.duration,
+                                 edit_in_place=bool(record.edit_in_place), guild_id=record.guild_id)
+        session.start_time = datetime.fromtimestamp(record.start_time)
+        session.reminder_count = record.reminder_count
+        session.absences = {member: stored.absences for member, stored in active}
+        session.present = {member: None for member, stored in active if stored.present}
+        session.exited = dict.fromkeys(filter(None, (guild.get_member(member.user_id)
+                                                     for member in stored_members if member.exited)))
+        if record.last_message_id:
+            # Rebuild the view that was sent with it, so its buttons can still be disabled
+            session.last_reminder_message = channel.get_partial_message(record.last_message_id)
+            session.view = self.create_buttons(session, initial=record.reminder_count == 0)
+
+        self.add_session(session)
+        delay = max(0.0, (record.next_reminder or time.time()) - time.time())
+        self.schedule_reminder(channel, session, delay)
+        logger.info("Resumed check-in session %s, next reminder in %.0fs.", session_id, delay)
+        return True
 
-            logger.info(f"Reminder {session.reminder_count} sent with updated members.")
+    ## Takeover Function - Stop running a session another worker has taken over
+    async def drop_session(self, session_id: str):
+        session = self.forget_session(session_id)
+        if session is not None:
+            if session.last_reminder_message:
+                self.cancel_embed_update(session.last_reminder_message.id, session.guild_id)
+            logger.info("Stopped running check-in session %s, its lease moved to another worker.", session_id)
 
 
     ## Message Function - Disable Previous Buttons    
     async def disable_previous_buttons(self, session: CheckinSession, channel: discord.TextChannel):
         
-        # Disable the buttons in the last reminder message, if it exists
-        if session.last_reminder_message:
+        # Disable the buttons in the last reminder message, if it exists. The view that was sent
+        # with it is kept on the session, so this is a single edit by message ID without a fetch
+        if session.last_reminder_message and session.view:
             try:
-                # Fetch the last reminder message from the channel
-                last_message = await channel.fetch_message(session.last_reminder_message.id)
-
-                # Create a new view
-                new_view = discord.ui.View()
-
-                # Loop through the components and disable the buttons
-                for component in last_message.components:
-                    for item in component.children:
-                        if isinstance(item, discord.ui.Button):
-                            item.disabled = True  # Disable each button
-                            new_view.add_item(item)  # Add the disabled button to the new view
+                for item in session.view.children:
+                    if isinstance(item, discord.ui.Button):
+                        item.disabled = True
 
-                # Edit the last reminder message to disable the buttons
-                await last_message.edit(view=new_view)
+                await self.bot.outbound.edit(channel.get_partial_message(session.last_reminder_message.id), view=session.view)
+                session.view = None
                 logger.info("Disabled buttons in the previous reminder message.")
 
             except discord.NotFound:
-                logger.warning(f"Previous reminder message not found (ID: {session.last_reminder_message.id}).")
+                logger.warning("Previous reminder message not found (ID: %s).", session.last_reminder_message.id)
             except discord.HTTPException as e:
-                logger.error(f"Failed to disable buttons in previous reminder message: {str(e)}")
+                logger.error("Failed to disable buttons in previous reminder message: %s", str(e))
             except Exception as e:
-                logger.error(f"Unexpected error disabling buttons: {str(e)}")
+                logger.error("Unexpected error disabling buttons: %s", str(e))
 
 
 
@@ -393,39 +578,27 @@ class CheckinCog(commands.Cog):
     
     ## Command - /checkin
     @app_commands.command(name='checkin', description='Starts a check-in session with specified duration and mentions.')
-    async def start_checkin(self, interaction : discord.Interaction, duration: str, *, mentions: str):
-        # Parse the duration
-        duration_seconds = parse_duration(duration)
-        # Parse mentions (users/roles)
-        members = parse_mentions(interaction, mentions)
-        
-        # Check - Wrong format entered, hence function returned None
-        if duration_seconds == None:
-            logger.warning("Wrong duration format entered.")
-            await interaction.response.send_message(f"Wrong duration format used. Use \'2d 14h 25m 30s\' or use day(s) hour(s)/hr(s) minute(s)/min(s) second(s)/sec(s)", ephemeral=True)
-            return
-        # Check - Duration entered is too short
-        if duration_seconds < CheckinSession.min_duration:
-            logger.warning("Attempted to start a session with insufficient duration.")
-            await interaction.response.send_message(f"Duration must be at least {parse_seconds_to_hms(CheckinSession.min_duration)}", ephemeral=True)
-            return
+    @app_commands.describe(
+        duration="Time between reminders, e.g. '30m' or '1h 15m'",
+        mentions="Users and roles to check in with",
+        edit_in_place="Keep one message updated instead of posting one per reminder (less clutter, not fewer requests)"
+    )
+    async def start_checkin(self, interaction : discord.Interaction,
+                            duration: app_commands.Transform[int, Duration(minimum=CheckinSession.min_duration)],
+                            *, mentions: app_commands.Transform[list, MemberSet], edit_in_place: bool = False):
+        # duration (seconds) and mentions (unique members) are parsed and validated by their transformers
+        duration_seconds = duration
+        members = mentions
 
         # Check - Too many members
         if len(members) > CheckinSession.max_members:
             logger.warning("Attempted to start a session with too many members.")
-            await interaction.response.send_message(f"A session can't have more than {CheckinSession.max_members} members.")
-            return
-
-        # Check - Valid members
-        if not members:
-            logger.error("No valid members found for check-in session.")
-            await interaction.response.send_message("No valid members found in the mentions. Please mention valid users or roles.", ephemeral=True)
+            await self.bot.components.respond(interaction, f"A session can't have more than {CheckinSession.max_members} members.")
             return
 
         # Check - User exceeded max sessions
-        user_sessions = [sid for sid, s in self.active_sessions.items() if s.creator == interaction.user and s.channel_id == interaction.channel.id]
-        if len(user_sessions) >= 5:  # Arbitrary limit, change as needed
-            await interaction.response.send_message(f"{interaction.user.display_name}, you already have the maximum number of active sessions in this channel.")
+        if self.count_creator_sessions(interaction.user.id, interaction.channel.id) >= CheckinSession.max_sessions_per_user:
+            await self.bot.components.respond(interaction, f"{interaction.user.display_name}, you already have the maximum number of active sessions in this channel.")
             return
         
         # Add - Add creator in the members list
@@ -436,33 +609,35 @@ class CheckinCog(commands.Cog):
         session_id = self.generate_session_id()
         
         # Create a new session and save it
-        session = CheckinSession(session_id=session_id, creator=interaction.user, channel_id=interaction.channel.id, members=members, duration=duration_seconds)
-        self.active_sessions[session_id] = session  # Store session by its ID
-        logger.info(f"Check-in session with ID {session_id} started by {interaction.user.display_name} in channel {interaction.channel.id}.")
+        session = CheckinSession(session_id=session_id, creator=interaction.user, channel_id=interaction.channel.id, members=members, duration=duration_seconds, edit_in_place=edit_in_place, guild_id=interaction.guild_id)
+
+        # Claim the session before registering it, so a failed claim leaves nothing behind
+        try:
+            acquired = await self.bot.leases.acquire('checkin', session_id, interaction.guild_id)
+        except Exception as e:
+            logger.error("Failed to claim check-in session %s: %s", session_id, str(e))
+            acquired = False
+        if not acquired:
+            await self.bot.components.respond(interaction, "Couldn't start the check-in session, please try again.", ephemeral=True)
+            return
+        self.add_session(session)  # Store session by its ID
+        logger.info("Check-in session with ID %s started by %s in channel %s.", session_id, interaction.user.display_name, interaction.channel.id)
 
         # Send the initial message with buttons
         await self.send_initial_message(interaction.channel, session)
 
+        # Close out the "thinking" state if MemberSet deferred while loading the member list
+        if interaction.response.is_done():
+            await self.bot.components.respond(interaction, "Check-in session started.", ephemeral=True)
+
 
     
-    ## Listener - Button Clicks
-    @commands.Cog.listener()
-    async def on_interaction(self, interaction: discord.Interaction):
+    ## Component Handler - Button Clicks (routed by bot.components for 'checkin:<action>:<session_id>')
+    async def on_button(self, interaction: discord.Interaction, argument: str):
         
         result = ""
-        button_session_id = ""
-        session: CheckinSession = None
-
-        if interaction.type != discord.InteractionType.component:
-            return  # Ignore non-button interactions
-
-        custom_id = interaction.data.get('custom_id')
-        logger.info(f"Custom ID Looks like this: {custom_id}")
-        
-        if custom_id:  # Ensure custom_id exists
-            action, button_session_id = custom_id.split('_')
-            logger.info(f'SessionID: {button_session_id}')
-            logger.info(f"Action: {action}")  # Extract the action and session_id
+        action, _, button_session_id = argument.partition(':')
+        logger.debug("Check-in button %s clicked for session %s", action, button_session_id)
 
         session = await self.check_session_exists(button_session_id, interaction)
         if not session:
@@ -483,44 +658,36 @@ class CheckinCog(commands.Cog):
 
             # Handle End Button
             elif action == 'end':
-                logger.debug(f"User {interaction.user.display_name} clicked the 'End' button for session {button_session_id}.")
+                logger.debug("User %s clicked the 'End' button for session %s.", interaction.user.display_name, button_session_id)
 
                 # Retrieve the session using session_id
                 session =  self.active_sessions.get(button_session_id)
 
                 # Check if the user has permission to end the session (must be the creator)
                 if session and session.can_end(interaction.user):
-                    
-                    try:
-                        # Disable buttons in the last reminder message using the method from the CheckinCog class
-                        await self.disable_previous_buttons(session, interaction.channel)
-                        logger.info(f"Cog Event Listener: Successfully disabled previous buttons in session {button_session_id}.")
-                    except discord.HTTPException as e:
-                        logger.error(f"Cog Event Listener: Failed to disable previous buttons in session {button_session_id}: {str(e)}")
-                    except Exception as e:
-                        logger.error(f"Cog Event Listener: An error occurred while disabling previous buttons in session {button_session_id}: {str(e)}")
-                    
-                    logger.info(f"User {interaction.user.display_name} is the creator and has permission to end the session.")
+                    # end_session disables the buttons of the last message
+                    logger.info("User %s is the creator and has permission to end the session.", interaction.user.display_name)
+                    self.cancel_embed_update(interaction.message.id, session.guild_id)
                     response = await session.end_session(interaction, self.bot, button_session_id, session)
                     
                     logger.debug("Sending response message to the user indicating the session was ended.")
-                    await interaction.response.send_message(response)
+                    await self.bot.components.respond(interaction, response)
                     
                     logger.info("Session ended successfully. No further interaction will be processed.")
                     return
                 
                 else:
                     # If the user is not the creator or session is not found, log the denial
-                    logger.warning(f"User {interaction.user.display_name} tried to end the session but is not the creator or session does not exist.")
+                    logger.warning("User %s tried to end the session but is not the creator or session does not exist.", interaction.user.display_name)
                     result = "Only the session creator can end the session."
 
-        # If there's a result, send it as a follow-up
+        # Acknowledge right away; the embed catches up in one debounced edit
         if result:
-            await interaction.response.defer()
-            await interaction.followup.send(result, ephemeral=True)
+            await self.bot.components.respond(interaction, result, ephemeral=True)
+        else:
+            await self.bot.components.defer(interaction)
 
-        # Update the embed after the interaction
-        await self.update_embed(interaction.message, session)
+        self.request_embed_update(interaction.message, session)
 
 
 
@@ -2,91 +2,81 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import logging
+import time
+import metrics
+from permissions import PermissionLevel
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-class PermissionLevel:
-    BOT_DEVELOPER = 3
-    GUILD_MANAGER = 2
-    GROUP_CREATOR = 1
-    REGULAR_USER = 0
-
 class Manager(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         logger.info("Manager cog initialized")
 
     async def get_permission_level(self, guild_id, user_id):
-        if user_id == self.bot.bot_developer_id:
-            logger.debug(f"User {user_id} identified as bot developer")
-            return PermissionLevel.BOT_DEVELOPER
-
-        manager = await self.bot.db.get_manager(user_id, guild_id)
-        if manager:
-            permission_level = manager['permission_level']
-            logger.debug(f"User {user_id} has permission level {permission_level}")
-            return permission_level
-        logger.debug(f"User {user_id} has regular user permissions")
-        return PermissionLevel.REGULAR_USER
+        # Answered from memory, see permissions.py
+        permission_level = self.bot.permissions.level(guild_id, user_id)
+        logger.debug("User %s has permission level %s", user_id, permission_level)
+        return permission_level
 
     @app_commands.command(name="add_bot_developer", description="Add a bot developer (Bot Developer only)")
     @app_commands.describe(user="The user to add as a bot developer")
     async def add_bot_developer(self, interaction: discord.Interaction, user: discord.User):
-        logger.info(f"Attempt to add bot developer: {user.id} by user: {interaction.user.id}")
+        logger.info("Attempt to add bot developer: %s by user: %s", user.id, interaction.user.id)
         if await self.get_permission_level(interaction.guild_id, interaction.user.id) != PermissionLevel.BOT_DEVELOPER:
-            logger.warning(f"User {interaction.user.id} attempted to add bot developer without permission")
+            logger.warning("User %s attempted to add bot developer without permission", interaction.user.id)
             await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
             return
 
-        await self.bot.db.add_manager(user.id, None, PermissionLevel.BOT_DEVELOPER)
-        logger.info(f"Added {user.id} as bot developer")
+        await self.bot.permissions.add_manager(user.id, None, PermissionLevel.BOT_DEVELOPER)
+        logger.info("Added %s as bot developer", user.id)
         await interaction.response.send_message(f"{user.name} has been added as a bot developer.", ephemeral=True)
 
     @app_commands.command(name="add_guild_manager", description="Add a guild manager (Bot Developer only)")
     @app_commands.describe(user="The user to add as a guild manager")
     async def add_guild_manager(self, interaction: discord.Interaction, user: discord.User):
-        logger.info(f"Attempt to add guild manager: {user.id} by user: {interaction.user.id}")
+        logger.info("Attempt to add guild manager: %s by user: %s", user.id, interaction.user.id)
         if await self.get_permission_level(interaction.guild_id, interaction.user.id) != PermissionLevel.BOT_DEVELOPER:
-            logger.warning(f"User {interaction.user.id} attempted to add guild manager without permission")
+            logger.warning("User %s attempted to add guild manager without permission", interaction.user.id)
             await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
             return
 
-        await self.bot.db.add_manager(user.id, interaction.guild_id, PermissionLevel.GUILD_MANAGER)
-        logger.info(f"Added {user.id} as guild manager for guild {interaction.guild_id}")
+        await self.bot.permissions.add_manager(user.id, interaction.guild_id, PermissionLevel.GUILD_MANAGER)
+        logger.info("Added %s as guild manager for guild %s", user.id, interaction.guild_id)
         await interaction.response.send_message(f"{user.name} has been added as a guild manager for this server.", ephemeral=True)
 
     @app_commands.command(name="remove_guild_manager", description="Remove a guild manager (Bot Developer only)")
     @app_commands.describe(user="The user to remove as a guild manager")
     async def remove_guild_manager(self, interaction: discord.Interaction, user: discord.User):
-        logger.info(f"Attempt to remove guild manager: {user.id} by user: {interaction.user.id}")
+        logger.info("Attempt to remove guild manager: %s by user: %s", user.id, interaction.user.id)
         if await self.get_permission_level(interaction.guild_id, interaction.user.id) != PermissionLevel.BOT_DEVELOPER:
-            logger.warning(f"User {interaction.user.id} attempted to remove guild manager without permission")
+            logger.warning("User %s attempted to remove guild manager without permission", interaction.user.id)
             await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
             return
 
-        await self.bot.db.remove_manager(user.id, interaction.guild_id)
-        logger.info(f"Removed {user.id} as guild manager for guild {interaction.guild_id}")
+        await self.bot.permissions.remove_manager(user.id, interaction.guild_id)
+        logger.info("Removed %s as guild manager for guild %s", user.id, interaction.guild_id)
         await interaction.response.send_message(f"{user.name} has been removed as a guild manager for this server.", ephemeral=True)
 
     @app_commands.command(name="list_managers", description="List all managers for this server")
     async def list_managers(self, interaction: discord.Interaction):
-        logger.info(f"Listing managers for guild {interaction.guild_id}")
+        logger.info("Listing managers for guild %s", interaction.guild_id)
         managers = await self.bot.db.get_all_managers(interaction.guild_id)
         
         embed = discord.Embed(title="Managers", color=discord.Color.blue())
         for manager in managers:
-            user = await self.bot.fetch_user(manager['user_id'])
-            level = "Bot Developer" if manager['guild_id'] is None else "Guild Manager"
+            user = await self.bot.fetch_user(manager.user_id)
+            level = "Bot Developer" if manager.guild_id is None else "Guild Manager"
             embed.add_field(name=f"{user.name}#{user.discriminator}", value=level, inline=False)
 
-        logger.debug(f"Found {len(managers)} managers for guild {interaction.guild_id}")
+        logger.debug("Found %s managers for guild %s", len(managers), interaction.guild_id)
         await interaction.response.send_message(embed=embed)
 
     async def is_group_creator(self, guild_id, user_id):
         group = await self.bot.db.get_study_group(guild_id)
-        is_creator = group and group['creator_id'] == user_id
-        logger.debug(f"Checked if user {user_id} is group creator for guild {guild_id}: {is_creator}")
+        is_creator = group and group.creator_id == user_id
+        logger.debug("Checked if user %s is group creator for guild %s: %s", user_id, guild_id, is_creator)
         return is_creator
 
     @app_commands.command(name="set_permission_level", description="Set the permission level for a user (Bot Developer only)")
@@ -95,28 +85,56 @@ class Manager(commands.Cog):
         level="The permission level to set (0: Regular User, 1: Group Creator, 2: Guild Manager, 3: Bot Developer)"
     )
     async def set_permission_level(self, interaction: discord.Interaction, user: discord.User, level: int):
-        logger.info(f"Attempt to set permission level for user {user.id} to level {level} by user {interaction.user.id}")
+        logger.info("Attempt to set permission level for user %s to level %s by user %s", user.id, level, interaction.user.id)
         if await self.get_permission_level(interaction.guild_id, interaction.user.id) != PermissionLevel.BOT_DEVELOPER:
-            logger.warning(f"User {interaction.user.id} attempted to set permission level without being a Bot Developer")
+            logger.warning("User %s attempted to set permission level without being a Bot Developer", interaction.user.id)
             await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
             return
 
         if level not in [0, 1, 2, 3]:
-            logger.warning(f"Invalid permission level {level} specified")
+            logger.warning("Invalid permission level %s specified", level)
             await interaction.response.send_message("Invalid permission level. Please use 0, 1, 2, or 3.", ephemeral=True)
             return
 
-        if level == 0:
-            await self.bot.db.remove_manager(user.id, interaction.guild_id)
-            logger.info(f"Removed all permissions for user {user.id}")
-        else:
-            guild_id = None if level == PermissionLevel.BOT_DEVELOPER else interaction.guild_id
-            await self.bot.db.add_manager(user.id, guild_id, level)
-            logger.info(f"Set permission level {level} for user {user.id} in guild {guild_id}")
+        await self.bot.permissions.set_permission_level(user.id, interaction.guild_id, level)
+        logger.info("Set permission level %s for user %s in guild %s", level, user.id, interaction.guild_id)
 
         permission_names = ["Regular User", "Group Creator", "Guild Manager", "Bot Developer"]
         await interaction.response.send_message(f"Set {user.name}'s permission level to {permission_names[level]}.", ephemeral=True)
 
+    @app_commands.command(name="bot_stats", description="Show command, database and event loop metrics (Guild Manager or above)")
+    async def show_bot_stats(self, interaction: discord.Interaction):
+        logger.info("bot_stats requested by user %s", interaction.user.id)
+        if await self.get_permission_level(interaction.guild_id, interaction.user.id) < PermissionLevel.GUILD_MANAGER:
+            logger.warning("User %s attempted to view bot stats without permission", interaction.user.id)
+            await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+            return
+
+        def rows(histogram, extra=None):
+            lines = []
+            for label, count, avg, p99 in metrics.top_series(histogram):
+                line = f"`{label}` {count}x, avg {avg * 1000:.1f} ms, p99 ≤ {p99 * 1000:.0f} ms"
+                if extra:
+                    line += extra(label)
+                lines.append(line)
+            return "\n".join(lines) or "No data yet"
+
+        failed = sum(value for (_, status), value in metrics.COMMANDS.values.items() if status != 'ok')
+        total = sum(metrics.COMMANDS.values.values())
+        lock_wait = lambda method: f", lock wait avg {metrics.DB_LOCK_WAIT.total(method) / max(1, metrics.DB_LOCK_WAIT.count(method)) * 1000:.2f} ms"
+        outbound = self.bot.outbound.stats()
+
+        embed = discord.Embed(title="Bot Stats", color=discord.Color.blue())
+        embed.add_field(name="Uptime", value=str(int(time.time() - metrics.STARTED)) + "s", inline=True)
+        embed.add_field(name="Gateway Latency", value=f"{self.bot.latency * 1000:.0f} ms", inline=True)
+        embed.add_field(name=f"Shards ({self.bot.shard_count or 1})", value=", ".join(f"{shard_id}: {latency * 1000:.0f} ms" for shard_id, latency in self.bot.latencies) or "Not connected", inline=True)
+        embed.add_field(name="Event Loop Lag", value=f"last {self.bot.loop_lag.last * 1000:.1f} ms, p99 ≤ {metrics.LOOP_LAG.quantile(0.99) * 1000:.0f} ms", inline=True)
+        embed.add_field(name=f"Commands ({total} run, {failed} failed)", value=rows(metrics.COMMAND_SECONDS), inline=False)
+        embed.add_field(name="Database (most total time)", value=rows(metrics.DB_SECONDS, lock_wait), inline=False)
+        embed.add_field(name="Gateway Events (most total time)", value=rows(metrics.EVENT_SECONDS), inline=False)
+        embed.add_field(name="Outbound Queue", value=f"{outbound['depth']} waiting, {outbound['sent']} sent, {outbound['failed']} failed", inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(Manager(bot))
     logger.info("Manager cog loaded")
\ No newline at end of file
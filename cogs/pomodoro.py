@@ -1,15 +1,23 @@
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
+from datetime import timedelta
+from scheduler import ShardedScheduler
+from outbound import REMINDER
+from utils import Duration
 import asyncio
-from datetime import datetime, timedelta
 import logging
+import time
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Stage lengths are whole minutes; a bare number is read as minutes
+MINUTES = Duration(unit='m', bare_unit='m', minimum=1)
+
 class PomodoroSession:
-    def __init__(self, group_id, focus, short_break, long_break):
+    def __init__(self, guild_id, group_id, focus, short_break, long_break):
+        self.guild_id = guild_id
         self.group_id = group_id
         self.focus = focus
         self.short_break = short_break
@@ -17,169 +25,323 @@ class PomodoroSession:
         self.current_stage = "focus"
         self.cycles = 0
         self.is_paused = False
-        self.timer = None
-        logger.info(f"Pomodoro session created for group {group_id} with focus: {focus}m, short break: {short_break}m, long break: {long_break}m")
+        self.deadline = None  # Loop time at which the current stage ends
+        self.remaining = None  # Seconds left in the stage while paused
+        logger.info("Pomodoro session created for group %s with focus: %sm, short break: %sm, long break: %sm", group_id, focus, short_break, long_break)
+
+    def stage_seconds(self):
+        minutes = {"focus": self.focus, "short_break": self.short_break, "long_break": self.long_break}[self.current_stage]
+        return minutes * 60
+
+    def start(self, now):
+        self.deadline = now + self.stage_seconds()
+
+    def time_remaining(self, now):
+        if self.is_paused:
+            return self.remaining
+        if self.deadline is None:
+            return self.stage_seconds()
+        return max(0.0, self.deadline - now)
+
+    def pause(self, now):
+        self.remaining = self.time_remaining(now)
+        self.is_paused = True
+
+    def resume(self, now):
+        self.deadline = now + self.remaining
+        self.remaining = None
+        self.is_paused = False
+
+    def advance(self, now):
+        # Move to the next stage and return the notification for it
+        if self.current_stage == "focus":
+            self.cycles += 1
+            if self.cycles % 4 == 0:
+                self.current_stage = "long_break"
+                message = f"Focus session ended. Take a long break for {self.long_break} minutes!"
+            else:
+                self.current_stage = "short_break"
+                message = f"Focus session ended. Take a short break for {self.short_break} minutes!"
+        else:
+            self.current_stage = "focus"
+            message = f"Break ended. Focus for {self.focus} minutes!"
+        self.start(now)
+        return message
+
+    @classmethod
+    def from_record(cls, record, now, wall_now):
+        # Rebuild a stored session, stepping through any stages that ended while the bot was down
+        session = cls(record.guild_id, record.group_id, record.focus_duration,
+                      record.short_break_duration, record.long_break_duration)
+        session.current_stage = record.stage
+        session.cycles = record.cycles
+        if record.paused_remaining is not None:
+            session.is_paused = True
+            session.remaining = record.paused_remaining
+            return session
+        remaining = record.stage_deadline - wall_now
+        while remaining <= 0 and session.stage_seconds() > 0:
+            session.advance(now)
+            remaining += session.stage_seconds()
+        session.deadline = now + remaining
+        return session
 
 class Pomodoro(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.sessions = {}
+        # One timer heap per shard for its guilds' sessions, woken only when a stage ends
+        self.scheduler = ShardedScheduler("pomodoro", lambda: bot.shard_count or 1)
+        self.restore_task = None
         logger.info("Pomodoro cog initialized")
 
+    async def cog_load(self):
+        self.scheduler.start()
+        # Sessions are run by whichever worker holds their lease ('pomodoro:<group_id>')
+        self.bot.leases.register('pomodoro', self.take_over_session, self.drop_session)
+        self.restore_task = asyncio.create_task(self.restore_sessions(), name="pomodoro-restore")
+
+    async def cog_unload(self):
+        self.bot.leases.unregister('pomodoro')
+        if self.restore_task:
+            self.restore_task.cancel()
+        await self.scheduler.stop()
+
+    def schedule_stage_end(self, session):
+        self.scheduler.schedule(session.group_id, session.deadline, lambda: self.on_stage_end(session.group_id), session.guild_id)
+
+    async def on_stage_end(self, group_id):
+        session = self.sessions.get(group_id)
+        if not session or session.is_paused:
+            return
+        if not await self.bot.leases.confirm('pomodoro', group_id):
+            await self.drop_session(group_id)
+            return
+        message = session.advance(self.scheduler.now())
+        self.schedule_stage_end(session)
+        logger.info("Group %s starting %s", group_id, session.current_stage)
+        await self.save_session(session)
+        await self.send_notification(session.guild_id, group_id, message)
+
+    def wall_deadline(self, session):
+        # Loop time only means something inside this process, so store wall-clock time
+        return time.time() + (session.deadline - self.scheduler.now())
+
+    async def save_session(self, session):
+        # Only the lease holder writes, a worker that lost the session must not overwrite the new holder's state
+        if not self.bot.leases.holds('pomodoro', session.group_id):
+            return
+        if session.is_paused:
+            await self.bot.db.update_pomodoro_session(session.group_id, session.current_stage, session.cycles, None, session.remaining)
+        else:
+            await self.bot.db.update_pomodoro_session(session.group_id, session.current_stage, session.cycles, self.wall_deadline(session), None)
+
+    async def resume_record(self, record):
+        session = PomodoroSession.from_record(record, self.scheduler.now(), time.time())
+        self.sessions[session.group_id] = session
+        if not session.is_paused:
+            self.schedule_stage_end(session)
+        if (session.current_stage, session.cycles) != (record.stage, record.cycles):
+            await self.save_session(session)
+
+    async def restore_sessions(self):
+        # Shard ownership is only known once the bot is connected
+        await self.bot.wait_until_ready()
+        records = await self.bot.db.get_active_pomodoro_sessions()
+        restored = 0
+        for record in records:
+            if record.group_id in self.sessions or not self.bot.leases.owns_guild(record.guild_id):
+                continue
+            if await self.bot.leases.acquire('pomodoro', record.group_id, record.guild_id):
+                await self.resume_record(record)
+                restored += 1
+        logger.info("Restored %s of %s stored Pomodoro session(s)", restored, len(records))
+
+    async def take_over_session(self, key):
+        # Lease claimed from a worker that stopped renewing it
+        record = await self.bot.db.get_active_pomodoro_session(int(key))
+        if record is None:
+            return False
+        await self.resume_record(record)
+        return True
+
+    async def drop_session(self, key):
+        # Another worker runs this session now
+        session = self.sessions.pop(int(key), None)
+        if session:
+            self.scheduler.cancel(session.group_id, session.guild_id)
+            logger.info("Stopped running Pomodoro session for group %s, its lease moved to another worker", session.group_id)
+
     @app_commands.command(name="start_pomodoro", description="Start a Pomodoro session for the study group")
     @app_commands.describe(
-        focus="Focus duration in minutes",
+        focus="Focus duration in minutes, or e.g. '1h 30m'",
         short_break="Short break duration in minutes",
         long_break="Long break duration in minutes"
     )
-    async def start_pomodoro(self, interaction: discord.Interaction, focus: int = 25, short_break: int = 5, long_break: int = 15):
-        logger.info(f"Attempt to start Pomodoro session by user {interaction.user.id}")
+    async def start_pomodoro(self, interaction: discord.Interaction,
+                             focus: app_commands.Transform[int, MINUTES] = 25,
+                             short_break: app_commands.Transform[int, MINUTES] = 5,
+                             long_break: app_commands.Transform[int, MINUTES] = 15):
+        logger.info("Attempt to start Pomodoro session by user %s", interaction.user.id)
         group = await self.bot.db.get_user_group(interaction.user.id)
         if not group:
-            logger.warning(f"User {interaction.user.id} tried to start Pomodoro without being in a group")
+            logger.warning("User %s tried to start Pomodoro without being in a group", interaction.user.id)
             await interaction.response.send_message("You're not in any study group.", ephemeral=True)
             return
 
-        if group['id'] in self.sessions:
-            logger.info(f"Pomodoro session already exists for group {group['id']}")
+        if group.id in self.sessions:
+            logger.info("Pomodoro session already exists for group %s", group.id)
             await interaction.response.send_message("A Pomodoro session is already in progress for this group.", ephemeral=True)
             return
 
-        session = PomodoroSession(group['id'], focus, short_break, long_break)
-        self.sessions[group['id']] = session
-
-        voice_channel_id = group['voice_channel_id']
+        voice_channel_id = group.voice_channel_id
         if not voice_channel_id:
-            voice_channel = await interaction.guild.create_voice_channel(f"{group['name']} VC")
-            await self.bot.db.update_voice_channel(group['id'], voice_channel.id)
-            logger.info(f"Created new voice channel {voice_channel.id} for group {group['id']}")
+            voice_channel = await interaction.guild.create_voice_channel(f"{group.name} VC")
+            await self.bot.db.update_voice_channel(group.id, voice_channel.id)
+            logger.info("Created new voice channel %s for group %s", voice_channel.id, group.id)
         else:
             voice_channel = interaction.guild.get_channel(voice_channel_id)
 
         if interaction.user.voice:
             await interaction.user.move_to(voice_channel)
-            logger.info(f"Moved user {interaction.user.id} to voice channel {voice_channel.id}")
+            logger.info("Moved user %s to voice channel %s", interaction.user.id, voice_channel.id)
         else:
-            logger.warning(f"User {interaction.user.id} is not in a voice channel")
+            logger.warning("User %s is not in a voice channel", interaction.user.id)
             await interaction.response.send_message(f"Please join the voice channel {voice_channel.mention} to start the Pomodoro session.", ephemeral=True)
             return
 
-        logger.info(f"Started Pomodoro session for group {group['id']}")
+        # Claim the session only once it is really starting, so no early return leaves a lease behind
+        if group.id in self.sessions or not await self.bot.leases.acquire('pomodoro', group.id, interaction.guild_id):
+            logger.info("Pomodoro session already exists for group %s", group.id)
+            await interaction.response.send_message("A Pomodoro session is already in progress for this group.", ephemeral=True)
+            return
+        session = PomodoroSession(interaction.guild_id, group.id, focus, short_break, long_break)
+        self.sessions[group.id] = session
+
+        # Store the session before confirming it, so the timer never runs without a row behind it
+        session.start(self.scheduler.now())
+        try:
+            await self.bot.db.start_pomodoro_session(interaction.guild_id, group.id, focus, short_break, long_break,
+                                                     self.wall_deadline(session))
+        except Exception as e:
+            logger.error("Failed to store Pomodoro session for group %s: %s", group.id, e)
+            del self.sessions[group.id]
+            await self.bot.leases.release('pomodoro', group.id)
+            await interaction.response.send_message("Couldn't start the Pomodoro session, please try again.", ephemeral=True)
+            return
+        self.schedule_stage_end(session)
+        logger.info("Started Pomodoro session for group %s", group.id)
         await interaction.response.send_message(f"Pomodoro session started! Focus for {focus} minutes.")
-        self.run_timer.start(interaction.guild_id, group['id'])
 
     @app_commands.command(name="end_pomodoro", description="End the current Pomodoro session")
     async def end_pomodoro(self, interaction: discord.Interaction):
-        logger.info(f"Attempt to end Pomodoro session by user {interaction.user.id}")
+        logger.info("Attempt to end Pomodoro session by user %s", interaction.user.id)
         group = await self.bot.db.get_user_group(interaction.user.id)
-        if not group or group['id'] not in self.sessions:
-            logger.warning(f"No active Pomodoro session for user {interaction.user.id}")
+        if not group or group.id not in self.sessions:
+            logger.warning("No active Pomodoro session for user %s", interaction.user.id)
             await interaction.response.send_message("No active Pomodoro session for your group.", ephemeral=True)
             return
 
-        self.run_timer.stop()
-        del self.sessions[group['id']]
-        logger.info(f"Ended Pomodoro session for group {group['id']}")
+        logger.info("Ended Pomodoro session for group %s", group.id)
         await interaction.response.send_message("Pomodoro session ended.")
+        await self.bot.db.end_pomodoro_session(group.id)
+        await self.stop_session(group.id)
+
+    async def stop_session(self, group_id):
+        # Stops the timer and gives up the lease; the stored row is ended by the caller
+        session = self.sessions.pop(group_id, None)
+        if session is None:
+            return
+        self.scheduler.cancel(group_id, session.guild_id)
+        await self.bot.leases.release('pomodoro', group_id)
+        logger.info("Stopped Pomodoro session for group %s", group_id)
 
     @app_commands.command(name="pause_pomodoro", description="Pause the current Pomodoro session")
     async def pause_pomodoro(self, interaction: discord.Interaction):
-        logger.info(f"Attempt to pause Pomodoro session by user {interaction.user.id}")
+        logger.info("Attempt to pause Pomodoro session by user %s", interaction.user.id)
         group = await self.bot.db.get_user_group(interaction.user.id)
-        if not group or group['id'] not in self.sessions:
-            logger.warning(f"No active Pomodoro session for user {interaction.user.id}")
+        if not group or group.id not in self.sessions:
+            logger.warning("No active Pomodoro session for user %s", interaction.user.id)
             await interaction.response.send_message("No active Pomodoro session for your group.", ephemeral=True)
             return
 
-        session = self.sessions[group['id']]
+        session = self.sessions[group.id]
         if session.is_paused:
-            logger.info(f"Pomodoro session for group {group['id']} is already paused")
+            logger.info("Pomodoro session for group %s is already paused", group.id)
             await interaction.response.send_message("Session is already paused.", ephemeral=True)
             return
 
-        session.is_paused = True
-        logger.info(f"Paused Pomodoro session for group {group['id']}")
+        if not await self.confirm_session(interaction, group.id):
+            return
+
+        session.pause(self.scheduler.now())
+        self.scheduler.cancel(group.id, interaction.guild_id)
+        logger.info("Paused Pomodoro session for group %s", group.id)
         await interaction.response.send_message("Pomodoro session paused.")
+        await self.save_session(session)
 
     @app_commands.command(name="resume_pomodoro", description="Resume the paused Pomodoro session")
     async def resume_pomodoro(self, interaction: discord.Interaction):
-        logger.info(f"Attempt to resume Pomodoro session by user {interaction.user.id}")
+        logger.info("Attempt to resume Pomodoro session by user %s", interaction.user.id)
         group = await self.bot.db.get_user_group(interaction.user.id)
-        if not group or group['id'] not in self.sessions:
-            logger.warning(f"No active Pomodoro session for user {interaction.user.id}")
+        if not group or group.id not in self.sessions:
+            logger.warning("No active Pomodoro session for user %s", interaction.user.id)
             await interaction.response.send_message("No active Pomodoro session for your group.", ephemeral=True)
             return
 
-        session = self.sessions[group['id']]
+        session = self.sessions[group.id]
         if not session.is_paused:
-            logger.info(f"Pomodoro session for group {group['id']} is not paused")
+            logger.info("Pomodoro session for group %s is not paused", group.id)
             await interaction.response.send_message("Session is not paused.", ephemeral=True)
             return
 
-        session.is_paused = False
-        logger.info(f"Resumed Pomodoro session for group {group['id']}")
-        await interaction.response.send_message("Pomodoro session resumed.")
-
-    @tasks.loop(seconds=1)
-    async def run_timer(self, guild_id, group_id):
-        session = self.sessions[group_id]
-        if session.is_paused:
+        if not await self.confirm_session(interaction, group.id):
             return
 
-        if session.timer is None:
-            session.timer = session.focus * 60
-
-        session.timer -= 1
-
-        if session.timer <= 0:
-            if session.current_stage == "focus":
-                session.cycles += 1
-                if session.cycles % 4 == 0:
-                    session.current_stage = "long_break"
-                    session.timer = session.long_break * 60
-                    logger.info(f"Group {group_id} starting long break")
-                    await self.send_notification(guild_id, group_id, f"Focus session ended. Take a long break for {session.long_break} minutes!")
-                else:
-                    session.current_stage = "short_break"
-                    session.timer = session.short_break * 60
-                    logger.info(f"Group {group_id} starting short break")
-                    await self.send_notification(guild_id, group_id, f"Focus session ended. Take a short break for {session.short_break} minutes!")
-            else:
-                session.current_stage = "focus"
-                session.timer = session.focus * 60
-                logger.info(f"Group {group_id} starting focus session")
-                await self.send_notification(guild_id, group_id, f"Break ended. Focus for {session.focus} minutes!")
+        session.resume(self.scheduler.now())
+        self.schedule_stage_end(session)
+        logger.info("Resumed Pomodoro session for group %s", group.id)
+        await interaction.response.send_message("Pomodoro session resumed.")
+        await self.save_session(session)
+
+    async def confirm_session(self, interaction, group_id):
+        # Make sure no other worker has taken the session over before changing it
+        if await self.bot.leases.confirm('pomodoro', group_id):
+            return True
+        await self.drop_session(group_id)
+        await interaction.response.send_message("This Pomodoro session was just moved to another bot process, please try again.", ephemeral=True)
+        return False
 
     async def send_notification(self, guild_id, group_id, message):
         guild = self.bot.get_guild(guild_id)
         if guild:
-            group = await self.bot.db.get_study_group(guild_id)
+            group = await self.bot.db.get_study_group_by_id(group_id)
             if group:
-                _, session_role_id = await self.bot.db.get_group_roles(group['id'])
+                _, session_role_id = await self.bot.db.get_group_roles(group.id)
                 session_role = guild.get_role(session_role_id)
                 if session_role:
-                    voice_channel_id = group['voice_channel_id']
+                    voice_channel_id = group.voice_channel_id
                     voice_channel = guild.get_channel(voice_channel_id)
                     if voice_channel:
-                        await voice_channel.send(f"{session_role.mention} {message}")
-                        logger.info(f"Sent notification to voice channel {voice_channel.id} for group {group_id}")
+                        await self.bot.outbound.send(voice_channel, priority=REMINDER, content=f"{session_role.mention} {message}")
+                        logger.info("Sent notification to voice channel %s for group %s", voice_channel.id, group_id)
                     else:
                         # Fallback to the first text channel if voice channel is not found
                         channel = guild.text_channels[0]
-                        await channel.send(f"{session_role.mention} {message}")
-                        logger.warning(f"Voice channel not found for group {group_id}, sent notification to text channel {channel.id}")
+                        await self.bot.outbound.send(channel, priority=REMINDER, content=f"{session_role.mention} {message}")
+                        logger.warning("Voice channel not found for group %s, sent notification to text channel %s", group_id, channel.id)
 
     @app_commands.command(name="pomodoro_status", description="Check the status of the current Pomodoro session")
     async def pomodoro_status(self, interaction: discord.Interaction):
-        logger.info(f"Pomodoro status check by user {interaction.user.id}")
+        logger.info("Pomodoro status check by user %s", interaction.user.id)
         group = await self.bot.db.get_user_group(interaction.user.id)
-        if not group or group['id'] not in self.sessions:
-            logger.warning(f"No active Pomodoro session for user {interaction.user.id}")
+        if not group or group.id not in self.sessions:
+            logger.warning("No active Pomodoro session for user %s", interaction.user.id)
             await interaction.response.send_message("No active Pomodoro session for your group.", ephemeral=True)
             return
 
-        session = self.sessions[group['id']]
-        remaining_time = timedelta(seconds=session.timer)
+        session = self.sessions[group.id]
+        remaining_time = timedelta(seconds=round(session.time_remaining(self.scheduler.now())))
         status = "Paused" if session.is_paused else "Running"
         stage = session.current_stage.capitalize()
 
@@ -189,7 +351,7 @@ class Pomodoro(commands.Cog):
         embed.add_field(name="Time Remaining", value=str(remaining_time), inline=False)
         embed.add_field(name="Completed Cycles", value=str(session.cycles), inline=False)
 
-        logger.info(f"Sent Pomodoro status for group {group['id']}")
+        logger.info("Sent Pomodoro status for group %s", group.id)
         await interaction.response.send_message(embed=embed)
 
 async def setup(bot):
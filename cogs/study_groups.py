@@ -2,10 +2,10 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import asyncio
-from utils import parse_seconds_to_hms, parse_duration, parse_mentions, is_manager, app_is_manager
+from outbound import DM
+from utils import parse_seconds_to_hms, parse_duration, parse_mentions, app_is_manager, check_manager
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class StudyGroups(commands.Cog):
@@ -20,9 +20,9 @@ class StudyGroups(commands.Cog):
     @app_commands.describe(name="Name of the study group", max_size="Maximum number of members")
     @app_is_manager()
     async def create_group(self, interaction: discord.Interaction, name: str, max_size: int = 10):
-        logger.info(f"create_group command invoked by {interaction.user.id} for group '{name}'")
+        logger.info("create_group command invoked by %s for group '%s'", interaction.user.id, name)
         # Check if a group with the same name already exists
-        existing_group = await self.bot.db.get_study_group_by_name(interaction.guild_id, name)
+        existing_group = await self.bot.db.get_study_group_by_name(name, interaction.guild_id)
         if existing_group:
             await interaction.response.send_message(f"A study group named '{name}' already exists in this server.", ephemeral=True)
             return
@@ -39,21 +39,22 @@ class StudyGroups(commands.Cog):
 
         await self.bot.db.update_group_roles(group_id, admin_role.id, session_role.id)
 
-        await interaction.response.send_message(
-            f"Study group '{name}' created! Use /join_group to join.\n"
-            f"You've been assigned the roles {admin_role.mention} and {session_role.mention}."
+        await self.bot.outbound.respond(
+            interaction,
+            content=f"Study group '{name}' created! Use /join_group to join.\n"
+                    f"You've been assigned the roles {admin_role.mention} and {session_role.mention}."
         )
 
     @app_commands.command(name="join_group", description="Join an existing study group")
     @app_commands.describe(name="Name of the study group to join")
     async def join_group(self, interaction: discord.Interaction, name: str):
-        group = await self.bot.db.get_study_group_by_name(interaction.guild_id, name)
+        group = await self.bot.db.get_study_group_by_name(name, interaction.guild_id)
         if not group:
             await interaction.response.send_message(f"No study group named '{name}' exists in this server.", ephemeral=True)
             return
 
-        members = await self.bot.db.get_group_members(group['id'])
-        if len(members) >= group['max_size']:
+        members = await self.bot.db.get_group_members(group.id)
+        if len(members) >= group.max_size:
             await interaction.response.send_message("This group is full.", ephemeral=True)
             return
 
@@ -61,9 +62,9 @@ class StudyGroups(commands.Cog):
             await interaction.response.send_message("You're already in this study group.", ephemeral=True)
             return
 
-        await self.bot.db.add_group_member(group['id'], interaction.user.id)
+        await self.bot.db.add_group_member(group.id, interaction.user.id)
 
-        _, session_role_id = await self.bot.db.get_group_roles(group['id'])
+        _, session_role_id = await self.bot.db.get_group_roles(group.id)
         session_role = interaction.guild.get_role(session_role_id)
 
         if session_role:
@@ -77,19 +78,19 @@ class StudyGroups(commands.Cog):
     @app_commands.command(name="leave_group", description="Leave a study group")
     @app_commands.describe(name="Name of the study group to leave")
     async def leave_group(self, interaction: discord.Interaction, name: str):
-        group = await self.bot.db.get_study_group_by_name(interaction.guild_id, name)
+        group = await self.bot.db.get_study_group_by_name(name, interaction.guild_id)
         if not group:
             await interaction.response.send_message(f"No study group named '{name}' exists in this server.", ephemeral=True)
             return
 
-        members = await self.bot.db.get_group_members(group['id'])
+        members = await self.bot.db.get_group_members(group.id)
         if interaction.user.id not in members:
             await interaction.response.send_message(f"You're not in the study group '{name}'.", ephemeral=True)
             return
 
-        await self.bot.db.remove_group_member(group['id'], interaction.user.id)
+        await self.bot.db.remove_group_member(group.id, interaction.user.id)
 
-        admin_role_id, session_role_id = await self.bot.db.get_group_roles(group['id'])
+        admin_role_id, session_role_id = await self.bot.db.get_group_roles(group.id)
         session_role = interaction.guild.get_role(session_role_id)
 
         if session_role:
@@ -97,7 +98,7 @@ class StudyGroups(commands.Cog):
 
         await interaction.response.send_message(f"You've left the study group '{name}'.")
 
-        updated_members = await self.bot.db.get_group_members(group['id'])
+        updated_members = await self.bot.db.get_group_members(group.id)
         if not updated_members:
             await self._end_group(interaction.guild_id, name)  # Use internal function
             await interaction.response.send_message(f"The study group '{name}' has been ended.")
@@ -106,13 +107,13 @@ class StudyGroups(commands.Cog):
     @app_commands.describe(name="Name of the study group to end")
     @app_is_manager()
     async def end_group(self, interaction: discord.Interaction, name: str):
-        group = await self.bot.db.get_study_group_by_name(interaction.guild_id, name)
+        group = await self.bot.db.get_study_group_by_name(name, interaction.guild_id)
         if not group:
             await interaction.response.send_message(f"No study group named '{name}' exists in this server.", ephemeral=True)
             return
 
         # Check if the user invoking the command is the group creator or a manager
-        if not (group['creator_id'] == interaction.user.id or await is_manager(self.bot, interaction.guild_id, interaction.user.id)):
+        if not (group.creator_id == interaction.user.id or await check_manager(interaction)):
             await interaction.response.send_message("You don't have permission to end this group.", ephemeral=True)
             return
 
@@ -120,9 +121,9 @@ class StudyGroups(commands.Cog):
         await interaction.response.send_message(f"The study group '{name}' has been ended.")
 
     async def _end_group(self, guild_id, name):  # Internal helper function
-        group = await self.bot.db.get_study_group_by_name(guild_id, name)
+        group = await self.bot.db.get_study_group_by_name(name, guild_id)
         if group:
-            admin_role_id, session_role_id = await self.bot.db.get_group_roles(group['id'])
+            admin_role_id, session_role_id = await self.bot.db.get_group_roles(group.id)
             guild = self.bot.get_guild(guild_id)
 
             admin_role = guild.get_role(admin_role_id)
@@ -135,7 +136,10 @@ class StudyGroups(commands.Cog):
                 await asyncio.sleep(2)  # Add a 2-second delay
                 await session_role.delete()
 
-            await self.bot.db.delete_study_group(group['id'])
+            await self.bot.db.delete_study_group(group.id)  # Also ends the group's stored Pomodoro session
+            pomodoro = self.bot.get_cog("Pomodoro")
+            if pomodoro:
+                await pomodoro.stop_session(group.id)
 
     @app_commands.command(name="list_groups", description="List all study groups in the server")
     async def list_groups(self, interaction: discord.Interaction):
@@ -146,10 +150,10 @@ class StudyGroups(commands.Cog):
 
         embed = discord.Embed(title="Active Study Groups", color=discord.Color.blue())
         for group in groups:
-            members = await self.bot.db.get_group_members(group['id'])
+            members = await self.bot.db.get_group_members(group.id)
             embed.add_field(
-                name=group['name'],
-                value=f"Members: {len(members)}/{group['max_size']}",
+                name=group.name,
+                value=f"Members: {len(members)}/{group.max_size}",
                 inline=False
             )
 
@@ -159,13 +163,13 @@ class StudyGroups(commands.Cog):
     @app_commands.describe(group_name="Name of the study group", user="User to invite")
     async def invite_to_group(self, interaction: discord.Interaction, group_name: str, user: discord.Member):
         # Check if the group exists
-        group = await self.bot.db.get_study_group_by_name(interaction.guild_id, group_name)
+        group = await self.bot.db.get_study_group_by_name(group_name, interaction.guild_id)
         if not group:
             await interaction.response.send_message(f"No study group named '{group_name}' exists in this server.", ephemeral=True)
             return
 
         # Check if the inviter is in the group
-        members = await self.bot.db.get_group_members(group['id'])
+        members = await self.bot.db.get_group_members(group.id)
         if interaction.user.id not in members:
             await interaction.response.send_message(f"You're not a member of the study group '{group_name}'.", ephemeral=True)
             return
@@ -176,22 +180,23 @@ class StudyGroups(commands.Cog):
             return
 
         # Check if the group is full
-        if len(members) >= group['max_size']:
+        if len(members) >= group.max_size:
             await interaction.response.send_message(f"The study group '{group_name}' is full.", ephemeral=True)
             return
 
         # Add the user to the group
-        await self.bot.db.add_group_member(group['id'], user.id)
+        await self.bot.db.add_group_member(group.id, user.id)
 
         # Assign the session role to the new member
-        _, session_role_id = await self.bot.db.get_group_roles(group['id'])
+        _, session_role_id = await self.bot.db.get_group_roles(group.id)
         session_role = interaction.guild.get_role(session_role_id)
         if session_role:
             await user.add_roles(session_role)
 
         # Send confirmation messages
-        await interaction.response.send_message(f"You've successfully invited {user.mention} to the study group '{group_name}'.")
-        await user.send(f"You've been invited to join the study group '{group_name}' in {interaction.guild.name}. You've been automatically added to the group.")
+        await self.bot.outbound.respond(interaction, content=f"You've successfully invited {user.mention} to the study group '{group_name}'.")
+        # Not awaited: the DM goes out when the rate limits allow, failures are logged by the dispatcher
+        self.bot.outbound.send(user, priority=DM, content=f"You've been invited to join the study group '{group_name}' in {interaction.guild.name}. You've been automatically added to the group.")
 
 async def setup(bot):
     await bot.add_cog(StudyGroups(bot))
\ No newline at end of file
@@ -25,8 +25,8 @@ class TaskList(commands.Cog):
         if tasks:
             embed = discord.Embed(title=f"{interaction.user.display_name}'s Tasks", color=discord.Color.blue())
             for task in tasks:
-                status = "Completed" if task[3] else "In Progress"
-                embed.add_field(name=f"Task {task[0]}", value=f"{task[2]} - {status}", inline=False)
+                status = "Completed" if task.completed else "In Progress"
+                embed.add_field(name=f"Task {task.id}", value=f"{task.description} - {status}", inline=False)
             await interaction.response.send_message(embed=embed)
         else:
             await interaction.response.send_message("You have no tasks.")
@@ -1,6 +1,7 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+from metrics import timed_event
 from utils import app_is_manager, is_group_creator
 import logging
 
@@ -16,80 +17,86 @@ class VoiceChannels(commands.Cog):
     @is_group_creator()
     @app_is_manager()
     async def create_vc(self, interaction: discord.Interaction, name: str = None):
-        logger.info(f"create_vc command invoked by {interaction.user}")
+        logger.info("create_vc command invoked by %s", interaction.user)
         group = await self.bot.db.get_study_group(interaction.guild_id)
         if not group:
-            logger.warning(f"No study group exists in server {interaction.guild_id}")
+            logger.warning("No study group exists in server %s", interaction.guild_id)
             await interaction.response.send_message("No study group exists in this server.", ephemeral=True)
             return
 
-        if group[8]:  # Assuming voice_channel_id is at index 8
-            logger.warning(f"Voice channel already exists for group {group[0]}")
+        if group.voice_channel_id:
+            logger.warning("Voice channel already exists for group %s", group.id)
             await interaction.response.send_message("A voice channel already exists for this group.", ephemeral=True)
             return
 
-        channel_name = name or f"{group[1]} VC"
-        logger.debug(f"Creating voice channel '{channel_name}'")
+        channel_name = name or f"{group.name} VC"
+        logger.debug("Creating voice channel '%s'", channel_name)
         overwrites = {
             interaction.guild.default_role: discord.PermissionOverwrite(connect=False),
             interaction.guild.me: discord.PermissionOverwrite(connect=True, manage_channels=True)
         }
 
-        _, session_role_id = await self.bot.db.get_group_roles(group[0])
+        _, session_role_id = await self.bot.db.get_group_roles(group.id)
         session_role = interaction.guild.get_role(session_role_id)
         if session_role:
             overwrites[session_role] = discord.PermissionOverwrite(connect=True)
-            logger.debug(f"Added connect permission for role {session_role.name}")
+            logger.debug("Added connect permission for role %s", session_role.name)
 
         try:
             channel = await interaction.guild.create_voice_channel(channel_name, overwrites=overwrites)
-            await self.bot.db.update_voice_channel(group[0], channel.id)
-            logger.info(f"Voice channel {channel.id} created for group {group[0]}")
+            await self.bot.db.update_voice_channel(group.id, channel.id)
+            logger.info("Voice channel %s created for group %s", channel.id, group.id)
             await interaction.response.send_message(f"Voice channel {channel.mention} created for the study group.")
         except discord.HTTPException as e:
-            logger.error(f"Failed to create voice channel: {str(e)}")
+            logger.error("Failed to create voice channel: %s", str(e))
             await interaction.response.send_message("Failed to create the voice channel. Please try again later.", ephemeral=True)
 
     @app_commands.command(name="delete_vc", description="Delete the voice channel for the study group")
     @is_group_creator()
     @app_is_manager()
     async def delete_vc(self, interaction: discord.Interaction):
-        logger.info(f"delete_vc command invoked by {interaction.user}")
+        logger.info("delete_vc command invoked by %s", interaction.user)
         group = await self.bot.db.get_study_group(interaction.guild_id)
-        if not group or not group[8]:  # Assuming voice_channel_id is at index 8
-            logger.warning(f"No voice channel exists for group in server {interaction.guild_id}")
+        if not group or not group.voice_channel_id:
+            logger.warning("No voice channel exists for group in server %s", interaction.guild_id)
             await interaction.response.send_message("No voice channel exists for this group.", ephemeral=True)
             return
 
-        channel = interaction.guild.get_channel(group[8])
+        channel = interaction.guild.get_channel(group.voice_channel_id)
         if channel:
             try:
                 await channel.delete()
-                await self.bot.db.update_voice_channel(group[0], None)
-                logger.info(f"Voice channel {channel.id} deleted for group {group[0]}")
+                await self.bot.db.update_voice_channel(group.id, None)
+                logger.info("Voice channel %s deleted for group %s", channel.id, group.id)
                 await interaction.response.send_message("Voice channel deleted.")
             except discord.HTTPException as e:
-                logger.error(f"Failed to delete voice channel: {str(e)}")
+                logger.error("Failed to delete voice channel: %s", str(e))
                 await interaction.response.send_message("Failed to delete the voice channel. Please try again later.", ephemeral=True)
         else:
-            logger.warning(f"Voice channel {group[8]} no longer exists for group {group[0]}")
-            await self.bot.db.update_voice_channel(group[0], None)
+            logger.warning("Voice channel %s no longer exists for group %s", group.voice_channel_id, group.id)
+            await self.bot.db.update_voice_channel(group.id, None)
             await interaction.response.send_message("The voice channel no longer exists.")
 
     @commands.Cog.listener()
+    @timed_event
     async def on_voice_state_update(self, member, before, after):
-        logger.debug(f"Voice state update: {member} moved from {before.channel} to {after.channel}")
-        if before.channel and not after.channel:
-            group = await self.bot.db.get_study_group(before.channel.guild.id)
-            if group and group[8] == before.channel.id:
-                logger.debug(f"Member {member} left study group voice channel {before.channel.id}")
-                if not before.channel.members:
-                    try:
-                        await before.channel.delete()
-                        await self.bot.db.update_voice_channel(group[0], None)
-                        logger.info(f"Deleted empty voice channel {before.channel.id} for group {group[0]}")
-                    except discord.HTTPException as e:
-                        logger.error(f"Failed to delete empty voice channel: {str(e)}")
+        if not before.channel or after.channel:
+            return
+        # Fast path: most voice channels belong to no study group
+        group_id = self.bot.db.group_for_voice_channel(before.channel.id)
+        if group_id is None:
+            return
+        logger.debug("Voice state update: %s left %s", member, before.channel)
+        group = await self.bot.db.get_study_group_by_id(group_id)
+        if group and group.voice_channel_id == before.channel.id:
+            logger.debug("Member %s left study group voice channel %s", member, before.channel.id)
+            if not before.channel.members:
+                try:
+                    await before.channel.delete()
+                    await self.bot.db.update_voice_channel(group.id, None)
+                    logger.info("Deleted empty voice channel %s for group %s", before.channel.id, group.id)
+                except discord.HTTPException as e:
+                    logger.error("Failed to delete empty voice channel: %s", str(e))
 
 async def setup(bot):
     await bot.add_cog(VoiceChannels(bot))
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = ':'
+
+
+def custom_id(prefix, *parts):
+    # Build a routable custom_id, e.g. custom_id('checkin', 'present', session_id) -> 'checkin:present:<id>'
+    return SEPARATOR.join((prefix, *map(str, parts)))
+
+
+class ComponentRouter:
+    """Dispatches component interactions (button clicks, selects) to the cog that owns them.
+
+    A custom_id is `<prefix>:<rest>`. Handlers are registered per prefix and called as
+    `handler(interaction, rest)`, so routing is one dict lookup and components nobody
+    registered (other bots' views, old-format IDs) are ignored without further work.
+
+    Discord drops an interaction that isn't acknowledged within 3 seconds. If a handler
+    hasn't responded once its budget is used up, the router defers on its behalf. Handlers
+    should answer with `respond`, which sends a followup instead when that has happened.
+    """
+
+    def __init__(self, defer_after=2.0):
+        self.defer_after = defer_after
+        self.handlers = {}  # prefix -> (handler, budget)
+        self.locks = {}  # interaction ID -> lock held while responding to it
+        self.dispatched = 0
+        self.ignored = 0
+        self.auto_deferred = 0
+
+    def register(self, prefix, handler, *, budget=None):
+        if SEPARATOR in prefix:
+            raise ValueError(f"Component prefix can't contain '{SEPARATOR}': {prefix!r}")
+        if prefix in self.handlers:
+            raise ValueError(f"Component prefix {prefix!r} is already registered")
+        self.handlers[prefix] = (handler, budget if budget is not None else self.defer_after)
+
+    def unregister(self, prefix):
+        self.handlers.pop(prefix, None)
+
+    async def dispatch(self, interaction: discord.Interaction):
+        if interaction.type != discord.InteractionType.component:
+            return
+        prefix, _, rest = (interaction.data or {}).get('custom_id', '').partition(SEPARATOR)
+        entry = self.handlers.get(prefix)
+        if entry is None:
+            self.ignored += 1
+            return
+        handler, budget = entry
+        self.dispatched += 1
+
+        self.locks[interaction.id] = asyncio.Lock()
+        task = asyncio.create_task(handler(interaction, rest))
+        try:
+            done, _ = await asyncio.wait({task}, timeout=budget)
+            if not done and not interaction.response.is_done():
+                self.auto_deferred += 1
+                logger.warning("Component %r handler exceeded its %ss budget, deferring", prefix, budget)
+                await self.defer(interaction)
+            await task
+        except Exception as e:
+            logger.error("Component handler for %r failed: %s", prefix, e, exc_info=True)
+        finally:
+            self.locks.pop(interaction.id, None)
+
+    async def defer(self, interaction: discord.Interaction):
+        # Acknowledge without a message, unless the interaction was already answered
+        async with self.locks.get(interaction.id) or asyncio.Lock():
+            if interaction.response.is_done():
+                return
+            try:
+                await interaction.response.defer()
+            except discord.HTTPException as e:
+                logger.error("Failed to defer component interaction: %s", e)
+
+    async def respond(self, interaction: discord.Interaction, content=None, **kwargs):
+        # Reply to the interaction, or follow up if it was already acknowledged (e.g. auto-deferred)
+        async with self.locks.get(interaction.id) or asyncio.Lock():
+            if interaction.response.is_done():
+                return await interaction.followup.send(content, **kwargs)
+            return await interaction.response.send_message(content, **kwargs)
+
+    def stats(self):
+        return {
+            'handlers': sorted(self.handlers),
+            'dispatched': self.dispatched,
+            'ignored': self.ignored,
+            'auto_deferred': self.auto_deferred,
+        }
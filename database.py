@@ -1,347 +1,471 @@
-import sqlite3
-import asyncio
 from datetime import datetime
+import time
+from storage import StorageEngine, SERIAL
+from migrations import migrate
+from cache import TTLCache, MISSING
+from metrics import instrumented
+from models import (StudyGroup, Task, Manager, GuildSettings, PomodoroRecord, CheckinRecord, CheckinMember,
+                    row_factory, column_list, scalar)
 import logging
 
 logger = logging.getLogger(__name__)
 
+STUDY_GROUP_COLUMNS = column_list(StudyGroup)
+TASK_COLUMNS = column_list(Task)
+MANAGER_COLUMNS = column_list(Manager)
+GUILD_SETTINGS_COLUMNS = column_list(GuildSettings)
+POMODORO_COLUMNS = column_list(PomodoroRecord)
+CHECKIN_COLUMNS = column_list(CheckinRecord)
+CHECKIN_MEMBER_COLUMNS = column_list(CheckinMember)
+
+study_group_row = row_factory(StudyGroup)
+task_row = row_factory(Task)
+manager_row = row_factory(Manager)
+guild_settings_row = row_factory(GuildSettings)
+pomodoro_row = row_factory(PomodoroRecord)
+checkin_row = row_factory(CheckinRecord)
+checkin_member_row = row_factory(CheckinMember)
+
+@instrumented
 class Database:
-    def __init__(self, db_name='bot_database.sqlite'):
+    def __init__(self, db_name='bot_database.sqlite', storage_mode=SERIAL, read_pool_size=4,
+                 group_commit_ms=None, group_commit_max_batch=100, cache_size=4096, cache_ttl=300.0):
         self.db_name = db_name
-        self.conn = None
-        self.lock = asyncio.Lock()
-        logger.info(f"Database initialized with name: {db_name}")
+        self.storage_mode = storage_mode
+        self.read_pool_size = read_pool_size
+        self.group_commit_ms = group_commit_ms
+        self.group_commit_max_batch = group_commit_max_batch
+        self.engine = None
+        # Read-through caches. Study groups are keyed by ('group', id) and ('guild', guild_id),
+        # the latter holding None for guilds without a group.
+        self.group_cache = TTLCache('study_groups', cache_size, cache_ttl)
+        self.settings_cache = TTLCache('guild_settings', cache_size, cache_ttl)
+        self.group_guilds = {}  # group_id -> guild_id, to invalidate the guild key of a group
+        # Every study group voice channel, so voice events for other channels skip the database
+        self.voice_channel_groups = {}  # voice_channel_id -> group_id
+        self.group_voice_channels = {}  # group_id -> voice_channel_id
+        logger.info("Database initialized with name: %s", db_name)
 
     async def connect(self):
-        self.conn = sqlite3.connect(self.db_name)
-        self.conn.row_factory = sqlite3.Row
-        logger.info(f"Connected to database: {self.db_name}")
-        await self.create_tables()
-
-    async def create_tables(self):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS study_groups (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                creator_id INTEGER NOT NULL,
-                max_size INTEGER NOT NULL,
-                end_time REAL NOT NULL,
-                guild_id INTEGER NOT NULL,
-                admin_role_id INTEGER,
-                session_role_id INTEGER,
-                voice_channel_id INTEGER
-            )
-            ''')
-
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS group_members (
-                group_id INTEGER,
-                user_id INTEGER,
-                FOREIGN KEY (group_id) REFERENCES study_groups (id),
-                PRIMARY KEY (group_id, user_id)
-            )
-            ''')
-
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pomodoro_sessions (
-                id INTEGER PRIMARY KEY,
-                group_id INTEGER,
-                start_time REAL,
-                end_time REAL,
-                focus_duration INTEGER,
-                short_break_duration INTEGER,
-                long_break_duration INTEGER,
-                FOREIGN KEY (group_id) REFERENCES study_groups (id)
-            )
-            ''')
-
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS managers (
-                id INTEGER PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                guild_id INTEGER,
-                permission_level INTEGER NOT NULL
-            )
-            ''')
-
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS voice_channel_logs (
-                id INTEGER PRIMARY KEY,
-                group_id INTEGER,
-                channel_id INTEGER,
-                creator_id INTEGER,
-                create_time TIMESTAMP,
-                FOREIGN KEY (group_id) REFERENCES study_groups (id)
-            )
-            ''')
-
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS guild_settings (
-                guild_id INTEGER PRIMARY KEY,
-                vc_cleanup_time INTEGER DEFAULT 600,
-                vc_category_id INTEGER
-            )
-            ''')
-
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                description TEXT NOT NULL,
-                completed BOOLEAN NOT NULL DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-
-            self.conn.commit()
-            logger.info("Database tables created or verified.")
+        self.engine = StorageEngine(self.db_name, mode=self.storage_mode, read_pool_size=self.read_pool_size,
+                                    group_commit_ms=self.group_commit_ms,
+                                    group_commit_max_batch=self.group_commit_max_batch)
+        await self.engine.start()
+        logger.info("Connected to database: %s", self.db_name)
+        await self.run_migrations()
+        await self.load_voice_channel_index()
+
+    async def run_migrations(self):
+        version = await self.engine.run(migrate)
+        logger.info("Database schema is at version %s.", version)
 
     async def close(self):
-        if self.conn:
-            self.conn.close()
+        if self.engine:
+            await self.engine.close()
             logger.info("Database connection closed.")
 
+    def lock_wait_stats(self):
+        # How long queries queued for a connection, split into reads and writes
+        return self.engine.lock_wait_stats() if self.engine else {}
+
+    def commit_stats(self):
+        return self.engine.commit_stats() if self.engine else {}
+
+    async def load_voice_channel_index(self):
+        rows = await self._fetchall('SELECT id, voice_channel_id FROM study_groups WHERE voice_channel_id IS NOT NULL')
+        self.voice_channel_groups.clear()
+        self.group_voice_channels.clear()
+        for group_id, voice_channel_id in rows:
+            self._index_voice_channel(group_id, voice_channel_id)
+        logger.info("Indexed %s study group voice channel(s)", len(rows))
+
+    def _index_voice_channel(self, group_id, voice_channel_id):
+        old_channel_id = self.group_voice_channels.pop(group_id, None)
+        if old_channel_id is not None:
+            self.voice_channel_groups.pop(old_channel_id, None)
+        if voice_channel_id is not None:
+            self.group_voice_channels[group_id] = voice_channel_id
+            self.voice_channel_groups[voice_channel_id] = group_id
+
+    def group_for_voice_channel(self, voice_channel_id):
+        # In-memory only, returns None for channels that belong to no study group
+        return self.voice_channel_groups.get(voice_channel_id)
+
+    def cache_stats(self):
+        return {cache.name: cache.stats() for cache in (self.group_cache, self.settings_cache)}
+
+    async def warm_cache(self, guild_ids):
+        # One query per chunk of guilds instead of one per guild on first use
+        guild_ids = list(guild_ids)
+        group_epoch, settings_epoch = self.group_cache.epoch, self.settings_cache.epoch
+        for start in range(0, len(guild_ids), 500):
+            chunk = guild_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            groups = await self._fetchall(f'SELECT {STUDY_GROUP_COLUMNS} FROM study_groups WHERE guild_id IN ({placeholders}) ORDER BY id',
+                                          chunk, study_group_row)
+            settings = await self._fetchall(f'SELECT {GUILD_SETTINGS_COLUMNS} FROM guild_settings WHERE guild_id IN ({placeholders})',
+                                            chunk, guild_settings_row)
+            first_groups = {}
+            for group in groups:
+                first_groups.setdefault(group.guild_id, group)
+                self._cache_group(group, group_epoch)
+            found_settings = {row.guild_id: row for row in settings}
+            for guild_id in chunk:
+                group = first_groups.get(guild_id)
+                self.group_cache.put(('guild', guild_id), group.id if group else None, group_epoch)
+                self.settings_cache.put(guild_id, found_settings.get(guild_id) or GuildSettings(guild_id), settings_epoch)
+        logger.info("Warmed caches for %s guild(s)", len(guild_ids))
+
+    def _cache_group(self, group, epoch):
+        self.group_guilds[group.id] = group.guild_id
+        self.group_cache.put(('group', group.id), group, epoch)
+
+    def _invalidate_group(self, group_id):
+        self.group_cache.invalidate(('group', group_id))
+        guild_id = self.group_guilds.pop(group_id, None)
+        if guild_id is not None:
+            self.group_cache.invalidate(('guild', guild_id))
+        else:
+            # Unknown owner, so any guild entry could point at it
+            self.group_cache.clear()
+
+    async def _fetchone(self, sql, params=(), factory=None):
+        # Without a factory rows come back as plain tuples
+        return await self.engine.read(sql, params, one=True, factory=factory)
+
+    async def _fetchall(self, sql, params=(), factory=None):
+        return await self.engine.read(sql, params, factory=factory)
+
+    async def _execute(self, *statements):
+        # Each statement is a (sql, params) pair; all of them are committed together
+        return await self.engine.write(statements)
+
     async def create_study_group(self, name, creator_id, max_size, end_time, guild_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            INSERT INTO study_groups (name, creator_id, max_size, end_time, guild_id, admin_role_id, session_role_id, voice_channel_id)
-            VALUES (?, ?, ?, ?, ?, NULL, NULL, NULL)
-            ''', (name, creator_id, max_size, end_time, guild_id))
-            group_id = cursor.lastrowid
-            self.conn.commit()
-            logger.info(f"Created study group: {name} (ID: {group_id})")
-            return group_id
+        result = await self._execute(('''
+        INSERT INTO study_groups (name, creator_id, max_size, end_time, guild_id, admin_role_id, session_role_id, voice_channel_id)
+        VALUES (?, ?, ?, ?, ?, NULL, NULL, NULL)
+        ''', (name, creator_id, max_size, end_time, guild_id)))
+        group_id = result.lastrowid
+        self.group_cache.invalidate(('guild', guild_id))  # May have been cached as "no group"
+        logger.info("Created study group: %s (ID: %s)", name, group_id)
+        return group_id
+
     async def get_study_group_by_name(self, name, guild_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM study_groups WHERE name = ? AND guild_id = ?', (name, guild_id))
-            group = cursor.fetchone()
-            logger.debug(f"Retrieved study group by name '{name}' for guild {guild_id}: {'Found' if group else 'Not found'}")
-            return group
+        group = await self._fetchone(f'SELECT {STUDY_GROUP_COLUMNS} FROM study_groups WHERE name = ? AND guild_id = ?',
+                                    (name, guild_id), study_group_row)
+        logger.debug("Retrieved study group by name '%s' for guild %s: %s", name, guild_id, 'Found' if group else 'Not found')
+        return group
+
+    async def get_study_group_by_id(self, group_id):
+        group = self.group_cache.get(('group', group_id))
+        if group is MISSING:
+            epoch = self.group_cache.epoch
+            group = await self._fetchone(f'SELECT {STUDY_GROUP_COLUMNS} FROM study_groups WHERE id = ?', (group_id,), study_group_row)
+            if group:
+                self._cache_group(group, epoch)
+        return group
 
     async def get_study_group(self, guild_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM study_groups WHERE guild_id = ?', (guild_id,))
-            group = cursor.fetchone()
-            logger.debug(f"Retrieved study group for guild {guild_id}: {'Found' if group else 'Not found'}")
-            return group
+        group_id = self.group_cache.get(('guild', guild_id))
+        if group_id is None:
+            group = None
+        elif group_id is not MISSING:
+            group = await self.get_study_group_by_id(group_id)
+        else:
+            epoch = self.group_cache.epoch
+            group = await self._fetchone(f'SELECT {STUDY_GROUP_COLUMNS} FROM study_groups WHERE guild_id = ? ORDER BY id',
+                                         (guild_id,), study_group_row)
+            if group:
+                self._cache_group(group, epoch)
+            self.group_cache.put(('guild', guild_id), group.id if group else None, epoch)
+        logger.debug("Retrieved study group for guild %s: %s", guild_id, 'Found' if group else 'Not found')
+        return group
 
     async def delete_study_group(self, group_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM study_groups WHERE id = ?', (group_id,))
-            cursor.execute('DELETE FROM group_members WHERE group_id = ?', (group_id,))
-            self.conn.commit()
-            logger.info(f"Deleted study group with ID: {group_id}")
+        await self._execute(
+            ('DELETE FROM study_groups WHERE id = ?', (group_id,)),
+            ('DELETE FROM group_members WHERE group_id = ?', (group_id,)),
+            # A running Pomodoro would otherwise be restored for a group that no longer exists
+            ('UPDATE pomodoro_sessions SET end_time = ? WHERE group_id = ? AND end_time IS NULL', (time.time(), group_id)),
+        )
+        self._invalidate_group(group_id)
+        self._index_voice_channel(group_id, None)
+        logger.info("Deleted study group with ID: %s", group_id)
 
     async def get_user_group(self, user_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                SELECT study_groups.* 
-                FROM study_groups 
-                JOIN group_members ON study_groups.id = group_members.group_id
-                WHERE group_members.user_id = ?
-            ''', (user_id,))
-            group = cursor.fetchone()
-            logger.debug(f"Retrieved group for user {user_id}: {'Found' if group else 'Not found'}")
-            return group
+        group = await self._fetchone(f'''
+            SELECT {column_list(StudyGroup, 'study_groups')}
+            FROM study_groups
+            JOIN group_members ON study_groups.id = group_members.group_id
+            WHERE group_members.user_id = ?
+        ''', (user_id,), study_group_row)
+        logger.debug("Retrieved group for user %s: %s", user_id, 'Found' if group else 'Not found')
+        return group
 
     async def add_group_member(self, group_id, user_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            INSERT OR IGNORE INTO group_members (group_id, user_id)
-            VALUES (?, ?)
-            ''', (group_id, user_id))
-            self.conn.commit()
-            logger.info(f"Added user {user_id} to group {group_id}")
+        await self._execute(('''
+        INSERT OR IGNORE INTO group_members (group_id, user_id)
+        VALUES (?, ?)
+        ''', (group_id, user_id)))
+        logger.info("Added user %s to group %s", user_id, group_id)
 
     async def remove_group_member(self, group_id, user_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            DELETE FROM group_members
-            WHERE group_id = ? AND user_id = ?
-            ''', (group_id, user_id))
-            self.conn.commit()
-            logger.info(f"Removed user {user_id} from group {group_id}")
+        await self._execute(('''
+        DELETE FROM group_members
+        WHERE group_id = ? AND user_id = ?
+        ''', (group_id, user_id)))
+        logger.info("Removed user %s from group %s", user_id, group_id)
 
     async def get_group_members(self, group_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT user_id FROM group_members WHERE group_id = ?', (group_id,))
-            members = [row['user_id'] for row in cursor.fetchall()]
-            logger.debug(f"Retrieved {len(members)} members for group {group_id}")
-            return members
-        
+        members = await self._fetchall('SELECT user_id FROM group_members WHERE group_id = ?', (group_id,), scalar)
+        logger.debug("Retrieved %s members for group %s", len(members), group_id)
+        return members
+
     async def get_all_study_groups(self, guild_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM study_groups WHERE guild_id = ?', (guild_id,))
-            groups = cursor.fetchall()
-            logger.debug(f"Retrieved {len(groups)} study groups for guild {guild_id}")
-            return groups
+        groups = await self._fetchall(f'SELECT {STUDY_GROUP_COLUMNS} FROM study_groups WHERE guild_id = ?', (guild_id,), study_group_row)
+        logger.debug("Retrieved %s study groups for guild %s", len(groups), guild_id)
+        return groups
 
 
     async def update_group_roles(self, group_id, admin_role_id, session_role_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            UPDATE study_groups
-            SET admin_role_id = ?, session_role_id = ?
-            WHERE id = ?
-            ''', (admin_role_id, session_role_id, group_id))
-            self.conn.commit()
-            logger.info(f"Updated roles for group {group_id}: admin_role_id={admin_role_id}, session_role_id={session_role_id}")
+        await self._execute(('''
+        UPDATE study_groups
+        SET admin_role_id = ?, session_role_id = ?
+        WHERE id = ?
+        ''', (admin_role_id, session_role_id, group_id)))
+        self._invalidate_group(group_id)
+        logger.info("Updated roles for group %s: admin_role_id=%s, session_role_id=%s", group_id, admin_role_id, session_role_id)
 
     async def get_group_roles(self, group_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT admin_role_id, session_role_id FROM study_groups WHERE id = ?', (group_id,))
-            roles = cursor.fetchone()
-            logger.debug(f"Retrieved roles for group {group_id}: {roles}")
-            return roles
+        group = await self.get_study_group_by_id(group_id)
+        roles = (group.admin_role_id, group.session_role_id) if group else None
+        logger.debug("Retrieved roles for group %s: %s", group_id, roles)
+        return roles
 
     async def update_voice_channel(self, group_id, voice_channel_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            UPDATE study_groups
-            SET voice_channel_id = ?
-            WHERE id = ?
-            ''', (voice_channel_id, group_id))
-            self.conn.commit()
-            logger.info(f"Updated voice channel for group {group_id}: voice_channel_id={voice_channel_id}")
+        await self._execute(('''
+        UPDATE study_groups
+        SET voice_channel_id = ?
+        WHERE id = ?
+        ''', (voice_channel_id, group_id)))
+        self._invalidate_group(group_id)
+        self._index_voice_channel(group_id, voice_channel_id)
+        logger.info("Updated voice channel for group %s: voice_channel_id=%s", group_id, voice_channel_id)
 
     async def log_vc_creation(self, group_id, channel_id, creator_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            INSERT INTO voice_channel_logs (group_id, channel_id, creator_id, create_time)
-            VALUES (?, ?, ?, ?)
-            ''', (group_id, channel_id, creator_id, datetime.now()))
-            self.conn.commit()
-            logger.info(f"Logged voice channel creation: group={group_id}, channel={channel_id}, creator={creator_id}")
+        await self._execute(('''
+        INSERT INTO voice_channel_logs (group_id, channel_id, creator_id, create_time)
+        VALUES (?, ?, ?, ?)
+        ''', (group_id, channel_id, creator_id, datetime.now())))
+        logger.info("Logged voice channel creation: group=%s, channel=%s, creator=%s", group_id, channel_id, creator_id)
 
     async def get_vc_logs(self, guild_id, start_date):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            SELECT channel_id, creator_id, create_time FROM voice_channel_logs
-            JOIN study_groups ON voice_channel_logs.group_id = study_groups.id
-            WHERE study_groups.guild_id = ? AND create_time >= ?
-            ''', (guild_id, start_date))
-            logs = cursor.fetchall()
-            logger.debug(f"Retrieved {len(logs)} VC logs for guild {guild_id} since {start_date}")
-            return logs
+        logs = await self._fetchall('''
+        SELECT voice_channel_logs.channel_id, voice_channel_logs.creator_id, voice_channel_logs.create_time FROM voice_channel_logs
+        JOIN study_groups ON voice_channel_logs.group_id = study_groups.id
+        WHERE study_groups.guild_id = ? AND create_time >= ?
+        ''', (guild_id, start_date))
+        logger.debug("Retrieved %s VC logs for guild %s since %s", len(logs), guild_id, start_date)
+        return logs
 
     async def update_vc_cleanup_time(self, guild_id, cleanup_time):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            INSERT OR REPLACE INTO guild_settings (guild_id, vc_cleanup_time)
-            VALUES (?, ?)
-            ''', (guild_id, cleanup_time))
-            self.conn.commit()
-            logger.info(f"Updated VC cleanup time for guild {guild_id}: {cleanup_time} seconds")
+        await self._execute(('''
+        INSERT OR REPLACE INTO guild_settings (guild_id, vc_cleanup_time)
+        VALUES (?, ?)
+        ''', (guild_id, cleanup_time)))
+        self.settings_cache.invalidate(guild_id)
+        logger.info("Updated VC cleanup time for guild %s: %s seconds", guild_id, cleanup_time)
+
+    async def get_guild_settings(self, guild_id):
+        settings = self.settings_cache.get(guild_id)
+        if settings is MISSING:
+            epoch = self.settings_cache.epoch
+            settings = await self._fetchone(f'SELECT {GUILD_SETTINGS_COLUMNS} FROM guild_settings WHERE guild_id = ?',
+                                            (guild_id,), guild_settings_row) or GuildSettings(guild_id)
+            self.settings_cache.put(guild_id, settings, epoch)
+        return settings
 
     async def get_vc_cleanup_time(self, guild_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT vc_cleanup_time FROM guild_settings WHERE guild_id = ?', (guild_id,))
-            result = cursor.fetchone()
-            cleanup_time = result['vc_cleanup_time'] if result else 600
-            logger.debug(f"Retrieved VC cleanup time for guild {guild_id}: {cleanup_time} seconds")
-            return cleanup_time
+        settings = await self.get_guild_settings(guild_id)
+        cleanup_time = settings.vc_cleanup_time if settings.vc_cleanup_time is not None else 600
+        logger.debug("Retrieved VC cleanup time for guild %s: %s seconds", guild_id, cleanup_time)
+        return cleanup_time
 
     async def update_vc_category(self, guild_id, category_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            INSERT OR REPLACE INTO guild_settings (guild_id, vc_category_id)
-            VALUES (?, ?)
-            ''', (guild_id, category_id))
-            self.conn.commit()
-            logger.info(f"Updated VC category for guild {guild_id}: category_id={category_id}")
+        await self._execute(('''
+        INSERT OR REPLACE INTO guild_settings (guild_id, vc_category_id)
+        VALUES (?, ?)
+        ''', (guild_id, category_id)))
+        self.settings_cache.invalidate(guild_id)
+        logger.info("Updated VC category for guild %s: category_id=%s", guild_id, category_id)
 
     async def get_vc_category(self, guild_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT vc_category_id FROM guild_settings WHERE guild_id = ?', (guild_id,))
-            result = cursor.fetchone()
-            category_id = result['vc_category_id'] if result else None
-            logger.debug(f"Retrieved VC category for guild {guild_id}: {category_id}")
-            return category_id
+        settings = await self.get_guild_settings(guild_id)
+        category_id = settings.vc_category_id
+        logger.debug("Retrieved VC category for guild %s: %s", guild_id, category_id)
+        return category_id
 
     async def add_manager(self, user_id, guild_id, permission_level):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            INSERT OR REPLACE INTO managers (user_id, guild_id, permission_level)
-            VALUES (?, ?, ?)
-            ''', (user_id, guild_id, permission_level))
-            self.conn.commit()
-            logger.info(f"Added/Updated manager: user={user_id}, guild={guild_id}, permission_level={permission_level}")
+        await self._execute(('''
+        INSERT OR REPLACE INTO managers (user_id, guild_id, permission_level)
+        VALUES (?, ?, ?)
+        ''', (user_id, guild_id, permission_level)))
+        logger.info("Added/Updated manager: user=%s, guild=%s, permission_level=%s", user_id, guild_id, permission_level)
 
     async def remove_manager(self, user_id, guild_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM managers WHERE user_id = ? AND guild_id = ?', (user_id, guild_id))
-            self.conn.commit()
-            logger.info(f"Removed manager: user={user_id}, guild={guild_id}")
+        await self._execute(('DELETE FROM managers WHERE user_id = ? AND guild_id = ?', (user_id, guild_id)))
+        logger.info("Removed manager: user=%s, guild=%s", user_id, guild_id)
 
     async def get_manager(self, user_id, guild_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM managers WHERE user_id = ? AND (guild_id = ? OR guild_id IS NULL)', (user_id, guild_id))
-            manager = cursor.fetchone()
-            logger.debug(f"Retrieved manager info for user {user_id} in guild {guild_id}: {'Found' if manager else 'Not found'}")
-            return manager
+        manager = await self._fetchone(f'SELECT {MANAGER_COLUMNS} FROM managers WHERE user_id = ? AND (guild_id = ? OR guild_id IS NULL)',
+                                      (user_id, guild_id), manager_row)
+        logger.debug("Retrieved manager info for user %s in guild %s: %s", user_id, guild_id, 'Found' if manager else 'Not found')
+        return manager
+
+    async def get_all_manager_rows(self):
+        # Every guild's managers and the bot developers, for PermissionService.load
+        managers = await self._fetchall(f'SELECT {MANAGER_COLUMNS} FROM managers', factory=manager_row)
+        logger.debug("Retrieved %s manager rows", len(managers))
+        return managers
 
     async def get_all_managers(self, guild_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM managers WHERE guild_id = ? OR guild_id IS NULL', (guild_id,))
-            managers = cursor.fetchall()
-            logger.debug(f"Retrieved {len(managers)} managers for guild {guild_id}")
-            return managers
+        managers = await self._fetchall(f'SELECT {MANAGER_COLUMNS} FROM managers WHERE guild_id = ? OR guild_id IS NULL', (guild_id,), manager_row)
+        logger.debug("Retrieved %s managers for guild %s", len(managers), guild_id)
+        return managers
 
     async def add_task(self, user_id, description):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            INSERT INTO tasks (user_id, description)
-            VALUES (?, ?)
-            ''', (user_id, description))
-            task_id = cursor.lastrowid
-            self.conn.commit()
-            logger.info(f"Added task for user {user_id}: ID={task_id}, description='{description}'")
-            return task_id
+        result = await self._execute(('''
+        INSERT INTO tasks (user_id, description)
+        VALUES (?, ?)
+        ''', (user_id, description)))
+        task_id = result.lastrowid
+        logger.info("Added task for user %s: ID=%s, description='%s'", user_id, task_id, description)
+        return task_id
 
     async def complete_task(self, user_id, task_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-            UPDATE tasks SET completed = 1
-            WHERE id = ? AND user_id = ?
-            ''', (task_id, user_id))
-            self.conn.commit()
-            success = cursor.rowcount > 0
-            logger.info(f"{'Completed' if success else 'Failed to complete'} task {task_id} for user {user_id}")
-            return success
+        result = await self._execute(('''
+        UPDATE tasks SET completed = 1
+        WHERE id = ? AND user_id = ?
+        ''', (task_id, user_id)))
+        success = result.rowcount > 0
+        logger.info("%s task %s for user %s", 'Completed' if success else 'Failed to complete', task_id, user_id)
+        return success
 
     async def get_user_tasks(self, user_id):
-        async with self.lock:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM tasks WHERE user_id = ?', (user_id,))
-            tasks = cursor.fetchall()
-            logger.debug(f"Retrieved {len(tasks)} tasks for user {user_id}")
-            return tasks
-        
-
+        tasks = await self._fetchall(f'SELECT {TASK_COLUMNS} FROM tasks WHERE user_id = ?', (user_id,), task_row)
+        logger.debug("Retrieved %s tasks for user %s", len(tasks), user_id)
+        return tasks
+
+    async def start_pomodoro_session(self, guild_id, group_id, focus, short_break, long_break, stage_deadline):
+        # A stale active row for the group (left by a crash) is taken over instead of hitting
+        # the one-active-session-per-group index
+        await self._execute(('''
+        INSERT INTO pomodoro_sessions (group_id, guild_id, start_time, focus_duration, short_break_duration,
+                                       long_break_duration, stage, cycles, stage_deadline)
+        VALUES (?, ?, ?, ?, ?, ?, 'focus', 0, ?)
+        ON CONFLICT (group_id) WHERE end_time IS NULL DO UPDATE SET
+            guild_id = excluded.guild_id, start_time = excluded.start_time, focus_duration = excluded.focus_duration,
+            short_break_duration = excluded.short_break_duration, long_break_duration = excluded.long_break_duration,
+            stage = 'focus', cycles = 0, stage_deadline = excluded.stage_deadline, paused_remaining = NULL
+        ''', (group_id, guild_id, time.time(), focus, short_break, long_break, stage_deadline)))
+        # No row ID: lastrowid isn't set when the upsert updates a stale row
+        logger.info("Stored pomodoro session for group %s", group_id)
+
+    async def update_pomodoro_session(self, group_id, stage, cycles, stage_deadline, paused_remaining):
+        await self._execute(('''
+        UPDATE pomodoro_sessions
+        SET stage = ?, cycles = ?, stage_deadline = ?, paused_remaining = ?
+        WHERE group_id = ? AND end_time IS NULL
+        ''', (stage, cycles, stage_deadline, paused_remaining, group_id)))
+        logger.debug("Updated pomodoro session for group %s: stage=%s, cycles=%s", group_id, stage, cycles)
+
+    async def end_pomodoro_session(self, group_id):
+        await self._execute(('UPDATE pomodoro_sessions SET end_time = ? WHERE group_id = ? AND end_time IS NULL',
+                             (time.time(), group_id)))
+        logger.info("Ended stored pomodoro session for group %s", group_id)
+
+    async def get_active_pomodoro_sessions(self):
+        sessions = await self._fetchall(f'SELECT {POMODORO_COLUMNS} FROM pomodoro_sessions WHERE end_time IS NULL',
+                                        factory=pomodoro_row)
+        logger.debug("Retrieved %s active pomodoro sessions", len(sessions))
+        return sessions
+
+    async def get_active_pomodoro_session(self, group_id):
+        return await self._fetchone(f'SELECT {POMODORO_COLUMNS} FROM pomodoro_sessions WHERE group_id = ? AND end_time IS NULL',
+                                    (group_id,), pomodoro_row)
+
+    async def save_checkin_session(self, record, members):
+        # The session row and its member rows are replaced together
+        statements = [
+            (f'INSERT OR REPLACE INTO checkin_sessions ({CHECKIN_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+             (record.session_id, record.guild_id, record.channel_id, record.creator_id, record.duration,
+              record.start_time, record.edit_in_place, record.reminder_count, record.next_reminder, record.last_message_id)),
+            ('DELETE FROM checkin_members WHERE session_id = ?', (record.session_id,)),
+        ]
+        statements.extend((f'INSERT INTO checkin_members ({CHECKIN_MEMBER_COLUMNS}) VALUES (?, ?, ?, ?, ?)',
+                           (member.session_id, member.user_id, member.absences, member.present, member.exited))
+                          for member in members)
+        await self._execute(*statements)
+        logger.debug("Stored check-in session %s with %s members", record.session_id, len(members))
+
+    async def get_checkin_session(self, session_id):
+        # (CheckinRecord, [CheckinMember]), or None if the session is gone
+        record = await self._fetchone(f'SELECT {CHECKIN_COLUMNS} FROM checkin_sessions WHERE session_id = ?',
+                                      (session_id,), checkin_row)
+        if record is None:
+            return None
+        members = await self._fetchall(f'SELECT {CHECKIN_MEMBER_COLUMNS} FROM checkin_members WHERE session_id = ?',
+                                       (session_id,), checkin_member_row)
+        return record, members
+
+    async def delete_checkin_session(self, session_id):
+        await self._execute(('DELETE FROM checkin_members WHERE session_id = ?', (session_id,)),
+                            ('DELETE FROM checkin_sessions WHERE session_id = ?', (session_id,)))
+        logger.debug("Deleted stored check-in session %s", session_id)
+
+    async def acquire_lease(self, resource, guild_id, owner, ttl):
+        # Claims `resource` if it is free, expired or already ours. True if we hold it now.
+        now = time.time()
+        result = await self._execute(('''
+        INSERT INTO leases (resource, guild_id, owner, expires_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT (resource) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+        ''', (resource, guild_id, owner, now + ttl, now)))
+        return result.rowcount == 1
+
+    async def confirm_lease(self, resource, owner, ttl):
+        # Like acquire_lease, but never recreates a lease that was released in the meantime
+        now = time.time()
+        result = await self._execute(('''
+        UPDATE leases SET owner = ?, expires_at = ?
+        WHERE resource = ? AND (owner = ? OR expires_at < ?)
+        ''', (owner, now + ttl, resource, owner, now)))
+        return result.rowcount == 1
+
+    async def renew_leases(self, owner, ttl):
+        # Heartbeat: extends every lease `owner` holds and returns their resources
+        await self._execute(('UPDATE leases SET expires_at = ? WHERE owner = ?', (time.time() + ttl, owner)))
+        return await self._fetchall('SELECT resource FROM leases WHERE owner = ?', (owner,), scalar)
+
+    async def release_lease(self, resource, owner):
+        await self._execute(('DELETE FROM leases WHERE resource = ? AND owner = ?', (resource, owner)))
+
+    async def expire_leases(self, owner):
+        # On shutdown: hand every lease of `owner` over to the next worker that looks
+        await self._execute(('UPDATE leases SET expires_at = 0 WHERE owner = ?', (owner,)))
+
+    async def get_claimable_leases(self, owner):
+        # Expired leases, plus those of `owner` itself (a restarted worker picks its own back up)
+        return await self._fetchall('SELECT resource, guild_id FROM leases WHERE expires_at < ? OR owner = ?',
+                                    (time.time(), owner))
+
+    async def get_command_hash(self, scope):
+        row = await self._fetchone('SELECT hash FROM command_sync WHERE scope = ?', (scope,))
+        return row[0] if row else None
+
+    async def set_command_hash(self, scope, command_hash):
+        await self._execute(('''
+        INSERT OR REPLACE INTO command_sync (scope, hash, synced_at)
+        VALUES (?, ?, ?)
+        ''', (scope, command_hash, time.time())))
+        logger.debug("Stored command tree hash for %s", scope)
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Gateway profiles decide which intents the bot asks for and what discord.py keeps in memory.
+#   full: the intents the bot has always requested, with every guild's member list chunked
+#         at startup and the last 1000 messages cached.
+#   lean: only what the cogs use (guilds, members, voice states). No message cache, and member
+#         lists are not chunked at startup; MemberLoader fetches a guild's members the first time
+#         a feature needs all of them, such as expanding a role mention in /checkin.
+PROFILES = ('full', 'lean')
+
+
+def client_options(profile):
+    """Keyword arguments for commands.Bot for a gateway profile."""
+    if profile == 'full':
+        intents = discord.Intents.default()
+        intents.guilds = True
+        intents.members = True
+        intents.messages = True
+        intents.message_content = True
+        intents.voice_states = True
+        intents.reactions = True
+        return {'intents': intents, 'chunk_guilds_at_startup': True, 'max_messages': 1000}
+    if profile == 'lean':
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.members = True  # Member events feed the role index; also needed to chunk on demand
+        intents.voice_states = True  # Voice channel cleanup and Pomodoro
+        return {'intents': intents, 'chunk_guilds_at_startup': False, 'max_messages': None,
+                'member_cache_flags': discord.MemberCacheFlags.from_intents(intents)}
+    raise ValueError(f"Unknown gateway profile {profile!r}, expected one of {', '.join(PROFILES)}")
+
+
+class MemberLoader:
+    """Chunks a guild's member list on first need, once per guild however many callers ask.
+
+    Interactions wait up to `defer_after` seconds for the chunk before being deferred, so a
+    slow chunk on a large guild doesn't run past the interaction's response deadline.
+    """
+
+    def __init__(self, enabled=True, defer_after=2.0):
+        self.enabled = enabled
+        self.defer_after = defer_after
+        self.pending = {}  # guild_id -> chunk task
+        self.chunked = 0
+        self.fetched = 0
+
+    def needs_chunk(self, guild):
+        return self.enabled and not guild.chunked
+
+    def chunk(self, guild):
+        task = self.pending.get(guild.id)
+        if task is None:
+            task = self.pending[guild.id] = asyncio.create_task(self._chunk(guild), name=f"chunk-{guild.id}")
+        return task
+
+    async def _chunk(self, guild):
+        started = time.perf_counter()
+        try:
+            await guild.chunk(cache=True)
+            self.chunked += 1
+            logger.info("Chunked %s members of guild %s on demand in %.2fs", guild.member_count, guild.id,
+                        time.perf_counter() - started)
+        except (asyncio.TimeoutError, discord.ClientException) as e:
+            logger.warning("Chunking guild %s failed: %s", guild.id, e)
+        finally:
+            self.pending.pop(guild.id, None)
+
+    async def ensure_chunked(self, guild, interaction=None):
+        if not self.needs_chunk(guild):
+            return
+        task = self.chunk(guild)
+        if interaction is not None and not interaction.response.is_done():
+            done, _ = await asyncio.wait({task}, timeout=self.defer_after)
+            if not done and not interaction.response.is_done():
+                await interaction.response.defer(thinking=True)
+        await asyncio.shield(task)
+
+    async def fetch_missing(self, guild, user_ids):
+        # Members mentioned by ID who aren't cached, in one gateway request per 100
+        missing = [user_id for user_id in user_ids if guild.get_member(user_id) is None]
+        if not self.enabled or not missing:
+            return
+        for start in range(0, len(missing), 100):
+            try:
+                members = await guild.query_members(user_ids=missing[start:start + 100], cache=True)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                logger.warning("Fetching members of guild %s failed: %s", guild.id, e)
+                return
+            self.fetched += len(members)
+
+    def stats(self):
+        return {'pending': len(self.pending), 'chunked': self.chunked, 'fetched': self.fetched}
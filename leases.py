@@ -0,0 +1,160 @@
+import asyncio
+import itertools
+import logging
+import socket
+
+from scheduler import shard_id_for
+
+logger = logging.getLogger(__name__)
+
+# Several bot processes can run against one database, each with its own subset of shards.
+# Every timer-driven session (a Pomodoro group, a check-in) is run by exactly one of them:
+# the worker that holds the session's row in the leases table. Holders renew all their
+# leases every `interval` seconds; a lease that isn't renewed for `ttl` seconds expires, and
+# the next sweep of a worker that owns the session's shard claims it and resumes the timer
+# from the stored deadline. Before a timer fires its holder confirms the lease, so a worker
+# that stalled past its ttl and was replaced stays quiet instead of pinging twice.
+
+
+def default_owner(shard_ids=None):
+    # Stable across restarts, so a restarted worker reclaims its own leases without waiting
+    # for them to expire. Processes on one host must run different shards (or set WORKER_ID).
+    shards = ",".join(map(str, sorted(shard_ids))) if shard_ids else "all"
+    return f"{socket.gethostname()}:{shards}"
+
+
+class LeaseManager:
+    """Claims, renews and takes over session leases for one worker process.
+
+    Cogs register a kind of session ('pomodoro', 'checkin') with two callbacks:
+    `resume(key)` starts running a session this worker just claimed and returns False if
+    there was nothing left to run, and `drop(key)` stops running one whose lease was lost.
+    """
+
+    def __init__(self, bot, owner, ttl=30.0, interval=None):
+        self.bot = bot
+        self.owner = owner
+        self.ttl = ttl
+        self.interval = interval or ttl / 3
+        self.held = {}  # resource -> claim number, new for every acquire
+        self.claims = itertools.count()
+        self.claiming = set()  # resources with an acquire in flight
+        self.handlers = {}  # kind -> (resume, drop)
+        self.task = None
+        self.taken_over = 0
+        self.lost = 0
+
+    def register(self, kind, resume, drop):
+        self.handlers[kind] = (resume, drop)
+
+    def unregister(self, kind):
+        self.handlers.pop(kind, None)
+
+    def owns_guild(self, guild_id):
+        # Whether the guild's shard runs in this process
+        if guild_id is None or self.bot.shard_ids is None:
+            return True
+        return shard_id_for(guild_id, self.bot.shard_count or 1) in self.bot.shard_ids
+
+    def holds(self, kind, key):
+        return f"{kind}:{key}" in self.held
+
+    async def acquire(self, kind, key, guild_id):
+        # False if another worker holds the lease, or this one already runs the session
+        resource = f"{kind}:{key}"
+        if resource in self.held or resource in self.claiming:
+            return False
+        self.claiming.add(resource)
+        try:
+            if not await self.bot.db.acquire_lease(resource, guild_id, self.owner, self.ttl):
+                return False
+            self.held[resource] = next(self.claims)
+            return True
+        finally:
+            self.claiming.discard(resource)
+
+    async def confirm(self, kind, key):
+        # Called right before a timer acts. False means another worker has taken over.
+        resource = f"{kind}:{key}"
+        if await self.bot.db.confirm_lease(resource, self.owner, self.ttl):
+            return True
+        self.held.pop(resource, None)
+        self.lost += 1
+        logger.warning("Lease %s was taken over by another worker", resource)
+        return False
+
+    async def release(self, kind, key):
+        resource = f"{kind}:{key}"
+        self.held.pop(resource, None)
+        await self.bot.db.release_lease(resource, self.owner)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(), name="leases")
+            logger.info("Lease manager started as %s (ttl %ss)", self.owner, self.ttl)
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        # Let the other workers take over right away instead of after the ttl
+        if self.held:
+            await self.bot.db.expire_leases(self.owner)
+            logger.info("Handed over %s lease(s)", len(self.held))
+            self.held.clear()
+
+    async def run(self):
+        while True:
+            try:
+                await self.heartbeat()
+                if self.bot.is_ready():
+                    await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Lease heartbeat failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def heartbeat(self):
+        # Only leases held before the renewal started can be judged by its result; one acquired
+        # (or released and acquired again) while it ran may be missing from it and is still ours
+        before = dict(self.held)
+        still_held = set(await self.bot.db.renew_leases(self.owner, self.ttl))
+        for resource, claim in before.items():
+            if resource in still_held or self.held.get(resource) != claim:
+                continue
+            del self.held[resource]
+            self.lost += 1
+            logger.warning("Lost lease %s to another worker", resource)
+            kind, _, key = resource.partition(':')
+            handler = self.handlers.get(kind)
+            if handler:
+                await handler[1](key)
+
+    async def sweep(self):
+        # Claim expired leases (and our own from before a restart) for guilds on our shards
+        for resource, guild_id in await self.bot.db.get_claimable_leases(self.owner):
+            kind, _, key = resource.partition(':')
+            handler = self.handlers.get(kind)
+            if handler is None or not self.owns_guild(guild_id):
+                continue
+            if not await self.acquire(kind, key, guild_id):
+                continue
+            try:
+                resumed = await handler[0](key)
+            except Exception as e:
+                logger.error("Resuming %s failed: %s", resource, e)
+                resumed = False
+            if resumed:
+                self.taken_over += 1
+                logger.info("Took over %s", resource)
+            else:
+                await self.release(kind, key)
+
+    def stats(self):
+        return {'held': len(self.held), 'taken_over': self.taken_over, 'lost': self.lost}
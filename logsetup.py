@@ -0,0 +1,91 @@
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+
+# Logging is configured once, by bot.py, through configure_logging. Modules only call
+# logging.getLogger(__name__) and log with lazy %-style arguments, e.g.
+#   logger.debug("Session %s: %d members", session_id, count)
+# so a suppressed record costs one level check and an emitted one is usually formatted on
+# the listener thread, not on the event loop.
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Arguments that can't change after the call, so formatting them later on another thread is safe
+IMMUTABLE_ARGS = (str, int, float, bytes, type(None))
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats the message in the calling thread before enqueueing.
+    # Records whose arguments are all immutable scalars (the common case) are handed over
+    # as they are and formatted by the listener's handlers. Anything else (a dict, a list,
+    # a session object) could change, or be read mid-update, before the listener gets to
+    # it, so its message is formatted here, as the stock handler does.
+    def prepare(self, record):
+        args = record.args
+        if not args or (isinstance(args, tuple) and all(isinstance(arg, IMMUTABLE_ARGS) for arg in args)):
+            return record
+        record = copy.copy(record)  # Other handlers of the same record keep the original
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """Lets through every record above DEBUG and one in `every` DEBUG records per call site.
+
+    Records are grouped by logger and message template, which is why hot paths must use
+    %-style arguments: an f-string makes every message a template of its own.
+    """
+
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = max(1, every)
+        self.seen = {}
+
+    def filter(self, record):
+        if self.every == 1 or record.levelno > logging.DEBUG:
+            return True
+        key = (record.name, record.msg)
+        if len(self.seen) > 10000:
+            self.seen.clear()  # Only reached if something logs f-strings at DEBUG
+        count = self.seen.get(key, 0)
+        self.seen[key] = count + 1
+        return count % self.every == 0
+
+
+def parse_levels(spec):
+    # "cogs.checkin=DEBUG,discord.gateway=WARNING" -> {'cogs.checkin': 'DEBUG', 'discord.gateway': 'WARNING'}
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level='INFO', module_levels=None, debug_sample=1, log_file=None):
+    """Route all logging through a queue drained by a background thread. Returns the listener."""
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf-8'))
+    formatter = logging.Formatter(FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(records)
+    queue_handler.addFilter(DebugSampler(debug_sample))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,359 @@
+import asyncio
+import bisect
+import functools
+import inspect
+import logging
+import time
+
+from discord import app_commands
+
+from storage import wait_sink
+
+logger = logging.getLogger(__name__)
+
+# In-process counters and histograms, rendered in the Prometheus text format.
+# Everything runs on the event loop thread, so updates need no locking.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if value not in (float('inf'), float('-inf')) else ('+Inf' if value > 0 else '-Inf')
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        registry.register(self)
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge:
+    """A value read when metrics are rendered. `fn` returns {label values tuple: value},
+    or a number for a gauge without labels. Gauges without `fn` are set directly."""
+
+    type = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), fn=None, registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.values = {}
+        registry.register(self)
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def collect(self):
+        if self.fn is None:
+            return self.values
+        try:
+            values = self.fn()
+        except Exception as e:
+            logger.error("Collecting gauge %s failed: %s", self.name, e)
+            return {}
+        return values if isinstance(values, dict) else {(): values}
+
+    def samples(self):
+        for labels, value in self.collect().items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label values -> [per-bucket counts (last is +Inf), sum, count]
+        registry.register(self)
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labels):
+        series = self.series.get(labels)
+        return series[2] if series else 0
+
+    def total(self, *labels):
+        series = self.series.get(labels)
+        return series[1] if series else 0.0
+
+    def quantile(self, q, *labels):
+        # Upper bound of the bucket holding the q-th observation, so an estimate that errs high
+        series = self.series.get(labels)
+        if not series or not series[2]:
+            return 0.0
+        rank = q * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+COMMANDS = Counter('cpo_commands_total', "Slash commands handled, by outcome.", ('command', 'status'))
+COMMAND_SECONDS = Histogram('cpo_command_seconds', "Time spent handling a slash command.", ('command',))
+DB_CALLS = Counter('cpo_db_calls_total', "Database method calls, by outcome.", ('method', 'status'))
+DB_SECONDS = Histogram('cpo_db_call_seconds', "Time a Database method took, including waiting for a connection.", ('method',))
+DB_LOCK_WAIT = Histogram('cpo_db_lock_wait_seconds', "Time a Database method's queries sat queued before a connection ran them.", ('method',))
+SHARD_COMMANDS = Counter('cpo_shard_commands_total', "Slash commands handled, by the shard of the guild they came from.", ('shard',))
+EVENT_SECONDS = Histogram('cpo_event_seconds', "Time spent in a gateway event handler.", ('event',))
+LOOP_LAG = Histogram('cpo_event_loop_lag_seconds', "How late the event loop woke a periodic probe.",
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+STARTED = time.time()
+Gauge('cpo_start_time_seconds', "Unix time the process started.", fn=lambda: STARTED)
+
+
+def instrumented(cls):
+    """Class decorator: time every public coroutine method of a Database-like class.
+
+    Besides the call duration, the queue wait of every query the call made is summed
+    (nested instrumented calls count toward their caller too), which is the time the
+    old single `Database.lock` would have been held by someone else.
+    """
+    for name, member in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.iscoroutinefunction(member):
+            continue
+        setattr(cls, name, _instrument_method(name, member))
+    return cls
+
+
+def _instrument_method(name, method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        waits = []
+        token = wait_sink.set(waits)
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            result = await method(*args, **kwargs)
+            status = 'ok'
+            return result
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, name)
+            DB_LOCK_WAIT.observe(sum(waits), name)
+            DB_CALLS.inc(name, status)
+            wait_sink.reset(token)
+            outer = wait_sink.get()
+            if outer is not None:
+                outer.extend(waits)
+    return wrapper
+
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction):
+        # Runs before every command; the bot observes the duration on completion or in tree.on_error
+        interaction.extras['started'] = time.perf_counter()
+        return True
+
+
+def observe_command(interaction, status):
+    started = interaction.extras.pop('started', None)
+    if started is None:
+        return
+    command = interaction.command
+    name = command.qualified_name if command else 'unknown'
+    COMMAND_SECONDS.observe(time.perf_counter() - started, name)
+    COMMANDS.inc(name, status)
+    SHARD_COMMANDS.inc(str(interaction.guild.shard_id) if interaction.guild else 'dm')
+
+
+def timed_event(handler, event_name=None):
+    # Wraps an event handler (bot method, listener or cog listener) to time it under its event
+    # name, which defaults to the handler's own name as it does for discord.py listeners
+    event_name = event_name or handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            EVENT_SECONDS.observe(time.perf_counter() - started, event_name)
+    return wrapper
+
+
+class LoopLagMonitor:
+    # Sleeps for `interval` and records how much longer than that it actually took
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.task = None
+        self.last = 0.0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(), name="loop-lag-monitor")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            before = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - before - self.interval)
+            LOOP_LAG.observe(self.last)
+
+
+def top_series(histogram, top=5):
+    # [(label, count, avg seconds, p99 seconds)] for the label values with the most total time
+    rows = [(labels[0] if labels else '', series[2], series[1] / series[2] if series[2] else 0.0, histogram.quantile(0.99, *labels))
+            for labels, series in histogram.series.items()]
+    rows.sort(key=lambda row: row[1] * row[2], reverse=True)
+    return rows[:top]
+
+
+def track_bot(bot):
+    # Gauges read from the bot's own subsystems at scrape time
+    if 'cpo_guilds' in REGISTRY.metrics:
+        return
+    Gauge('cpo_guilds', "Guilds the bot is in.", fn=lambda: len(bot.guilds))
+    Gauge('cpo_gateway_latency_seconds', "Heartbeat latency to the gateway.",
+          fn=lambda: bot.latency if bot.latency == bot.latency else 0.0)  # NaN before the first heartbeat
+    Gauge('cpo_shard_latency_seconds', "Heartbeat latency per shard.", ('shard',),
+          fn=lambda: {(str(shard_id),): latency if latency == latency else 0.0 for shard_id, latency in bot.latencies})
+    Gauge('cpo_shard_up', "1 while a shard's gateway connection is open.", ('shard',),
+          fn=lambda: {(str(shard_id),): 0 if shard.is_closed() else 1 for shard_id, shard in bot.shards.items()})
+    Gauge('cpo_shard_guilds', "Guilds per shard.", ('shard',), fn=lambda: _shard_guilds(bot))
+    Gauge('cpo_scheduler_pending', "Deadlines waiting in each scheduler partition.", ('scheduler', 'shard'),
+          fn=lambda: {key: pending for key, (pending, _) in _scheduler_stats(bot).items()})
+    Gauge('cpo_scheduler_fired', "Deadlines fired by each scheduler partition since start.", ('scheduler', 'shard'),
+          fn=lambda: {key: fired for key, (_, fired) in _scheduler_stats(bot).items()})
+    Gauge('cpo_outbound_queue_depth', "Outgoing requests waiting for a rate limit token.", ('priority',),
+          fn=lambda: {(name,): depth for name, depth in bot.outbound.stats()['depth_by_priority'].items()})
+    Gauge('cpo_outbound_requests', "Outgoing requests by outcome since start.", ('outcome',),
+          fn=lambda: {(outcome,): bot.outbound.stats()[outcome] for outcome in ('sent', 'merged', 'failed', 'rate_limited')})
+    Gauge('cpo_outbound_wait_seconds_avg', "Average time outgoing requests waited in the queue.", ('priority',),
+          fn=lambda: {(name,): wait['avg_seconds'] for name, wait in bot.outbound.stats()['wait'].items()})
+    Gauge('cpo_components_auto_deferred', "Component interactions deferred because a handler ran over budget.",
+          fn=lambda: bot.components.auto_deferred)
+    Gauge('cpo_startup_phase_seconds', "Time each startup phase took; first_ready is from bot creation to the first READY.", ('phase',),
+          fn=lambda: {(phase,): seconds for phase, seconds in bot.startup_timings.items()})
+    Gauge('cpo_member_loader', "Guilds chunked and members fetched on demand.", ('field',),
+          fn=lambda: {(field,): value for field, value in bot.member_loader.stats().items()})
+    Gauge('cpo_permissions', "Managers held in memory by the permission service.", ('field',),
+          fn=lambda: {(field,): value for field, value in bot.permissions.stats().items()})
+    Gauge('cpo_leases', "Session leases held, taken over from other workers and lost to them.", ('field',),
+          fn=lambda: {(field,): value for field, value in bot.leases.stats().items()})
+    Gauge('cpo_role_index', "Role membership index size and activity.", ('field',),
+          fn=lambda: {(field,): value for field, value in bot.role_index.stats().items()})
+    Gauge('cpo_db_cache', "Database cache size, hits and misses.", ('cache', 'field'),
+          fn=lambda: {(cache, field): value for cache, stats in bot.db.cache_stats().items() for field, value in stats.items()})
+
+
+def _shard_guilds(bot):
+    counts = {}
+    for guild in bot.guilds:
+        counts[(str(guild.shard_id),)] = counts.get((str(guild.shard_id),), 0) + 1
+    return counts
+
+
+def _scheduler_stats(bot):
+    # Every cog with a scheduler that reports per-shard stats, e.g. {('checkin', '0'): (pending, fired)}
+    stats = {}
+    for cog in bot.cogs.values():
+        scheduler = getattr(cog, 'scheduler', None)
+        if callable(getattr(scheduler, 'stats', None)):
+            for shard_id, values in scheduler.stats().items():
+                stats[(scheduler.name, str(shard_id))] = values
+    return stats
+
+
+class MetricsServer:
+    """Serves REGISTRY at http://host:port/metrics. Binds to localhost by default."""
+
+    def __init__(self, host='127.0.0.1', port=9108, registry=REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.runner = None
+
+    async def start(self):
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8',
+                                headers={'X-Content-Type-Options': 'nosniff'})
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,207 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Schema migrations, applied in order. Each entry is (version, description, function).
+# A migration runs in its own transaction together with its schema_version row, so a
+# database is never left half-upgraded. Never edit a migration that has shipped, add a new one.
+
+
+def _initial_schema(conn):
+    # The tables as they existed before versioning. IF NOT EXISTS lets this run
+    # against databases created by the old create_tables.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS study_groups (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        creator_id INTEGER NOT NULL,
+        max_size INTEGER NOT NULL,
+        end_time REAL NOT NULL,
+        guild_id INTEGER NOT NULL,
+        admin_role_id INTEGER,
+        session_role_id INTEGER,
+        voice_channel_id INTEGER
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS group_members (
+        group_id INTEGER,
+        user_id INTEGER,
+        FOREIGN KEY (group_id) REFERENCES study_groups (id),
+        PRIMARY KEY (group_id, user_id)
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS pomodoro_sessions (
+        id INTEGER PRIMARY KEY,
+        group_id INTEGER,
+        start_time REAL,
+        end_time REAL,
+        focus_duration INTEGER,
+        short_break_duration INTEGER,
+        long_break_duration INTEGER,
+        FOREIGN KEY (group_id) REFERENCES study_groups (id)
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS managers (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        guild_id INTEGER,
+        permission_level INTEGER NOT NULL
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS voice_channel_logs (
+        id INTEGER PRIMARY KEY,
+        group_id INTEGER,
+        channel_id INTEGER,
+        creator_id INTEGER,
+        create_time TIMESTAMP,
+        FOREIGN KEY (group_id) REFERENCES study_groups (id)
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS guild_settings (
+        guild_id INTEGER PRIMARY KEY,
+        vc_cleanup_time INTEGER DEFAULT 600,
+        vc_category_id INTEGER
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        completed BOOLEAN NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def _lookup_indexes(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_study_groups_guild_name ON study_groups (guild_id, name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_user ON tasks (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_vc_logs_group_time ON voice_channel_logs (group_id, create_time)')
+
+
+def _unique_managers(conn):
+    # add_manager relies on INSERT OR REPLACE, which needs a unique key to replace on.
+    # Bot developers are stored with a NULL guild_id, and NULLs never collide in a
+    # UNIQUE index, so the key is built on IFNULL(guild_id, 0).
+    removed = conn.execute('''
+    DELETE FROM managers
+    WHERE id NOT IN (SELECT MAX(id) FROM managers GROUP BY user_id, IFNULL(guild_id, 0))
+    ''').rowcount
+    if removed:
+        logger.info("Removed %s duplicate manager row(s)", removed)
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_managers_user_guild ON managers (user_id, IFNULL(guild_id, 0))')
+
+
+def _pomodoro_state(conn):
+    # Enough state to resume a running session after a restart. Times are wall-clock
+    # (time.time()) so they survive the process; end_time stays NULL while active.
+    conn.execute('ALTER TABLE pomodoro_sessions ADD COLUMN guild_id INTEGER')
+    conn.execute("ALTER TABLE pomodoro_sessions ADD COLUMN stage TEXT NOT NULL DEFAULT 'focus'")
+    conn.execute('ALTER TABLE pomodoro_sessions ADD COLUMN cycles INTEGER NOT NULL DEFAULT 0')
+    conn.execute('ALTER TABLE pomodoro_sessions ADD COLUMN stage_deadline REAL')
+    conn.execute('ALTER TABLE pomodoro_sessions ADD COLUMN paused_remaining REAL')
+    # Rows written before this version carry no resumable state
+    conn.execute('UPDATE pomodoro_sessions SET end_time = COALESCE(start_time, 0) WHERE end_time IS NULL')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_pomodoro_active_group ON pomodoro_sessions (group_id) WHERE end_time IS NULL')
+
+
+def _command_sync(conn):
+    # Hash of the command tree last synced to Discord, per application and scope
+    # ('<application_id>:global' or '<application_id>:guild:<id>'), so unchanged trees skip the sync
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS command_sync (
+        scope TEXT PRIMARY KEY,
+        hash TEXT NOT NULL,
+        synced_at REAL
+    )
+    ''')
+
+
+def _leases(conn):
+    # Each Pomodoro or check-in timer is run by one worker process at a time. The worker holds
+    # a lease on it ('pomodoro:<group_id>', 'checkin:<session_id>') and keeps pushing
+    # expires_at (wall-clock) forward; once that lapses any worker may claim it.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS leases (
+        resource TEXT PRIMARY KEY,
+        guild_id INTEGER,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leases_owner ON leases (owner)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leases_expires_at ON leases (expires_at)')
+    # Check-in sessions, so another worker can pick one up. next_reminder is wall-clock.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS checkin_sessions (
+        session_id TEXT PRIMARY KEY,
+        guild_id INTEGER,
+        channel_id INTEGER NOT NULL,
+        creator_id INTEGER NOT NULL,
+        duration INTEGER NOT NULL,
+        start_time REAL NOT NULL,
+        edit_in_place INTEGER NOT NULL DEFAULT 0,
+        reminder_count INTEGER NOT NULL DEFAULT 0,
+        next_reminder REAL,
+        last_message_id INTEGER
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS checkin_members (
+        session_id TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        absences INTEGER NOT NULL DEFAULT 0,
+        present INTEGER NOT NULL DEFAULT 0,
+        exited INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (session_id, user_id)
+    )
+    ''')
+
+
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "indexes for hot lookups", _lookup_indexes),
+    (3, "unique (user_id, guild_id) on managers", _unique_managers),
+    (4, "resumable pomodoro session state", _pomodoro_state),
+    (5, "command tree sync hashes", _command_sync),
+    (6, "timer leases and persisted check-in sessions", _leases),
+]
+
+
+def current_version(conn):
+    conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+    conn.commit()
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def migrate(conn):
+    version = current_version(conn)
+    for target, description, upgrade in MIGRATIONS:
+        if target <= version:
+            continue
+        logger.info("Applying migration %s: %s", target, description)
+        try:
+            conn.execute('BEGIN')
+            upgrade(conn)
+            conn.execute('INSERT INTO schema_version (version) VALUES (?)', (target,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error("Migration %s failed, database left at version %s", target, version)
+            raise
+        version = target
+    return version
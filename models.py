@@ -0,0 +1,103 @@
+from dataclasses import dataclass, fields
+
+# Typed rows returned by Database. They are slotted, so each row is a compact
+# object with plain attribute access instead of a dict-like sqlite3.Row.
+# A model's fields follow its table's column order; queries select columns via
+# `column_list` so rows can be built positionally by `row_factory`.
+
+
+@dataclass(slots=True)
+class StudyGroup:
+    id: int
+    name: str
+    creator_id: int
+    max_size: int
+    end_time: float
+    guild_id: int
+    admin_role_id: int = None
+    session_role_id: int = None
+    voice_channel_id: int = None
+
+
+@dataclass(slots=True)
+class GroupMember:
+    group_id: int
+    user_id: int
+
+
+@dataclass(slots=True)
+class Task:
+    id: int
+    user_id: int
+    description: str
+    completed: bool
+    created_at: str = None
+
+
+@dataclass(slots=True)
+class Manager:
+    id: int
+    user_id: int
+    guild_id: int
+    permission_level: int
+
+
+@dataclass(slots=True)
+class GuildSettings:
+    guild_id: int
+    vc_cleanup_time: int = 600
+    vc_category_id: int = None
+
+
+@dataclass(slots=True)
+class PomodoroRecord:
+    id: int
+    group_id: int
+    start_time: float
+    end_time: float
+    focus_duration: int
+    short_break_duration: int
+    long_break_duration: int
+    guild_id: int
+    stage: str
+    cycles: int
+    stage_deadline: float
+    paused_remaining: float = None
+
+
+@dataclass(slots=True)
+class CheckinRecord:
+    session_id: str
+    guild_id: int
+    channel_id: int
+    creator_id: int
+    duration: int
+    start_time: float
+    edit_in_place: bool
+    reminder_count: int
+    next_reminder: float
+    last_message_id: int = None
+
+
+@dataclass(slots=True)
+class CheckinMember:
+    session_id: str
+    user_id: int
+    absences: int
+    present: bool
+    exited: bool
+
+
+def row_factory(model):
+    # sqlite3 calls this per row with a plain tuple, so building the model is one call
+    return lambda cursor, row: model(*row)
+
+
+def column_list(model, table=None):
+    prefix = f"{table}." if table else ""
+    return ", ".join(prefix + field.name for field in fields(model))
+
+
+def scalar(cursor, row):
+    # Row factory for single-column queries
+    return row[0]
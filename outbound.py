@@ -0,0 +1,299 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+import discord
+
+from storage import WaitStats
+
+logger = logging.getLogger(__name__)
+
+# Priorities, lowest value goes first
+INTERACTION = 0  # Replies to, and messages caused by, a user's command or click
+REMINDER = 1  # Scheduled check-in reminders and Pomodoro notifications
+DM = 2  # Direct messages, nobody is waiting on them in a channel
+PRIORITY_NAMES = {INTERACTION: 'interaction', REMINDER: 'reminder', DM: 'dm'}
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        self.refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class OutboundJob:
+    __slots__ = ('priority', 'seq', 'bucket_key', 'merge_key', 'call', 'kwargs', 'future', 'queued_at')
+
+    def __init__(self, priority, seq, bucket_key, merge_key, call, kwargs, future, queued_at):
+        self.priority = priority
+        self.seq = seq
+        self.bucket_key = bucket_key
+        self.merge_key = merge_key
+        self.call = call
+        self.kwargs = kwargs
+        self.future = future
+        self.queued_at = queued_at
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundDispatcher:
+    """Single exit point for bot-initiated messages, edits and DMs.
+
+    Requests wait in one priority queue and leave it only when both the global token
+    bucket and the bucket of their channel (or DM recipient) have a token, so bursts
+    are spread out here instead of turning into 429s that stall the sender. An edit
+    queued for a message that already has an edit waiting is merged into it, and both
+    callers get the result of the one request.
+
+    Interaction responses (`respond`) are not rate limited by Discord the same way and
+    must go out within 3 seconds, so they skip the buckets and only take priority.
+
+    Every method returns a future with the API call's result. Awaiting it is optional;
+    failures are logged either way.
+    """
+
+    def __init__(self, global_rate=40.0, global_burst=40, channel_rate=1.0, channel_burst=5, log_interval=60.0):
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.log_interval = log_interval
+        self.global_bucket = TokenBucket(global_rate, global_burst, time.monotonic())
+        self.buckets = {}  # ('channel', id) or ('dm', user id) -> TokenBucket
+        # Rate limited jobs wait in `queue` until their channel's bucket runs dry. From then on
+        # the bucket's jobs are parked in `parked[key]` (a heap per bucket) with one entry in
+        # `timers` for when the bucket has a token again, so a wakeup only touches jobs that can
+        # go now. At that time the bucket's best job is released into `queue`, and each job that
+        # starts from a parked bucket releases the next one.
+        self.queue = []
+        self.parked = {}  # bucket key -> heap of OutboundJob
+        self.timers = []  # (monotonic time the bucket has a token again, seq, bucket key)
+        self.timed = set()  # bucket keys with an entry in timers
+        self.direct = []  # Interaction responses, which skip the buckets
+        self.merges = {}  # merge key -> queued OutboundJob
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.running = set()
+        self.wait_stats = {priority: WaitStats() for priority in PRIORITY_NAMES}
+        self.sent = 0
+        self.merged = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(), name="outbound-dispatcher")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for job in self._queued():
+            job.future.cancel()
+        self.queue.clear()
+        self.parked.clear()
+        self.timers.clear()
+        self.direct.clear()
+        self.merges.clear()
+        if self.running:
+            await asyncio.gather(*self.running, return_exceptions=True)
+
+    def send(self, target, *, priority=REMINDER, **kwargs):
+        # Users and members are DMs, anything else is a channel
+        kind = 'dm' if isinstance(target, discord.abc.User) else 'channel'
+        return self.submit(target.send, kwargs, priority, bucket_key=(kind, target.id))
+
+    def edit(self, message, *, priority=REMINDER, **kwargs):
+        return self.submit(message.edit, kwargs, priority, bucket_key=('channel', message.channel.id),
+                           merge_key=('edit', message.id))
+
+    def respond(self, interaction, *, priority=INTERACTION, **kwargs):
+        return self.submit(interaction.response.send_message, kwargs, priority)
+
+    def submit(self, call, kwargs, priority, bucket_key=None, merge_key=None):
+        if merge_key is not None:
+            job = self.merges.get(merge_key)
+            if job is not None:
+                # Later fields win, and the merged edit goes out at the more urgent priority
+                job.kwargs.update(kwargs)
+                if priority < job.priority:
+                    job.priority = priority
+                    heapq.heapify(self.queue)
+                    if job.bucket_key in self.parked:
+                        heapq.heapify(self.parked[job.bucket_key])
+                self.merged += 1
+                return job.future
+        job = OutboundJob(priority, next(self.counter), bucket_key, merge_key, call, kwargs,
+                          asyncio.get_running_loop().create_future(), time.monotonic())
+        if merge_key is not None:
+            self.merges[merge_key] = job
+        if bucket_key is None:
+            heapq.heappush(self.direct, job)
+        elif bucket_key in self.parked:
+            heapq.heappush(self.parked[bucket_key], job)  # Queues up behind the bucket's earlier jobs
+        else:
+            heapq.heappush(self.queue, job)
+        self.wakeup.set()
+        return job.future
+
+    def _queued(self):
+        yield from self.direct
+        yield from self.queue
+        for jobs in self.parked.values():
+            yield from jobs
+
+    def depth(self):
+        return len(self.direct) + len(self.queue) + sum(map(len, self.parked.values()))
+
+    def stats(self):
+        depth = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+        for job in self._queued():
+            depth[PRIORITY_NAMES[job.priority]] += 1
+        return {
+            'depth': sum(depth.values()),
+            'depth_by_priority': depth,
+            'in_flight': len(self.running),
+            'sent': self.sent,
+            'merged': self.merged,
+            'failed': self.failed,
+            'rate_limited': self.rate_limited,
+            'wait': {name: self.wait_stats[priority].snapshot() for priority, name in PRIORITY_NAMES.items()},
+        }
+
+    async def run(self):
+        next_log = time.monotonic() + self.log_interval
+        logged_sent = 0
+        while True:
+            self.wakeup.clear()
+            now = time.monotonic()
+            delay = self._dispatch_ready(now)
+            if now >= next_log:
+                next_log = now + self.log_interval
+                if self.sent != logged_sent or self.depth():
+                    logged_sent = self.sent
+                    self._log_stats()
+                self._prune_buckets(now)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), min(delay, self.log_interval) if delay is not None else self.log_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch_ready(self, now):
+        # Start every job its buckets allow, in priority order. Returns how long until the
+        # next held-back job could go, or None if nothing is waiting.
+        while self.direct:
+            self._start(heapq.heappop(self.direct), now)
+        while self.timers and self.timers[0][0] <= now:
+            _, _, key = heapq.heappop(self.timers)
+            self._release(key)
+
+        delay = None
+        while self.queue:
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait > 0:
+                # Nothing rate limited can go until the global bucket refills
+                delay = global_wait
+                break
+            job = heapq.heappop(self.queue)
+            key = job.bucket_key
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.channel_rate, self.channel_burst, now)
+            wait = bucket.wait_time(now)
+            if wait > 0:
+                self._park(job, now + wait)
+                continue
+            self.global_bucket.take()
+            bucket.take()
+            self._start(job, now)
+            if key in self.parked and not key in self.timed:
+                self._release(key)  # The bucket still has tokens, let its next job compete
+
+        if self.timers:
+            timer_wait = self.timers[0][0] - now
+            delay = timer_wait if delay is None else min(delay, timer_wait)
+        return delay
+
+    def _park(self, job, ready_at):
+        key = job.bucket_key
+        jobs = self.parked.get(key)
+        if jobs is None:
+            jobs = self.parked[key] = []
+        heapq.heappush(jobs, job)
+        if not key in self.timed:
+            self.timed.add(key)
+            heapq.heappush(self.timers, (ready_at, next(self.counter), key))
+
+    def _release(self, key):
+        # Move the bucket's best parked job back into the queue
+        self.timed.discard(key)
+        jobs = self.parked.get(key)
+        if not jobs:
+            self.parked.pop(key, None)
+            return
+        heapq.heappush(self.queue, heapq.heappop(jobs))
+        if not jobs:
+            del self.parked[key]
+
+    def _start(self, job, now):
+        if job.merge_key is not None:
+            self.merges.pop(job.merge_key, None)
+        self.wait_stats[job.priority].record(now - job.queued_at)
+        task = asyncio.create_task(self._call(job))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    async def _call(self, job):
+        if job.future.done():
+            return  # The caller gave up waiting
+        try:
+            result = await job.call(**job.kwargs)
+        except Exception as e:
+            self.failed += 1
+            if isinstance(e, discord.HTTPException) and e.status == 429:
+                self.rate_limited += 1
+            logger.error("Outbound %s request %s failed: %s", PRIORITY_NAMES[job.priority], job.call.__qualname__, e)
+            if not job.future.done():
+                job.future.set_exception(e)
+                job.future.exception()  # Logged above, so don't warn if the caller never awaits it
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _prune_buckets(self, now):
+        # A full bucket holds no state worth keeping
+        for key, bucket in list(self.buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self.buckets[key]
+
+    def _log_stats(self):
+        stats = self.stats()
+        waits = ", ".join(f"{name} avg {wait['avg_seconds']:.3f}s max {wait['max_seconds']:.3f}s"
+                          for name, wait in stats['wait'].items() if wait['count'])
+        logger.info("Outbound: depth %s %s, sent %s, merged %s, failed %s (%s rate limited); %s",
+                    stats['depth'], stats['depth_by_priority'], stats['sent'], stats['merged'], stats['failed'],
+                    stats['rate_limited'], waits)
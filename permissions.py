@@ -0,0 +1,113 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Permission checks run on every privileged command, so they are answered from memory.
+# The whole managers table is loaded once at startup into per-guild dicts, and every change
+# made through PermissionService is written to the database first and then applied here.
+# Changes made by other processes sharing the database show up at the next refresh.
+
+
+class PermissionLevel:
+    BOT_DEVELOPER = 3
+    GUILD_MANAGER = 2
+    GROUP_CREATOR = 1
+    REGULAR_USER = 0
+
+
+class PermissionService:
+    """In-memory view of the managers table with write-through updates.
+
+    Rows with a NULL guild_id (bot developers) apply in every guild. A user's level in a
+    guild is the highest of their row for that guild, their guild-less row and, for the
+    configured developer ID, BOT_DEVELOPER.
+    """
+
+    def __init__(self, db, developer_id=None, refresh_interval=None):
+        self.db = db
+        self.developer_id = developer_id
+        self.refresh_interval = refresh_interval
+        self.guilds = {}  # guild_id -> {user_id: permission level}
+        self.global_levels = {}  # user_id -> permission level, from rows without a guild
+        # Bumped by every write, so a reload that read the table before the write doesn't undo it
+        self.epoch = 0
+        self.task = None
+        self.loads = 0
+
+    async def load(self):
+        epoch = self.epoch
+        rows = await self.db.get_all_manager_rows()
+        if epoch != self.epoch:
+            logger.debug("Managers changed while loading, keeping the current permissions")
+            return
+        guilds, global_levels = {}, {}
+        for row in rows:
+            levels = global_levels if row.guild_id is None else guilds.setdefault(row.guild_id, {})
+            levels[row.user_id] = max(levels.get(row.user_id, PermissionLevel.REGULAR_USER), row.permission_level)
+        self.guilds, self.global_levels = guilds, global_levels
+        self.loads += 1
+        logger.info("Loaded %s manager(s) across %s guild(s)", len(rows), len(guilds))
+
+    def level(self, guild_id, user_id):
+        if user_id == self.developer_id:
+            return PermissionLevel.BOT_DEVELOPER
+        level = self.global_levels.get(user_id, PermissionLevel.REGULAR_USER)
+        levels = self.guilds.get(guild_id)
+        if levels:
+            level = max(level, levels.get(user_id, PermissionLevel.REGULAR_USER))
+        return level
+
+    def is_manager(self, guild_id, user_id):
+        return self.level(guild_id, user_id) >= PermissionLevel.GUILD_MANAGER
+
+    async def add_manager(self, user_id, guild_id, permission_level):
+        await self.db.add_manager(user_id, guild_id, permission_level)
+        self.epoch += 1
+        levels = self.global_levels if guild_id is None else self.guilds.setdefault(guild_id, {})
+        levels[user_id] = permission_level
+
+    async def remove_manager(self, user_id, guild_id):
+        await self.db.remove_manager(user_id, guild_id)
+        self.epoch += 1
+        # Like the DELETE, which never matches a NULL guild_id, this leaves bot developers alone
+        levels = self.guilds.get(guild_id)
+        if levels is not None:
+            levels.pop(user_id, None)
+            if not levels:
+                del self.guilds[guild_id]
+
+    async def set_permission_level(self, user_id, guild_id, permission_level):
+        # Level 0 removes the user's row for the guild; bot developers are stored without a guild
+        if permission_level == PermissionLevel.REGULAR_USER:
+            await self.remove_manager(user_id, guild_id)
+        elif permission_level == PermissionLevel.BOT_DEVELOPER:
+            await self.add_manager(user_id, None, permission_level)
+        else:
+            await self.add_manager(user_id, guild_id, permission_level)
+
+    def start(self):
+        if self.refresh_interval and self.task is None:
+            self.task = asyncio.create_task(self.refresh(), name="permissions-refresh")
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def refresh(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error("Reloading managers failed: %s", e)
+
+    def stats(self):
+        return {'guilds': len(self.guilds), 'managers': sum(len(levels) for levels in self.guilds.values()),
+                'developers': len(self.global_levels), 'loads': self.loads}
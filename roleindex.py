@@ -0,0 +1,138 @@
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# discord.py's Role.members filters the whole guild member cache on every access, which is
+# O(guild size) per role mention. RoleIndex keeps role ID -> member IDs per guild instead,
+# built from the member cache the first time a guild is asked for and kept up to date
+# from member events after that. Expanding a role then costs O(role size).
+
+
+class RoleIndex:
+    """Role membership index with a cap on the total number of (role, member) entries.
+
+    Guilds are evicted least recently used first when the cap is reached, and rebuilt on
+    their next lookup. A guild too large to fit on its own is never indexed and falls
+    back to `role.members`.
+    """
+
+    def __init__(self, max_entries=1_000_000):
+        self.max_entries = max_entries
+        self.guilds = OrderedDict()  # guild_id -> {role_id: set of member ids}
+        self.sizes = {}  # guild_id -> entries in that guild's index
+        self.entries = 0
+        self.oversized = set()  # guilds that would not fit under max_entries
+        self.builds = 0
+        self.evictions = 0
+
+    def members(self, guild, role):
+        """Members with `role`, from the index. Builds the guild's index on first use."""
+        if role.is_default():
+            return list(guild.members)
+        roles = self.guild_roles(guild)
+        if roles is None:
+            return role.members
+        get_member = guild.get_member
+        return [member for member in map(get_member, roles.get(role.id, ())) if member is not None]
+
+    def guild_roles(self, guild):
+        roles = self.guilds.get(guild.id)
+        if roles is not None:
+            self.guilds.move_to_end(guild.id)
+            return roles
+        # An unchunked cache would give an incomplete index that events never fill in
+        if guild.id in self.oversized or not guild.chunked:
+            return None
+        return self.build(guild)
+
+    def build(self, guild):
+        roles = {}
+        size = 0
+        for member in guild.members:
+            for role in member.roles:
+                if role.is_default():
+                    continue
+                roles.setdefault(role.id, set()).add(member.id)
+                size += 1
+        if size > self.max_entries:
+            logger.warning("Guild %s has %s role memberships, over the index cap of %s; not indexing it",
+                           guild.id, size, self.max_entries)
+            self.oversized.add(guild.id)
+            return None
+        while self.guilds and self.entries + size > self.max_entries:
+            self.evict(next(iter(self.guilds)))
+            self.evictions += 1
+        self.guilds[guild.id] = roles
+        self.sizes[guild.id] = size
+        self.entries += size
+        self.builds += 1
+        logger.debug("Indexed %s role memberships for guild %s", size, guild.id)
+        return roles
+
+    def evict(self, guild_id):
+        if self.guilds.pop(guild_id, None) is not None:
+            self.entries -= self.sizes.pop(guild_id)
+        self.oversized.discard(guild_id)
+
+    def add(self, guild_id, role_ids, member_id):
+        roles = self.guilds.get(guild_id)
+        if roles is None:
+            return  # Not built yet; the build will see the member
+        for role_id in role_ids:
+            members = roles.setdefault(role_id, set())
+            if member_id not in members:
+                members.add(member_id)
+                self.sizes[guild_id] += 1
+                self.entries += 1
+        if self.entries > self.max_entries:
+            self.evict(guild_id)
+            self.evictions += 1
+
+    def remove(self, guild_id, role_ids, member_id):
+        roles = self.guilds.get(guild_id)
+        if roles is None:
+            return
+        for role_id in role_ids:
+            members = roles.get(role_id)
+            if members and member_id in members:
+                members.discard(member_id)
+                self.sizes[guild_id] -= 1
+                self.entries -= 1
+                if not members:
+                    del roles[role_id]
+
+    def stats(self):
+        return {'guilds': len(self.guilds), 'entries': self.entries, 'max_entries': self.max_entries,
+                'oversized': len(self.oversized), 'builds': self.builds, 'evictions': self.evictions}
+
+    ## Listeners (registered by the bot)
+
+    async def on_member_join(self, member):
+        self.add(member.guild.id, [role.id for role in member.roles if not role.is_default()], member.id)
+
+    async def on_member_remove(self, member):
+        self.remove(member.guild.id, [role.id for role in member.roles if not role.is_default()], member.id)
+
+    async def on_member_update(self, before, after):
+        if before.roles == after.roles:
+            return
+        old = {role.id for role in before.roles}
+        new = {role.id for role in after.roles}
+        self.remove(after.guild.id, old - new, after.id)
+        self.add(after.guild.id, new - old, after.id)
+
+    async def on_guild_role_delete(self, role):
+        roles = self.guilds.get(role.guild.id)
+        if roles is not None and role.id in roles:
+            removed = len(roles.pop(role.id))
+            self.sizes[role.guild.id] -= removed
+            self.entries -= removed
+
+    async def on_guild_remove(self, guild):
+        self.evict(guild.id)
+
+    def listeners(self):
+        return [('on_member_join', self.on_member_join), ('on_member_remove', self.on_member_remove),
+                ('on_member_update', self.on_member_update), ('on_guild_role_delete', self.on_guild_role_delete),
+                ('on_guild_remove', self.on_guild_remove)]
@@ -0,0 +1,184 @@
+import asyncio
+import heapq
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """Runs callbacks at absolute deadlines on the event loop clock (`loop.time()`).
+
+    Pending deadlines live in one heap and a single task sleeps until the earliest
+    one, so idle timers cost nothing per second no matter how many are scheduled.
+    Each key has at most one pending deadline: scheduling a key again replaces it,
+    and cancelling only forgets the key (stale heap entries are skipped on pop and
+    compacted away once they make up most of the heap).
+
+    Callbacks are coroutine functions called with no arguments. Each runs in its own
+    task so a slow callback never delays the ones due after it.
+    """
+
+    def __init__(self, name='scheduler'):
+        self.name = name
+        self.heap = []  # (deadline, seq, key)
+        self.pending = {}  # key -> (seq, callback)
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.timer = None
+        self.timer_deadline = None
+        self.task = None
+        self.running = set()
+        self.fired = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def now(self):
+        return asyncio.get_running_loop().time()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(), name=f"{self.name}-scheduler")
+            logger.debug("Scheduler %s started", self.name)
+
+    async def stop(self):
+        if self.timer:
+            self.timer.cancel()
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for task in list(self.running):
+            task.cancel()
+        logger.debug("Scheduler %s stopped", self.name)
+
+    def schedule(self, key, deadline, callback):
+        seq = next(self.counter)
+        self.pending[key] = (seq, callback)
+        heapq.heappush(self.heap, (deadline, seq, key))
+        self._maybe_compact()
+        if self.timer_deadline is None or deadline < self.timer_deadline:
+            self._arm(deadline)
+
+    def cancel(self, key):
+        if self.pending.pop(key, None) is None:
+            return False
+        self._maybe_compact()
+        return True
+
+    def _maybe_compact(self):
+        if len(self.heap) > 64 and len(self.heap) > 2 * len(self.pending):
+            self.heap = [entry for entry in self.heap if self._is_live(entry)]
+            heapq.heapify(self.heap)
+
+    def _is_live(self, entry):
+        _, seq, key = entry
+        current = self.pending.get(key)
+        return current is not None and current[0] == seq
+
+    def _arm(self, deadline):
+        if self.timer:
+            self.timer.cancel()
+        self.timer_deadline = deadline
+        self.timer = asyncio.get_running_loop().call_at(deadline, self.wakeup.set)
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            self.timer = self.timer_deadline = None
+            # call_at may fire up to one clock tick early
+            now = self.now() + 0.001
+            while self.heap and self.heap[0][0] <= now:
+                entry = heapq.heappop(self.heap)
+                if not self._is_live(entry):
+                    continue
+                _, callback = self.pending.pop(entry[2])
+                self.fired += 1
+                task = asyncio.create_task(self._call(entry[2], callback))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+            while self.heap and not self._is_live(self.heap[0]):
+                heapq.heappop(self.heap)
+            if self.heap:
+                self._arm(self.heap[0][0])
+
+    async def _call(self, key, callback):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error("Scheduler %s callback for %s failed: %s", self.name, key, e, exc_info=True)
+
+
+def shard_id_for(guild_id, shard_count):
+    # Discord's routing: a guild lives on shard (guild_id >> 22) % shard_count
+    return (guild_id >> 22) % shard_count if guild_id and shard_count else 0
+
+
+class ShardedScheduler:
+    """A DeadlineScheduler per shard, each owning the deadlines of its shard's guilds.
+
+    Same interface as DeadlineScheduler, plus a `guild_id` on schedule() and cancel().
+    `shard_count` is a callable so partitions follow the bot's shard count once the
+    shards have launched; a key scheduled before that is still found by cancel() and
+    moved by the next schedule(), at the cost of checking every partition.
+    """
+
+    def __init__(self, name='scheduler', shard_count=lambda: 1):
+        self.name = name
+        self.shard_count = shard_count
+        self.partitions = {}  # shard_id -> DeadlineScheduler
+        self.started = False
+
+    def __len__(self):
+        return sum(len(partition) for partition in self.partitions.values())
+
+    @property
+    def fired(self):
+        return sum(partition.fired for partition in self.partitions.values())
+
+    def now(self):
+        return asyncio.get_running_loop().time()
+
+    def partition(self, guild_id):
+        return self.shard_partition(shard_id_for(guild_id, self.shard_count()))
+
+    def shard_partition(self, shard_id):
+        partition = self.partitions.get(shard_id)
+        if partition is None:
+            partition = self.partitions[shard_id] = DeadlineScheduler(f"{self.name}-shard{shard_id}")
+            if self.started:
+                partition.start()
+        return partition
+
+    def start(self):
+        self.started = True
+        for shard_id in range(self.shard_count()):
+            self.shard_partition(shard_id)
+        for partition in self.partitions.values():
+            partition.start()
+
+    async def stop(self):
+        self.started = False
+        await asyncio.gather(*(partition.stop() for partition in self.partitions.values()))
+
+    def schedule(self, key, deadline, callback, guild_id=None):
+        partition = self.partition(guild_id)
+        if len(self.partitions) > 1:
+            for other in self.partitions.values():
+                if other is not partition and key in other.pending:
+                    other.cancel(key)
+        partition.schedule(key, deadline, callback)
+
+    def cancel(self, key, guild_id=None):
+        if guild_id is not None and self.partition(guild_id).cancel(key):
+            return True
+        return any(partition.cancel(key) for partition in self.partitions.values())
+
+    def stats(self):
+        # shard_id -> (pending deadlines, fired so far)
+        return {shard_id: (len(partition), partition.fired) for shard_id, partition in self.partitions.items()}
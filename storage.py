@@ -0,0 +1,304 @@
+import asyncio
+import contextvars
+import logging
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Result of the last statement of a write job
+WriteResult = namedtuple('WriteResult', ['lastrowid', 'rowcount'])
+
+_STOP = object()
+
+SERIAL = 'serial'
+WAL = 'wal'
+STORAGE_MODES = (SERIAL, WAL)
+
+# When set to a list, the queue wait of every job submitted from this context is appended to it
+wait_sink = contextvars.ContextVar('wait_sink', default=None)
+
+
+def _resolve(future, result, error):
+    # Runs on the event loop thread, never touch the future from the worker
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def fetch(conn, sql, params, one, factory):
+    cursor = conn.cursor()
+    cursor.row_factory = factory
+    cursor.execute(sql, params)
+    return cursor.fetchone() if one else cursor.fetchall()
+
+
+def apply_statements(conn, statements):
+    cursor = None
+    for sql, params in statements:
+        cursor = conn.execute(sql, params)
+    return WriteResult(cursor.lastrowid, cursor.rowcount) if cursor else WriteResult(None, 0)
+
+
+def run_statements(conn, statements):
+    result = apply_statements(conn, statements)
+    conn.commit()
+    return result
+
+
+class WaitStats:
+    """Time jobs spent queued before a connection picked them up (the old `Database.lock` wait)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, wait):
+        with self._lock:
+            self.count += 1
+            self.total += wait
+            if wait > self.max:
+                self.max = wait
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'total_seconds': self.total,
+                'avg_seconds': self.total / self.count if self.count else 0.0,
+                'max_seconds': self.max,
+            }
+
+
+class SQLiteWorker(threading.Thread):
+    """A thread that owns one sqlite3 connection and runs jobs from its queue in order.
+
+    Coroutines never block on SQLite: `submit` puts the job on a queue and returns an
+    asyncio future that is resolved on the loop once a worker has run it. Several
+    workers may share one queue, which makes them a pool.
+    """
+
+    def __init__(self, db_name, name='sqlite-worker', jobs=None, wait_stats=None, read_only=False, wal=False):
+        super().__init__(name=name, daemon=True)
+        self.db_name = db_name
+        self.jobs = jobs if jobs is not None else queue.SimpleQueue()
+        self.wait_stats = wait_stats if wait_stats is not None else WaitStats()
+        self.read_only = read_only
+        self.wal = wal
+
+    def connect(self):
+        if self.read_only:
+            conn = sqlite3.connect(f"{pathlib.Path(self.db_name).resolve().as_uri()}?mode=ro", uri=True)
+        else:
+            conn = sqlite3.connect(self.db_name)
+            if self.wal:
+                mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+                logger.info("%s journal mode: %s", self.name, mode)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def run(self):
+        try:
+            conn = self.connect()
+        except Exception as e:
+            logger.error("%s failed to open %s: %s", self.name, self.db_name, e)
+            self.fail_pending(e)
+            return
+        try:
+            self.serve(conn)
+        finally:
+            conn.close()
+            logger.debug("%s stopped", self.name)
+
+    def serve(self, conn):
+        while True:
+            job = self.jobs.get()
+            if job is _STOP:
+                return
+            self.run_job(conn, job)
+
+    def run_job(self, conn, job):
+        fn, args, future, loop, queued_at, sink = job
+        wait = time.perf_counter() - queued_at
+        self.wait_stats.record(wait)
+        if sink is not None:
+            sink.append(wait)
+        try:
+            result = fn(conn, *args)
+        except BaseException as e:  # Handed back to the awaiting coroutine
+            loop.call_soon_threadsafe(_resolve, future, None, e)
+        else:
+            loop.call_soon_threadsafe(_resolve, future, result, None)
+
+    def fail_pending(self, error):
+        while True:
+            job = self.jobs.get()
+            if job is _STOP:
+                return
+            _, _, future, loop, _, _ = job
+            loop.call_soon_threadsafe(_resolve, future, None, error)
+
+    def submit(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.jobs.put((fn, args, future, loop, time.perf_counter(), wait_sink.get()))
+        return future
+
+    async def stop(self):
+        self.jobs.put(_STOP)
+        await asyncio.to_thread(self.join)
+
+
+class GroupCommitWriter(SQLiteWorker):
+    """Writer that commits writes arriving within `window` seconds of each other together.
+
+    Each write runs inside its own savepoint, so a failing statement only rolls back
+    that caller's work. Futures are resolved after the shared COMMIT returns, which
+    means a caller's write is durable once its await completes.
+    """
+
+    def __init__(self, db_name, window, max_batch, **kwargs):
+        super().__init__(db_name, **kwargs)
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.commits = 0
+        self.writes = 0
+
+    def serve(self, conn):
+        pending = None
+        while True:
+            job = pending if pending is not None else self.jobs.get()
+            pending = None
+            if job is _STOP:
+                return
+            if job[0] is not run_statements:
+                self.run_job(conn, job)
+                continue
+
+            batch = [job]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    job = self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP or job[0] is not run_statements:
+                    pending = job  # Runs right after this batch is committed
+                    break
+                batch.append(job)
+            self.commit_batch(conn, batch)
+
+    def commit_batch(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute('BEGIN')
+            for _, args, _, _, queued_at, sink in batch:
+                wait = time.perf_counter() - queued_at
+                self.wait_stats.record(wait)
+                if sink is not None:
+                    sink.append(wait)
+                conn.execute('SAVEPOINT batch_write')
+                try:
+                    outcomes.append((apply_statements(conn, *args), None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO batch_write')
+                    outcomes.append((None, e))
+                conn.execute('RELEASE batch_write')
+            conn.commit()
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            outcomes = [(None, e)] * len(batch)
+        self.commits += 1
+        self.writes += len(batch)
+        for (_, _, future, loop, _, _), (result, error) in zip(batch, outcomes):
+            loop.call_soon_threadsafe(_resolve, future, result, error)
+
+
+class StorageEngine:
+    """Async front for SQLite. All connection work happens on dedicated worker threads.
+
+    In `serial` mode one connection runs every query in order. In `wal` mode the
+    database is switched to write-ahead logging, the writer keeps its own connection
+    and reads are spread over a pool of read-only connections, so reads no longer
+    queue behind unrelated writes.
+
+    When `group_commit_ms` is set, writes submitted within that window (up to
+    `group_commit_max_batch` of them) share one transaction and one fsync.
+    """
+
+    def __init__(self, db_name, mode=SERIAL, read_pool_size=4, group_commit_ms=None, group_commit_max_batch=100):
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {mode}")
+        if mode == WAL and db_name == ':memory:':
+            logger.warning("WAL mode needs a database file, falling back to serial mode")
+            mode = SERIAL
+        self.db_name = db_name
+        self.mode = mode
+        if group_commit_ms is None:
+            self.writer = SQLiteWorker(db_name, name='sqlite-writer', wal=mode == WAL)
+        else:
+            self.writer = GroupCommitWriter(db_name, group_commit_ms / 1000, group_commit_max_batch,
+                                            name='sqlite-writer', wal=mode == WAL)
+        self.readers = []
+        self.read_jobs = None
+        self.read_wait_stats = self.writer.wait_stats
+        if mode == WAL:
+            self.read_jobs = queue.SimpleQueue()
+            self.read_wait_stats = WaitStats()
+            self.readers = [
+                SQLiteWorker(db_name, name=f'sqlite-reader-{i}', jobs=self.read_jobs,
+                             wait_stats=self.read_wait_stats, read_only=True)
+                for i in range(max(1, read_pool_size))
+            ]
+
+    async def start(self):
+        self.writer.start()
+        # Surface connection errors to the caller instead of the first query.
+        # The writer goes first so the file exists and is in WAL mode for the readers.
+        await self.writer.submit(lambda conn: None)
+        for reader in self.readers:
+            reader.start()
+        if self.readers:
+            await asyncio.gather(*(self.readers[0].submit(lambda conn: None) for _ in self.readers))
+        logger.info("Storage engine started for %s in %s mode with %s reader(s)", self.db_name, self.mode, len(self.readers))
+
+    def lock_wait_stats(self):
+        return {'write': self.writer.wait_stats.snapshot(), 'read': self.read_wait_stats.snapshot()}
+
+    def commit_stats(self):
+        # Only meaningful in group-commit mode; writes / commits is the batching factor
+        writer = self.writer
+        if not isinstance(writer, GroupCommitWriter):
+            return {}
+        return {'commits': writer.commits, 'writes': writer.writes}
+
+    def run(self, fn, *args):
+        # Run an arbitrary function against the connection, e.g. schema setup
+        return self.writer.submit(fn, *args)
+
+    def read(self, sql, params=(), one=False, factory=sqlite3.Row):
+        worker = self.readers[0] if self.readers else self.writer
+        # Readers share one queue, so submitting through any of them feeds the whole pool
+        return worker.submit(fetch, sql, params, one, factory)
+
+    def write(self, statements):
+        return self.writer.submit(run_statements, statements)
+
+    async def close(self):
+        for _ in self.readers:
+            self.read_jobs.put(_STOP)
+        for reader in self.readers:
+            await asyncio.to_thread(reader.join)
+        await self.writer.stop()
+        logger.info("Storage engine stopped for %s", self.db_name)
@@ -1,3 +1,4 @@
+import functools
 import re
 import discord
 from discord import app_commands
@@ -12,58 +13,129 @@ def parse_seconds_to_hms(seconds: int) -> str:
     hours, remainder = divmod(seconds, 3600)
     minutes, seconds = divmod(remainder, 60)
     result = f"{hours}h {minutes}m {seconds}s"
-    logger.debug(f"Parsed {seconds} seconds to {result}")
+    logger.debug("Parsed %s seconds to %s", seconds, result)
     return result
 
-def parse_duration(duration_str):
-    logger.debug(f"Attempting to parse duration: {duration_str}")
-    match = re.match(r'(\d+)\s*(s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?|d|days?)', duration_str, re.IGNORECASE)
-    if not match:
-        logger.warning(f"Failed to parse duration: {duration_str}")
+# "2d 14h 25m 30s", "1h30m", "45 minutes": one or more <number><unit> parts, matched in a single pass
+DURATION_PART = re.compile(r'\s*(\d+)\s*(d(?:ays?)?|h(?:rs?|ours?)?|m(?:ins?|inutes?)?|s(?:ecs?|econds?)?)(?![a-z])\s*,?', re.IGNORECASE)
+BARE_NUMBER = re.compile(r'\s*(\d+)\s*')
+UNIT_SECONDS = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+UNIT_NAMES = {'d': 'days', 'h': 'hours', 'm': 'minutes', 's': 'seconds'}
+MENTION = re.compile(r'<@([!&]?)(\d+)>')
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_duration(duration_str, bare_unit=None):
+    """Seconds in a compound duration such as '2d 14h 25m 30s', or None if it isn't one.
+
+    With `bare_unit` ('s', 'm', 'h' or 'd') a plain number is read in that unit.
+    Results are memoized, so repeated inputs like '25m' cost one dict lookup.
+    """
+    if not duration_str.strip():
         return None
-    value, unit = match.groups()
-    value = int(value)
-    unit = unit.lower()
-    if 's' in unit:
-        result = value
-    elif 'm' in unit:
-        result = value * 60
-    elif 'h' in unit:
-        result = value * 3600
-    elif 'd' in unit:
-        result = value * 86400
-    else:
-        result = None
-    logger.debug(f"Parsed duration '{duration_str}' to {result} seconds")
-    return result
+    if bare_unit:
+        match = BARE_NUMBER.fullmatch(duration_str)
+        if match:
+            return int(match.group(1)) * UNIT_SECONDS[bare_unit]
+    total = 0
+    position = 0
+    length = len(duration_str)
+    while position < length:
+        match = DURATION_PART.match(duration_str, position)
+        if not match:
+            logger.debug("Failed to parse duration: %s", duration_str)
+            return None
+        total += int(match.group(1)) * UNIT_SECONDS[match.group(2)[0].lower()]
+        position = match.end()
+    logger.debug("Parsed duration '%s' to %s seconds", duration_str, total)
+    return total
+
+
+@functools.lru_cache(maxsize=256)
+def parse_mention_ids(mentions):
+    # '<@1> <@!2> <@&3>' -> ((1, 2), (3,)), user IDs then role IDs, in order and without repeats
+    users, roles = {}, {}
+    for kind, snowflake in MENTION.findall(mentions):
+        (roles if kind == '&' else users)[int(snowflake)] = None
+    return tuple(users), tuple(roles)
+
+
+def parse_mentions(ctx, mentions, role_index=None):
+    """Members mentioned directly or through a role, deduplicated by ID in mention order.
+
+    Roles are expanded through `role_index` (a roleindex.RoleIndex) when given, which
+    avoids scanning the whole member cache per role.
+    """
+    guild = ctx.guild
+    user_ids, role_ids = parse_mention_ids(mentions)
+    members = {}
+    for user_id in user_ids:
+        member = guild.get_member(user_id)
+        if member:
+            members[member.id] = member
+        else:
+            logger.warning("Member not found for ID: %s", user_id)
+    for role_id in role_ids:
+        role = guild.get_role(role_id)
+        if role:
+            for member in (role_index.members(guild, role) if role_index else role.members):
+                members.setdefault(member.id, member)
+        else:
+            logger.warning("Role not found for ID: %s", role_id)
+    logger.debug("Parsed %s mentions into %s unique members", len(user_ids) + len(role_ids), len(members))
+    return list(members.values())
+
+
+class ArgumentError(app_commands.AppCommandError):
+    # Raised by transformers; the message is shown to the user as is
+    pass
+
+
+class Duration(app_commands.Transformer):
+    """Slash command option for a duration, e.g. `duration: app_commands.Transform[int, Duration(minimum=20)]`.
+
+    The value is converted to `unit` ('s' or 'm'); `bare_unit` lets a plain number through
+    in that unit, so `Duration(unit='m', bare_unit='m')` still accepts '25'.
+    """
+
+    def __init__(self, unit='s', bare_unit=None, minimum=None):
+        self.unit = unit
+        self.bare_unit = bare_unit
+        self.minimum = minimum  # In `unit`
+
+    async def transform(self, interaction, value):
+        seconds = parse_duration(value, self.bare_unit)
+        if seconds is None:
+            raise ArgumentError("Wrong duration format used. Use '2d 14h 25m 30s' or use day(s) hour(s)/hr(s) minute(s)/min(s) second(s)/sec(s)")
+        result, leftover = divmod(seconds, UNIT_SECONDS[self.unit])
+        if leftover:
+            raise ArgumentError(f"Use whole {UNIT_NAMES[self.unit]} for this duration.")
+        if self.minimum is not None and result < self.minimum:
+            raise ArgumentError(f"Duration must be at least {parse_seconds_to_hms(self.minimum * UNIT_SECONDS[self.unit])}")
+        return result
+
+
+class MemberSet(app_commands.Transformer):
+    """Slash command option for a list of user and role mentions, resolved to unique members.
+
+    Roles expand to their members. Raises ArgumentError if nothing resolves. May defer the
+    interaction while a large guild's member list loads, so commands using it should reply
+    through `bot.components.respond`, which falls back to a followup.
+    """
+
+    async def transform(self, interaction, value):
+        loader = getattr(interaction.client, 'member_loader', None)
+        if loader:
+            # Without startup chunking, make sure every mentioned member is cached first
+            user_ids, role_ids = parse_mention_ids(value)
+            if role_ids:
+                await loader.ensure_chunked(interaction.guild, interaction)
+            await loader.fetch_missing(interaction.guild, user_ids)
+        members = parse_mentions(interaction, value, getattr(interaction.client, 'role_index', None))
+        if not members:
+            raise ArgumentError("No valid members found in the mentions. Please mention valid users or roles.")
+        return members
 
-def parse_mentions(ctx, mentions):
-    logger.info(f"Parsing mentions: {mentions}")
-    mention_list = mentions.split()
-    members = []
-
-    for mention in mention_list:
-        mention = mention.strip()
-        if mention.startswith('<@&'):  # Role mention
-            role_id = int(mention.strip('<@&>'))
-            role = ctx.guild.get_role(role_id)
-            if role:
-                members.extend(role.members)
-                logger.debug(f"Added {len(role.members)} members from role {role.name}")
-            else:
-                logger.warning(f"Role not found for ID: {role_id}")
-        elif mention.startswith('<@!') or mention.startswith('<@'):  # User mention
-            user_id = int(mention.strip('<@!>').strip('<@>'))
-            member = ctx.guild.get_member(user_id)
-            if member:
-                members.append(member)
-                logger.debug(f"Added member {member.name}")
-            else:
-                logger.warning(f"Member not found for ID: {user_id}")
-    
-    unique_members = list(set(members))
-    logger.info(f"Parsed {len(mention_list)} mentions into {len(unique_members)} unique members")
-    return unique_members
 
 async def check_manager(ctx_or_interaction):
     if isinstance(ctx_or_interaction, discord.Interaction):
@@ -75,27 +147,15 @@ async def check_manager(ctx_or_interaction):
         guild = ctx_or_interaction.guild
         user = ctx_or_interaction.author
     else:
-        logger.error(f"Unexpected context type in check_manager: {type(ctx_or_interaction)}")
+        logger.error("Unexpected context type in check_manager: %s", type(ctx_or_interaction))
         return False
 
-    guild_id = guild.id
-    if not hasattr(bot, 'manager_roles'):
-        logger.debug("Initializing bot.manager_roles")
-        bot.manager_roles = {}
-    if not hasattr(bot, 'manager_members'):
-        logger.debug("Initializing bot.manager_members")
-        bot.manager_members = {}
-
-    if guild_id not in bot.manager_roles:
-        bot.manager_roles[guild_id] = []
-    if guild_id not in bot.manager_members:
-        bot.manager_members[guild_id] = []
-    
-    user_roles = user.roles
-    is_manager = (user.guild_permissions.administrator or 
-                  any(role.id in bot.manager_roles[guild_id] for role in user_roles) or 
-                  user.id in bot.manager_members[guild_id])
-    logger.info(f"User {user.name} is {'a' if is_manager else 'not a'} manager")
+    if guild is None:
+        return False  # Managers are per guild, nobody manages a DM
+
+    # Administrators, plus guild managers and bot developers from the in-memory permission table
+    is_manager = user.guild_permissions.administrator or bot.permissions.is_manager(guild.id, user.id)
+    logger.info("User %s is %s manager", user.name, 'a' if is_manager else 'not a')
     return is_manager
 
 def is_manager():
@@ -110,9 +170,9 @@ def app_is_manager():
 
 def is_group_creator():
     async def predicate(interaction):
-        logger.debug(f"Checking if user is group creator: {interaction.user}")
+        logger.debug("Checking if user is group creator: %s", interaction.user)
         group = await interaction.client.db.get_study_group(interaction.guild_id)
-        is_creator = group and group[2] == interaction.user.id  # Assuming creator_id is at index 2
-        logger.info(f"User {interaction.user.name} is {'the' if is_creator else 'not the'} group creator")
+        is_creator = group and group.creator_id == interaction.user.id
+        logger.info("User %s is %s group creator", interaction.user.name, 'the' if is_creator else 'not the')
         return is_creator
     return app_commands.check(predicate)
\ No newline at end of file